@@ -1,5 +1,9 @@
-import os
-from datetime import datetime
+import os, re
+from datetime import datetime, timedelta
+from backup_store import BackupStore
+from transactions import atomic_write, locked
+
+LEGACY_BACKUP = re.compile(r"^(.+?)(?:\.conf)?-(\d{8}-\d{6})(?:\.conf)?$")
 
 def get_input(prompt, default=None):
     return input(f"{prompt}\n(Default: {default}): ").strip() or default
@@ -7,11 +11,63 @@ def get_input(prompt, default=None):
 def list_configs(directory):
     return [f for f in os.listdir(directory) if f.endswith(".conf")]
 
-def backup_config():
-    config_dir = "/etc/wireguard"
+def legacy_backup(name):
+    match = LEGACY_BACKUP.match(name)
+    return (match.group(1), datetime.strptime(match.group(2), "%Y%m%d-%H%M%S").timestamp()) if match else (None, None)
+
+def store_for(config_dir="/etc/wireguard"):
     backup_dir = os.path.join(config_dir, "backups")
-    os.makedirs(backup_dir, exist_ok=True)
+    store = BackupStore(os.path.join(backup_dir, "store"))
+    legacy = [name for name in os.listdir(backup_dir) if legacy_backup(name)[0] and os.path.isfile(os.path.join(backup_dir, name))] \
+        if os.path.isdir(backup_dir) else []
+    legacy.sort(key=lambda name: legacy_backup(name)[1], reverse=True)
+    imported = store.imported() if legacy else set()
+    for name in legacy:
+        if name not in imported: store.import_file(os.path.join(backup_dir, name), *legacy_backup(name))
+    return store
+
+def backup_file(selected_config, config_dir="/etc/wireguard"):
+    record, created = store_for(config_dir).snapshot(os.path.join(config_dir, selected_config))
+    taken = datetime.fromtimestamp(record["time"]).strftime("%Y%m%d-%H%M%S")
+    return f"{selected_config} @ {taken} ({record['hash'][:12]})" + ("" if created else ", unchanged since last backup")
+
+def parse_when(text):
+    text = text.strip().lower()
+    for word, offset in (("yesterday", 1), ("today", 0)):
+        if text.startswith(word):
+            day = datetime.now().date() - timedelta(days=offset)
+            clock = datetime.strptime(text[len(word):].strip() or "23:59:59", "%H:%M:%S" if text.count(":") == 2 else "%H:%M").time()
+            return datetime.combine(day, clock).timestamp()
+    return datetime.fromisoformat(text).timestamp()
+
+def format_snapshot(record):
+    return f"#{record['id']} {record['interface']} @ {datetime.fromtimestamp(record['time']).strftime('%Y-%m-%d %H:%M:%S')} ({record['size']} bytes, {record['hash'][:12]})"
+
+def list_snapshots(config_dir="/etc/wireguard", interface=None, since=None, until=None, limit=None):
+    return store_for(config_dir).search(interface, since, until, limit)
+
+def restore_snapshot(record, config_dir="/etc/wireguard"):
+    return store_for(config_dir).restore(record["interface"], record, config_dir)
+
+def diff_snapshots(old_id, new_id, config_dir="/etc/wireguard"):
+    store = store_for(config_dir)
+    old, new = store.get(old_id), store.get(new_id)
+    if not old or not new: raise ValueError("Unknown snapshot id.")
+    return store.diff(old, new)
+
+def legacy_restore_path(selected_backup, config_dir="/etc/wireguard"):
+    interface = legacy_backup(os.path.basename(selected_backup))[0]
+    if not interface: raise ValueError(f"{selected_backup} is not a recognized backup file name.")
+    return os.path.join(config_dir, f"{interface}.conf")
+
+def restore_file(selected_backup, config_dir="/etc/wireguard"):
+    restore_path = legacy_restore_path(selected_backup, config_dir)
+    with open(os.path.join(config_dir, "backups", os.path.basename(selected_backup))) as f: text = f.read()
+    with locked(restore_path): atomic_write(restore_path, text)
+    return restore_path
 
+def backup_config():
+    config_dir = "/etc/wireguard"
     configs = list_configs(config_dir)
     if not configs:
         print("No configurations found to back up.")
@@ -26,37 +82,33 @@ def backup_config():
         print("Invalid selection.")
         return
 
-    selected_config = configs[int(choice) - 1]
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    backup_name = f"{selected_config}-{timestamp}"
-    backup_path = os.path.join(backup_dir, backup_name)
-
-    os.rename(os.path.join(config_dir, selected_config), backup_path)
-    print(f"Backup completed: {backup_path}")
+    print(f"Backup completed: {backup_file(configs[int(choice) - 1], config_dir)}")
 
 def restore_config():
-    backup_dir = "/etc/wireguard/backups"
-    if not os.path.exists(backup_dir):
-        print("No backups found.")
+    config_dir = "/etc/wireguard"
+    interface = get_input("Interface to restore (blank for all)", "")
+    when = get_input("Restore as of (e.g. 'yesterday 14:00', '2024-05-01 09:30'; blank to list recent backups)", "")
+    try:
+        until = parse_when(when) if when else None
+    except ValueError:
+        print("Invalid time.")
         return
-
-    backups = list_configs(backup_dir)
-    if not backups:
+    snapshots = list_snapshots(config_dir, interface, until=until, limit=1 if when else 20)
+    if not snapshots:
         print("No backups found to restore.")
         return
 
     print("=== Available Backups to Restore ===")
-    for i, backup in enumerate(backups, 1):
-        print(f"{i}. {backup}")
+    for i, record in enumerate(snapshots, 1):
+        print(f"{i}. {format_snapshot(record)}")
 
-    choice = get_input("Select a backup to restore")
-    if not choice.isdigit() or int(choice) < 1 or int(choice) > len(backups):
+    choice = get_input("Select a backup to restore", "1" if len(snapshots) == 1 else None)
+    if not choice or not choice.isdigit() or int(choice) < 1 or int(choice) > len(snapshots):
         print("Invalid selection.")
         return
 
-    selected_backup = backups[int(choice) - 1]
-    config_dir = "/etc/wireguard"
-    restore_path = os.path.join(config_dir, selected_backup.split('-')[0] + ".conf")
+    record = snapshots[int(choice) - 1]
+    restore_path = os.path.join(config_dir, f"{record['interface']}.conf")
 
     if os.path.exists(restore_path):
         overwrite = get_input(f"{restore_path} exists. Overwrite? (yes/no)", "no").lower()
@@ -64,17 +116,31 @@ def restore_config():
             print("Restore canceled.")
             return
 
-    os.rename(os.path.join(backup_dir, selected_backup), restore_path)
-    print(f"Restore completed: {restore_path}")
+    print(f"Restore completed: {restore_snapshot(record, config_dir)}")
+
+def diff_backups():
+    interface = get_input("Interface (blank for all)", "")
+    for record in list_snapshots(interface=interface, limit=20):
+        print(format_snapshot(record))
+    old_id, new_id = get_input("Older snapshot #"), get_input("Newer snapshot #")
+    if not (old_id or "").isdigit() or not (new_id or "").isdigit():
+        print("Invalid selection.")
+        return
+    try:
+        print("".join(diff_snapshots(int(old_id), int(new_id))) or "No differences.")
+    except ValueError as e:
+        print(e)
 
 def backup_restore_menu():
     while True:
-        print("=== Backup and Restore Menu ===\n1. Backup Configurations\n2. Restore Configurations\nx. Return to Main Menu")
+        print("=== Backup and Restore Menu ===\n1. Backup Configurations\n2. Restore Configurations\n3. Compare Backups\nx. Return to Main Menu")
         choice = get_input("Your choice")
         if choice == "1":
             backup_config()
         elif choice == "2":
             restore_config()
+        elif choice == "3":
+            diff_backups()
         elif choice == "x":
             break
         else:
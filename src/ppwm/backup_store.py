@@ -0,0 +1,155 @@
+import difflib, hashlib, os, sqlite3, time, zlib
+from transactions import atomic_write, locked
+
+STORE_DIR = "/etc/wireguard/backups/store"
+KEEP = 50
+MAX_CHAIN = 8
+NO_BASE = b"0" * 64
+
+class BackupStore:
+    def __init__(self, root=STORE_DIR, keep=KEEP):
+        self.root, self.keep = root, keep
+        self.objects = os.path.join(root, "objects")
+        self.db = None
+
+    def _db(self):
+        if self.db is None:
+            os.makedirs(self.root, exist_ok=True)
+            self.db = sqlite3.connect(os.path.join(self.root, "catalog.db"))
+            self.db.row_factory = sqlite3.Row
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, interface TEXT NOT NULL, time REAL NOT NULL,
+                                                      hash TEXT NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL);
+                CREATE INDEX IF NOT EXISTS snapshots_interface_time ON snapshots (interface, time);
+                CREATE INDEX IF NOT EXISTS snapshots_hash ON snapshots (hash);
+                CREATE TABLE IF NOT EXISTS imports (name TEXT PRIMARY KEY, time REAL NOT NULL);
+            """)
+        return self.db
+
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        return locked(os.path.join(self.root, "catalog.db"))
+
+    def interfaces(self):
+        if not os.path.isdir(self.root): return []
+        return [row[0] for row in self._db().execute("SELECT DISTINCT interface FROM snapshots ORDER BY interface")]
+
+    def search(self, interface=None, since=None, until=None, limit=None):
+        query, params = "SELECT * FROM snapshots WHERE 1=1", []
+        if interface: query += " AND interface = ?"; params.append(interface)
+        if since is not None: query += " AND time >= ?"; params.append(since)
+        if until is not None: query += " AND time <= ?"; params.append(until)
+        query += " ORDER BY time DESC, id DESC"
+        if limit: query += " LIMIT ?"; params.append(limit)
+        return [dict(row) for row in self._db().execute(query, params)][::-1]
+
+    def snapshots(self, interface):
+        return self.search(interface)
+
+    def latest(self, interface, at=None):
+        found = self.search(interface, until=at, limit=1)
+        return found[0] if found else None
+
+    def get(self, snapshot_id):
+        row = self._db().execute("SELECT * FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        return dict(row) if row else None
+
+    def diff(self, old, new):
+        old_text = self.read_blob(old["hash"]).decode().splitlines(keepends=True)
+        new_text = self.read_blob(new["hash"]).decode().splitlines(keepends=True)
+        return list(difflib.unified_diff(old_text, new_text, f"{old['interface']}@{old['id']}", f"{new['interface']}@{new['id']}"))
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def _base(self, digest):
+        with open(self._blob_path(digest), "rb") as f: base = f.read(64)
+        return None if base == NO_BASE else base.decode()
+
+    def _chain_depth(self, digest):
+        depth = 0
+        while (digest := self._base(digest)): depth += 1
+        return depth
+
+    def read_blob(self, digest):
+        with open(self._blob_path(digest), "rb") as f: base, payload = f.read(64), f.read()
+        if base == NO_BASE: return zlib.decompress(payload)
+        decompressor = zlib.decompressobj(zdict=self.read_blob(base.decode()))
+        return decompressor.decompress(payload) + decompressor.flush()
+
+    def _write_blob(self, digest, data, base=None):
+        path = self._blob_path(digest)
+        if os.path.exists(path): return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if base:
+            compressor = zlib.compressobj(9, zdict=self.read_blob(base))
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = zlib.compress(data, 9)
+        with open(path + ".tmp", "wb") as f: f.write((base.encode() if base else NO_BASE) + payload)
+        os.replace(path + ".tmp", path)
+
+    def snapshot(self, config_path):
+        interface = os.path.basename(config_path)[:-5]
+        with self._locked():
+            stat = os.stat(config_path)
+            last = self.latest(interface)
+            if last and last["mtime"] == stat.st_mtime_ns and last["size"] == stat.st_size: return last, False
+            with open(config_path, "rb") as f: data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            db = self._db()
+            if last and last["hash"] == digest:
+                with db: db.execute("UPDATE snapshots SET mtime = ? WHERE id = ?", (stat.st_mtime_ns, last["id"]))
+                return dict(last, mtime=stat.st_mtime_ns), False
+            return self._add(interface, data, digest, time.time(), stat.st_mtime_ns), True
+
+    def imported(self):
+        return {row[0] for row in self._db().execute("SELECT name FROM imports")}
+
+    def import_file(self, path, interface, when):
+        name, record = os.path.basename(path), None
+        with self._locked():
+            db = self._db()
+            if db.execute("SELECT 1 FROM imports WHERE name = ?", (name,)).fetchone(): return None
+            newer = db.execute("SELECT COUNT(*) FROM snapshots WHERE interface = ? AND time > ?", (interface, when)).fetchone()[0]
+            cataloged = db.execute("SELECT 1 FROM snapshots WHERE interface = ? AND time = ?", (interface, when)).fetchone()
+            if newer < self.keep and not cataloged:
+                with open(path, "rb") as f: data = f.read()
+                record = self._add(interface, data, hashlib.sha256(data).hexdigest(), when, os.stat(path).st_mtime_ns)
+            with db: db.execute("INSERT INTO imports (name, time) VALUES (?, ?)", (name, when))
+            return record
+
+    def _add(self, interface, data, digest, when, mtime):
+        last, db = self.latest(interface), self._db()
+        base = last["hash"] if last and last["hash"] != digest and self._chain_depth(last["hash"]) < MAX_CHAIN else None
+        self._write_blob(digest, data, base)
+        record = {"interface": interface, "time": when, "hash": digest, "size": len(data), "mtime": mtime}
+        with db:
+            record["id"] = db.execute("INSERT INTO snapshots (interface, time, hash, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                                      (interface, when, digest, len(data), mtime)).lastrowid
+            pruned = db.execute("""DELETE FROM snapshots WHERE interface = ? AND id NOT IN
+                                   (SELECT id FROM snapshots WHERE interface = ? ORDER BY time DESC, id DESC LIMIT ?)""",
+                                (interface, interface, self.keep)).rowcount
+        if pruned: self.gc()
+        return record
+
+    def restore(self, interface, record, config_dir="/etc/wireguard"):
+        restore_path = os.path.join(config_dir, f"{interface}.conf")
+        with locked(restore_path): atomic_write(restore_path, self.read_blob(record["hash"]).decode())
+        return restore_path
+
+    def gc(self):
+        with self._locked(): return self._collect()
+
+    def _collect(self):
+        live = set()
+        for (digest,) in self._db().execute("SELECT DISTINCT hash FROM snapshots"):
+            while digest and digest not in live:
+                live.add(digest)
+                digest = self._base(digest)
+        removed = 0
+        for prefix in os.listdir(self.objects) if os.path.isdir(self.objects) else []:
+            for name in os.listdir(os.path.join(self.objects, prefix)):
+                if prefix + name not in live:
+                    os.unlink(os.path.join(self.objects, prefix, name)); removed += 1
+        return removed
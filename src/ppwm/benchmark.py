@@ -0,0 +1,154 @@
+import contextlib, io, json, os, shutil, subprocess, sys, tempfile, time, tracemalloc
+from unittest import mock
+
+DEFAULT_SIZES = "1x10,1x1000,1x10000,10x100,100x100"
+TOLERANCE = 0.25
+PORTS_PER_SUBSECTION = 10
+KEY = "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA="
+PUBLIC_IP = "203.0.113.1"
+_counts = {"opens": 0, "writes": 0, "renames": 0}
+_audit_state = {"installed": False, "counting": False}
+
+def _audit(event, args):
+    if not _audit_state["counting"]: return
+    if event == "open":
+        _counts["opens"] += 1
+        mode = args[1] if len(args) > 1 and isinstance(args[1], str) else ""
+        flags = args[2] if len(args) > 2 and isinstance(args[2], int) else 0
+        if any(c in mode for c in "wax+") or flags & (os.O_WRONLY | os.O_RDWR): _counts["writes"] += 1
+    elif event == "os.rename":
+        _counts["renames"] += 1
+
+def _install_audit():
+    if not _audit_state["installed"]:
+        sys.addaudithook(_audit)
+        _audit_state["installed"] = True
+
+def parse_sizes(spec):
+    return [tuple(int(n) for n in size.split("x")) for size in spec.split(",")]
+
+def synthesize(config_dir, interfaces, ports):
+    from config_generation import default_interface
+    from config_model import CATEGORIES, WireGuardConfig
+    for i in range(interfaces):
+        subnet = i % 250 + 1
+        config = WireGuardConfig.parse(f"[Interface]\nAddress = 10.60.{subnet}.1/24\nListenPort = {51820 + i}\nPrivateKey = {KEY}\n"
+                                       f"PostUp = iptables -A FORWARD -i wg{i} -j ACCEPT\nPostDown = iptables -D FORWARD -i wg{i} -j ACCEPT\n\n"
+                                       f"[Peer]\nPublicKey = {KEY}\nAllowedIPs = 10.60.{subnet}.2/32\n", os.path.join(config_dir, f"wg{i}.conf"))
+        config.initialize_template()
+        for n in range(ports):
+            subsection = f"server{n // PORTS_PER_SUBSECTION}"
+            if subsection not in config.subsection_index: config.add_subsection(CATEGORIES[(n // PORTS_PER_SUBSECTION) % len(CATEGORIES)], subsection)
+            config.add_port(subsection, 1024 + n, "udp" if n % 3 == 0 else "tcp", comment=f"instance {n}")
+        config.save()
+    with open(os.path.join(config_dir, ".ppwm-network-cache.json"), "w") as f:
+        json.dump({"iface": default_interface(), "public_ip": PUBLIC_IP, "time": time.time()}, f)
+
+def _completed(*args, **kwargs):
+    _counts["subprocess"] = _counts.get("subprocess", 0) + 1
+    return subprocess.CompletedProcess(args[0] if args else kwargs.get("args"), 0, "", "")
+
+def _check_output(*args, **kwargs):
+    _completed(*args, **kwargs)
+    return "" if kwargs.get("text") else b""
+
+@contextlib.contextmanager
+def stubbed():
+    with mock.patch("subprocess.run", _completed), mock.patch("subprocess.check_output", _check_output), \
+         mock.patch("os.system", lambda command: _completed(command).returncode), \
+         mock.patch("builtins.input", lambda prompt="": ""), mock.patch("config_generation.fetch_public_ip", lambda timeout=None: PUBLIC_IP), \
+         contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def cases(config_dir):
+    from config_generation import generate_config
+    from config_model import load
+    from port_management import display_ports, generate_postup_postdown, list_categories
+    from port_summary import SUMMARY_CACHE, _cache, summarize_ports
+    paths = sorted(os.path.join(config_dir, name) for name in os.listdir(config_dir) if name.endswith(".conf"))
+    loaded = [load(path) for path in paths]
+
+    def parse():
+        for path in paths: load(path)
+
+    def categories():
+        for config in loaded: list_categories(config)
+
+    def display():
+        for config in loaded:
+            for subsection, category in config.subsection_index.items(): display_ports(config, category, subsection)
+
+    def postup_postdown():
+        config = load(paths[0])
+        subsection = next(iter(config.subsection_index))
+        generate_postup_postdown(config, 65000, "tcp", "add", subsection=subsection)
+        config.save()
+        generate_postup_postdown(config, 65000, "tcp", "delete")
+        config.save()
+
+    def summary_cold():
+        _cache.clear()
+        with contextlib.suppress(FileNotFoundError): os.unlink(os.path.join(config_dir, SUMMARY_CACHE))
+        summarize_ports(config_dir)
+
+    def summary_warm():
+        summarize_ports(config_dir)
+
+    def generate():
+        generate_config(config_dir)
+        for name in os.listdir(config_dir):
+            if name.startswith("wg0-"): shutil.rmtree(os.path.join(config_dir, name))
+
+    return [("parse", parse), ("list_categories", categories), ("display_ports", display), ("generate_postup_postdown", postup_postdown),
+            ("summarize_ports (cold)", summary_cold), ("summarize_ports (warm)", summary_warm), ("generate_config", generate)]
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with stubbed(): func()
+        timings.append(time.perf_counter() - start)
+    _counts.update(opens=0, writes=0, renames=0, subprocess=0)
+    tracemalloc.start()
+    _audit_state["counting"] = True
+    try:
+        with stubbed(): func()
+    finally:
+        _audit_state["counting"] = False
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(min(timings) * 1000, 3), "opens": _counts["opens"], "writes": _counts["writes"],
+            "renames": _counts["renames"], "subprocess": _counts["subprocess"], "peak_kib": round(peak / 1024, 1)}
+
+def run_benchmarks(sizes=None, repeat=3):
+    _install_audit()
+    results = {}
+    for interfaces, ports in parse_sizes(sizes or DEFAULT_SIZES):
+        config_dir = tempfile.mkdtemp(prefix="ppwm-bench-")
+        try:
+            with stubbed(): synthesize(config_dir, interfaces, ports)
+            for name, func in cases(config_dir):
+                results[f"{name} {interfaces}x{ports}"] = measure(func, repeat)
+        finally:
+            shutil.rmtree(config_dir)
+    return results
+
+def compare(results, baseline, tolerance=None):
+    regressions, tolerance = [], TOLERANCE if tolerance is None else tolerance
+    for case, result in results.items():
+        if case not in baseline: continue
+        before = baseline[case]
+        if result["ms"] > before["ms"] * (1 + tolerance) and result["ms"] - before["ms"] > 1:
+            regressions.append(f"{case}: {before['ms']}ms -> {result['ms']}ms")
+        for counter in ("opens", "writes", "subprocess"):
+            if result[counter] > before[counter]: regressions.append(f"{case}: {counter} {before[counter]} -> {result[counter]}")
+        if result["peak_kib"] > before["peak_kib"] * (1 + tolerance) and result["peak_kib"] - before["peak_kib"] > 64:
+            regressions.append(f"{case}: peak memory {before['peak_kib']}KiB -> {result['peak_kib']}KiB")
+    return regressions
+
+def format_results(results, baseline=None):
+    lines = [f"{'Case':<40}{'ms':>10}{'base ms':>10}{'opens':>8}{'writes':>8}{'renames':>9}{'forks':>7}{'peak KiB':>10}"]
+    for case, r in results.items():
+        base = f"{baseline[case]['ms']:.1f}" if baseline and case in baseline else "-"
+        lines.append(f"{case:<40}{r['ms']:>10.1f}{base:>10}{r['opens']:>8}{r['writes']:>8}{r['renames']:>9}{r['subprocess']:>7}{r['peak_kib']:>10.1f}")
+    return "\n".join(lines)
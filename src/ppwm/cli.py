@@ -0,0 +1,512 @@
+import argparse, json, os, sys
+from datetime import datetime
+
+VERSION = "1.1.0"
+ACTIONS = ["add", "delete", "add_subsection", "delete_subsection"]
+
+def config_path(name, config_dir):
+    path = os.path.realpath(os.path.join(config_dir, name if os.sep in name or name.endswith(".conf") else f"{name}.conf"))
+    if os.path.dirname(path) != os.path.realpath(config_dir) or not path.endswith(".conf"):
+        raise ValueError(f"{name} is not a config in {config_dir}.")
+    return path
+
+def resolve_ports(spec, protocol, index):
+    from config_model import expand_ports
+    if str(spec).startswith("auto:"):
+        count = int(spec[5:])
+        start = index.find_free_block(count, protocol) if index else None
+        if start is None: raise ValueError(f"No free block of {count} {protocol} ports.")
+        return list(range(start, start + count))
+    return expand_ports(spec)
+
+def describe_conflicts(conflicts):
+    return "conflicts: " + ", ".join(f"{port}/{proto} ({owner})" for port, proto, owner in conflicts)
+
+def apply_operation(config, op, index=None):
+    action = op["action"]
+    if action == "add_subsection":
+        return config.add_subsection(op.get("category", "Games"), op["subsection"]) or f"subsection {op['subsection']} exists"
+    if action == "delete_subsection":
+        return config.delete_subsection(op["subsection"]) or f"no subsection {op['subsection']}"
+    protocol = op.get("protocol", "tcp")
+    if protocol not in ("tcp", "udp", "both"): raise ValueError(f"Invalid protocol '{protocol}'.")
+    ports = resolve_ports(op["ports"], protocol, index)
+    if action == "add":
+        conflicts = index.conflicts(ports, protocol, config.name) if index else []
+        if conflicts and not op.get("force"):
+            return describe_conflicts(conflicts)
+        if op["subsection"] not in config.subsection_index:
+            if not config.has_template(): config.initialize_template()
+            config.add_subsection(op.get("category", "Games"), op["subsection"])
+        forward = op.get("forward")
+        forward_mapping = {port: forward for port in ports} if forward and len(ports) == 1 else {}
+        if forward and len(ports) != 1: raise ValueError("Forwarding to a different client port requires a single port.")
+        added, skipped = config.add_ports(op["subsection"], ports, protocol, forward_mapping, op.get("comment"))
+        for port in added:
+            if index: index.mark(port, protocol, (config.name, op["subsection"]))
+        return True if not skipped else f"already managed: {', '.join(map(str, skipped))}"
+    if action == "delete":
+        removed = config.remove_ports(ports, protocol)
+        return True if len(removed) == len(ports) else f"not managed: {', '.join(str(p) for p in ports if p not in removed)}"
+    raise ValueError(f"Unknown action '{action}'.")
+
+def operation_error(op):
+    if not isinstance(op, dict): return "operation must be a JSON object"
+    if op.get("action") not in ACTIONS: return f"unknown action {op.get('action')!r}"
+    if not isinstance(op.get("config"), str) or not op["config"]: return "missing config"
+    if op["action"] in ("add", "delete") and "ports" not in op: return "missing ports"
+    if op["action"] in ("add", "add_subsection", "delete_subsection") and not op.get("subsection"): return "missing subsection"
+    return None
+
+def live_result(config):
+    from live_apply import hot_apply
+    try:
+        applied = hot_apply(config)
+    except RuntimeError as e:
+        return False, f"{config.path}: live apply failed: {e}"
+    return True, applied and f"{config.path}: applied live ({applied[0]} removed, {applied[1]} added{', peers synced' if applied[2] else ''})."
+
+def apply_live(config):
+    ok, message = live_result(config)
+    if message: print(message)
+    return ok
+
+def execute_batch(operations, config_dir, apply=False):
+    from config_model import load
+    from port_index import PortIndex
+    from transactions import ConflictError, locked
+    by_config, results = {}, []
+    if not isinstance(operations, list): return [{"config": None, "ok": False, "message": "operations must be a JSON list"}]
+    for op in operations:
+        if error := operation_error(op):
+            results.append({"config": op.get("config") if isinstance(op, dict) else None, "ok": False,
+                            "message": f"invalid operation {json.dumps(op)}: {error}"})
+            continue
+        try:
+            by_config.setdefault(config_path(op["config"], config_dir), []).append(op)
+        except ValueError as e:
+            results.append({"config": op["config"], "ok": False, "message": str(e)})
+    index = PortIndex(config_dir) if any(op["action"] == "add" for ops in by_config.values() for op in ops) else None
+    for path, ops in by_config.items():
+        with locked(path):
+            try:
+                config = load(path)
+            except OSError as e:
+                results += [{"config": path, "ok": False, "message": f"{path}: {e}"} for _ in ops]
+                continue
+            checkpoint = ({key: list(owners) for key, owners in index.owners.items()}, dict(index.used)) if index else None
+            failed = 0
+            for op in ops:
+                try:
+                    result = apply_operation(config, op, index)
+                except (KeyError, ValueError) as e:
+                    result = f"invalid operation: {e}"
+                if result is not True:
+                    failed += 1
+                    results.append({"config": path, "ok": False, "message": f"{path}: {op['action']} {op.get('subsection', '')} {op.get('ports', '')} - {result}"})
+            if failed:
+                if index: index.owners, index.used = checkpoint
+                results.append({"config": path, "ok": False, "message": f"{path}: not changed; {failed} of {len(ops)} operation(s) failed."})
+                continue
+            try:
+                config.save()
+            except ConflictError as e:
+                results.append({"config": path, "ok": False, "message": f"{path}: not saved: {e}"})
+                continue
+            results.append({"config": path, "ok": True, "message": f"{path}: applied {len(ops)} operation(s)."})
+            if apply:
+                ok, message = live_result(config)
+                if message: results.append({"config": path, "ok": ok, "message": message})
+    return results
+
+def run_batch(operations, config_dir, apply=False):
+    results = execute_batch(operations, config_dir, apply)
+    for result in results: print(result["message"])
+    return 1 if any(not result["ok"] for result in results) else 0
+
+def cmd_generate(args):
+    from config_generation import generate_keys, get_network_info, provision_peers, render_configs, write_client_configs, write_configs
+    from config_model import load
+    from ip_allocator import IPAllocator
+    iface, public_ip = args.iface, args.public_ip
+    if not iface or not public_ip:
+        detected_iface, detected_ip = get_network_info(args.config_dir)
+        iface, public_ip = iface or detected_iface, public_ip or detected_ip
+    if not iface or not public_ip:
+        print("Unable to detect interface or public IP; pass --iface and --public-ip."); return 1
+    allocator = IPAllocator(args.config_dir)
+    subnet = args.subnet or allocator.next_subnet()
+    if args.subnet and f"10.60.{subnet}" in allocator.used:
+        print(f"10.60.{subnet}.0/24 is already used by another config."); return 1
+    client_ip = args.client_ip or allocator.next_host(f"10.60.{subnet}")
+    if allocator.is_used(client_ip):
+        print(f"{client_ip} is already allocated."); return 1
+    try:
+        server_keys, client_keys = generate_keys(), generate_keys()
+    except RuntimeError as e:
+        print(e); return 1
+    allocator.reserve(client_ip)
+    srv_cfg, cli_cfg = render_configs(args.name, server_keys, client_keys, subnet, client_ip, iface, public_ip,
+                                      args.port, args.keepalive, args.mtu, args.dns, not args.no_server_rules, not args.no_client_rules)
+    out_dir = write_configs(args.name, srv_cfg, cli_cfg, args.config_dir)
+    if args.peers > 1:
+        server = load(f"{out_dir}/{args.name}_server.conf")
+        write_client_configs(args.name, provision_peers(server, args.peers - 1, public_ip, args.keepalive, args.mtu, args.dns,
+                                                        not args.no_client_rules, allocator), out_dir)
+        server.save()
+    print(f"Config saved to {out_dir}.")
+    return 0
+
+def cmd_peers(args):
+    from config_generation import get_network_info, provision_peers, write_client_configs
+    from config_model import load
+    from ip_allocator import IPAllocator
+    from transactions import locked
+    try:
+        path = config_path(args.config, args.config_dir)
+    except ValueError as e:
+        print(e); return 1
+    public_ip = args.public_ip or get_network_info(args.config_dir)[1]
+    if not public_ip:
+        print("Unable to detect public IP; pass --public-ip."); return 1
+    with locked(path):
+        config = load(path)
+        try:
+            clients = provision_peers(config, args.count, public_ip, args.keepalive, args.mtu, args.dns, not args.no_client_rules,
+                                      IPAllocator(args.config_dir))
+        except (ValueError, RuntimeError) as e:
+            print(e); return 1
+        config.save()
+        if args.apply: apply_live(config)
+    out_dir = f"{args.config_dir}/{config.name}-peers-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    print(f"Added {len(clients)} peer(s); client configs saved to {write_client_configs(config.name, clients, out_dir)}.")
+    return 0
+
+def cmd_ports(args):
+    op = {"action": args.action, "config": args.config, "ports": args.ports, "protocol": args.protocol,
+          "subsection": args.subsection, "category": args.category, "comment": args.comment, "forward": args.forward,
+          "force": args.force}
+    if args.action == "add" and not args.subsection:
+        print("--subsection is required to add ports."); return 1
+    return run_batch([op], args.config_dir, args.apply)
+
+def cmd_free_ports(args):
+    from port_index import PortIndex
+    start = PortIndex(args.config_dir).find_free_block(args.count, args.protocol, args.start)
+    if start is None:
+        print(f"No free block of {args.count} {args.protocol} ports."); return 1
+    print(f"{start}-{start + args.count - 1}" if args.count > 1 else start)
+    return 0
+
+def cmd_summary(args):
+    from port_summary import collect_summary, export_summary, format_summary
+    summary = collect_summary(args.config_dir)
+    if args.export: print(f"Summary exported to {export_summary(summary, args.export, args.format)}.")
+    else: print(format_summary(summary, args.format), end="")
+    return 0
+
+def cmd_backup(args):
+    from backup_restore import backup_file
+    for name in args.configs:
+        try:
+            path = config_path(name, args.config_dir)
+        except ValueError as e:
+            print(e); return 1
+        print(f"Backup completed: {backup_file(os.path.basename(path), args.config_dir)}")
+    return 0
+
+def cmd_restore(args):
+    from backup_restore import legacy_restore_path, parse_when, restore_file, restore_snapshot, store_for
+    store = store_for(args.config_dir)
+    if args.id: record = store.get(args.id)
+    else:
+        try:
+            record = store.latest(args.backup, parse_when(args.at) if args.at else None)
+        except ValueError:
+            print(f"Invalid time '{args.at}'."); return 1
+    if args.backup and not record and not args.at and os.path.isfile(os.path.join(args.config_dir, "backups", os.path.basename(args.backup))):
+        try:
+            restore_path = legacy_restore_path(args.backup, args.config_dir)
+        except ValueError as e:
+            print(e); return 1
+    elif not record:
+        print("No matching backup found."); return 1
+    else:
+        restore_path = os.path.join(args.config_dir, f"{record['interface']}.conf")
+    if os.path.exists(restore_path) and not args.force:
+        print(f"{restore_path} exists. Pass --force to overwrite."); return 1
+    if record: print(f"Restore completed: {restore_snapshot(record, args.config_dir)}")
+    else: print(f"Restore completed: {restore_file(args.backup, args.config_dir)}")
+    return 0
+
+def cmd_backups(args):
+    from backup_restore import diff_snapshots, format_snapshot, list_snapshots, parse_when
+    if args.action == "diff":
+        if len(args.ids) != 2:
+            print("diff takes two snapshot ids."); return 1
+        try:
+            print("".join(diff_snapshots(args.ids[0], args.ids[1], args.config_dir)) or "No differences.", end="")
+        except ValueError as e:
+            print(e); return 1
+        return 0
+    try:
+        since, until = (parse_when(args.since) if args.since else None), (parse_when(args.until) if args.until else None)
+    except ValueError:
+        print("Invalid time."); return 1
+    for record in list_snapshots(args.config_dir, args.interface, since, until, args.limit): print(format_snapshot(record))
+    return 0
+
+def cmd_validate(args):
+    from utilities_module import validate_wireguard_configs
+    return 1 if validate_wireguard_configs(args.config_dir) else 0
+
+def cmd_exporter(args):
+    from exporter import Exporter, serve
+    if args.once:
+        print(Exporter(args.config_dir).metrics(), end=""); return 0
+    serve(args.listen, args.config_dir, args.interval)
+    return 0
+
+def cmd_agent(args):
+    from fleet import serve_agent
+    try:
+        serve_agent(args.listen, args.config_dir, args.token or os.environ.get("PPWM_FLEET_TOKEN", ""))
+    except (OSError, ValueError) as e:
+        print(e); return 1
+    return 0
+
+def cmd_fleet(args):
+    from fleet import Fleet, load_nodes, print_results
+    fleet = Fleet(load_nodes(args.nodes), args.concurrency, args.timeout)
+    try:
+        if args.action == "push":
+            if not args.plan:
+                print("push requires --plan FILE."); return 1
+            with open(args.plan) as f: plan = json.load(f)
+            results = fleet.push(plan, args.apply)
+        else:
+            results = fleet.call(f"/{args.action}", lambda node: {})
+    finally:
+        fleet.close()
+    return print_results(results)
+
+def cmd_benchmark(args):
+    from benchmark import compare, format_results, run_benchmarks
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f: baseline = json.load(f)
+    results = run_benchmarks(args.sizes, args.repeat)
+    print(format_results(results, baseline))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f: json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}.")
+    regressions = compare(results, baseline, args.tolerance) if baseline else []
+    for regression in regressions: print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+def cmd_sync(args):
+    from config_model import load
+    from panel_sync import PANEL_CACHE, PanelClient, PanelError, apply_sync, desired_ports, plan_sync
+    from port_index import PortIndex
+    from transactions import locked
+    api_key = args.api_key or os.environ.get("PPWM_PANEL_KEY")
+    if not api_key:
+        print("Pass --api-key or set PPWM_PANEL_KEY."); return 1
+    client = PanelClient(args.panel, api_key, os.path.join(args.config_dir, PANEL_CACHE))
+    try:
+        allocations = client.allocations(args.node, args.per_page)
+    except (PanelError, OSError, ValueError) as e:
+        print(f"Panel request failed: {e}"); return 1
+    client.save_cache()
+    desired = desired_ports(allocations, args.protocol)
+    try:
+        path = config_path(args.config, args.config_dir)
+    except ValueError as e:
+        print(e); return 1
+    index = PortIndex(args.config_dir)
+    with locked(path):
+        config = load(path)
+        plan = plan_sync(config, desired, index)
+        print(f"{len(allocations)} allocation(s) in {client.stats['requests']} request(s) ({client.stats['not_modified']} not modified): "
+              f"{len(plan['add'])} to add, {len(plan['remove'])} to remove, {len(plan['retag'])} to update.")
+        if plan["conflicts"]: print(f"  skipped {describe_conflicts(plan['conflicts'])}")
+        if args.dry_run or not (plan["add"] or plan["remove"] or plan["retag"]): return 0
+        apply_sync(config, desired, plan, args.category, index)
+        config.save()
+        print(f"{path}: synced.")
+        if args.apply: return 0 if apply_live(config) else 1
+    return 0
+
+def cmd_watch(args):
+    from watch import watch
+    watch(args.config_dir, args.debounce, not args.no_apply, args.poll_interval)
+    return 0
+
+def cmd_tune(args):
+    from tuning import apply_profile, format_plan, load_profile, plan_profile, revert_profile, snapshot
+    profile = load_profile(args.config_dir)
+    if args.action == "revert":
+        print("Tuning profile reverted." if revert_profile(args.config_dir) else "No tuning profile to revert.")
+        return 0
+    if args.action == "reapply":
+        if not profile:
+            print("No tuning profile to reapply."); return 1
+        apply_profile(args.config_dir)
+        print("Tuning profile reapplied."); return 0
+    plan = plan_profile(args.config_dir, not args.no_probe, args.mtu, args.iface)
+    print(format_plan(plan, profile["previous"] if profile else snapshot(args.config_dir, plan)))
+    if args.action == "apply":
+        apply_profile(args.config_dir, plan)
+        print("Tuning profile applied and persisted; undo with 'tune revert'.")
+    return 0
+
+def build_parser():
+    from config_model import CATEGORIES
+    parser = argparse.ArgumentParser(prog="wireguard-manager", description="Pterodactyl/Pelican WireGuard manager")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {VERSION}")
+    parser.add_argument("--config-dir", default="/etc/wireguard")
+    parser.add_argument("--batch", metavar="FILE", help="apply a JSON list of port operations")
+    parser.add_argument("--apply", action="store_true", help="apply rule and peer changes to running interfaces without a restart")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="TRACE", help="record timing spans to a JSON trace (default: a file in the temp dir) "
+                        "and print a summary on exit; also enabled by $PPWM_PROFILE")
+    sub = parser.add_subparsers(dest="command")
+
+    generate = sub.add_parser("generate", help="generate a server/client config pair")
+    generate.add_argument("--name", default="wg0")
+    generate.add_argument("--subnet", type=int, help="x in 10.60.x.0/24 (default: next free)")
+    generate.add_argument("--client-ip")
+    generate.add_argument("--port", default="51820")
+    generate.add_argument("--keepalive", default="25")
+    generate.add_argument("--mtu")
+    generate.add_argument("--dns", default="1.1.1.1")
+    generate.add_argument("--iface")
+    generate.add_argument("--public-ip")
+    generate.add_argument("--no-server-rules", action="store_true")
+    generate.add_argument("--no-client-rules", action="store_true")
+    generate.add_argument("--peers", type=int, default=1, help="number of client peers to provision")
+    generate.set_defaults(func=cmd_generate)
+
+    peers = sub.add_parser("peers", help="provision additional client peers for a config")
+    peers.add_argument("config")
+    peers.add_argument("--count", type=int, default=1)
+    peers.add_argument("--public-ip")
+    peers.add_argument("--keepalive", default="25")
+    peers.add_argument("--mtu")
+    peers.add_argument("--dns", default="1.1.1.1")
+    peers.add_argument("--no-client-rules", action="store_true")
+    peers.set_defaults(func=cmd_peers)
+
+    ports = sub.add_parser("ports", help="add or delete forwarded ports")
+    ports.add_argument("action", choices=["add", "delete"])
+    ports.add_argument("config")
+    ports.add_argument("ports", help="e.g. 667,669-671, or auto:N for the first free block of N ports")
+    ports.add_argument("--protocol", choices=["tcp", "udp", "both"], default="tcp")
+    ports.add_argument("--subsection")
+    ports.add_argument("--category", choices=CATEGORIES, default="Games")
+    ports.add_argument("--comment")
+    ports.add_argument("--forward", help="client port to forward a single port to")
+    ports.add_argument("--force", action="store_true", help="add even if the ports conflict with other configs or listeners")
+    ports.set_defaults(func=cmd_ports)
+
+    free_ports = sub.add_parser("free-ports", help="find the first free block of ports across all configs")
+    free_ports.add_argument("count", type=int)
+    free_ports.add_argument("--protocol", choices=["tcp", "udp", "both"], default="tcp")
+    free_ports.add_argument("--start", type=int, default=1024)
+    free_ports.set_defaults(func=cmd_free_ports)
+
+    summary = sub.add_parser("summary", help="print the managed ports summary")
+    summary.add_argument("--format", choices=["text", "json", "csv"], default="text")
+    summary.add_argument("--export", metavar="PATH")
+    summary.set_defaults(func=cmd_summary)
+
+    backup = sub.add_parser("backup", help="back up configs")
+    backup.add_argument("configs", nargs="+")
+    backup.set_defaults(func=cmd_backup)
+
+    restore = sub.add_parser("restore", help="restore a backup")
+    restore.add_argument("backup", nargs="?", help="interface name or a legacy backup file name")
+    restore.add_argument("--at", help="restore the latest snapshot at or before this time ('yesterday 14:00', ISO date)")
+    restore.add_argument("--id", type=int, help="restore a specific snapshot id")
+    restore.add_argument("--force", action="store_true")
+    restore.set_defaults(func=cmd_restore)
+
+    backups = sub.add_parser("backups", help="list or compare backup snapshots")
+    backups.add_argument("action", choices=["list", "diff"])
+    backups.add_argument("ids", nargs="*", type=int, help="two snapshot ids for diff")
+    backups.add_argument("--interface")
+    backups.add_argument("--since")
+    backups.add_argument("--until")
+    backups.add_argument("--limit", type=int)
+    backups.set_defaults(func=cmd_backups)
+
+    validate = sub.add_parser("validate", help="check configs for key, address, port and rule errors")
+    validate.set_defaults(func=cmd_validate)
+
+    exporter = sub.add_parser("exporter", help="serve Prometheus metrics for peers and forwarded ports")
+    exporter.add_argument("--listen", default="127.0.0.1:9586", help="host:port to serve /metrics on")
+    exporter.add_argument("--interval", type=float, default=15.0, help="minimum seconds between samples; scrapes in between get the cached sample")
+    exporter.add_argument("--once", action="store_true", help="print one sample to stdout (e.g. for the node_exporter textfile collector)")
+    exporter.set_defaults(func=cmd_exporter)
+
+    agent = sub.add_parser("agent", help="serve batch port operations for a fleet controller")
+    agent.add_argument("--listen", default="127.0.0.1:9587", help="host:port to listen on")
+    agent.add_argument("--token", help="shared secret required from the controller (default: $PPWM_FLEET_TOKEN, else a generated token stored 0600 in the config dir)")
+    agent.set_defaults(func=cmd_agent)
+
+    fleet = sub.add_parser("fleet", help="push port operations to many nodes in parallel")
+    fleet.add_argument("nodes", help="JSON list or mapping of nodes: url (http://host:port or ssh://user@host), token, config_dir")
+    fleet.add_argument("action", choices=["push", "validate", "summary", "health"])
+    fleet.add_argument("--plan", metavar="FILE", help="JSON list of operations for every node, or {operations, nodes: {name: operations}}")
+    fleet.add_argument("--concurrency", type=int, default=16)
+    fleet.add_argument("--timeout", type=float, default=30)
+    fleet.set_defaults(func=cmd_fleet)
+
+    sync = sub.add_parser("sync", help="sync forwarded ports with a node's Pterodactyl/Pelican allocations")
+    sync.add_argument("config")
+    sync.add_argument("--panel", required=True, help="panel base URL, e.g. https://panel.example.com")
+    sync.add_argument("--node", required=True, help="panel node id")
+    sync.add_argument("--api-key", help="application API key (default: $PPWM_PANEL_KEY)")
+    sync.add_argument("--protocol", choices=["tcp", "udp", "both"], default="both")
+    sync.add_argument("--category", choices=CATEGORIES, default="Games")
+    sync.add_argument("--per-page", type=int, default=100)
+    sync.add_argument("--dry-run", action="store_true")
+    sync.set_defaults(func=cmd_sync)
+
+    watch = sub.add_parser("watch", help="watch the config dir and hot-apply changes as configs are edited")
+    watch.add_argument("--debounce", type=float, default=0.5, help="seconds of quiet before a burst of writes is applied")
+    watch.add_argument("--poll-interval", type=float, default=2.0, help="scan interval when inotify is unavailable")
+    watch.add_argument("--no-apply", action="store_true", help="only validate and regenerate rules, do not touch running interfaces")
+    watch.set_defaults(func=cmd_watch)
+
+    tune = sub.add_parser("tune", help="size conntrack, UDP buffers, offloads and tunnel MTU as a reversible profile")
+    tune.add_argument("action", choices=["plan", "apply", "revert", "reapply"], help="reapply restores a saved profile, e.g. at boot")
+    tune.add_argument("--mtu", type=int, help="tunnel MTU to set instead of probing peer endpoints")
+    tune.add_argument("--no-probe", action="store_true", help="leave tunnel MTUs unchanged")
+    tune.add_argument("--iface", help="uplink interface for offload settings (default: the default route's)")
+    tune.set_defaults(func=cmd_tune)
+
+    benchmark = sub.add_parser("benchmark", help="time parsing, rule generation and summaries on synthetic configs")
+    benchmark.add_argument("--sizes", help="comma-separated INTERFACESxPORTS (default: 1x10 up to 1x10000 and 100x100)")
+    benchmark.add_argument("--repeat", type=int, default=3)
+    benchmark.add_argument("--baseline", metavar="FILE", help="compare against a saved baseline and exit 1 on regressions")
+    benchmark.add_argument("--save-baseline", metavar="FILE")
+    benchmark.add_argument("--tolerance", type=float, help="allowed slowdown before a case counts as a regression (default: 0.25)")
+    benchmark.set_defaults(func=cmd_benchmark)
+    return parser
+
+def run(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    from profiling import PROFILE_ENV, enable, span
+    if args.profile or os.environ.get(PROFILE_ENV): enable(args.profile or os.environ[PROFILE_ENV])
+    with span(f"command.{'batch' if args.batch else args.command}", argv=" ".join(sys.argv[1:] if argv is None else argv)):
+        from transactions import recover
+        for path in recover(args.config_dir): print(f"{path}: completed an interrupted write from its journal.")
+        if args.batch:
+            with open(args.batch) as f: data = json.load(f)
+            return run_batch(data.get("operations") if isinstance(data, dict) else data, args.config_dir, args.apply)
+        if not args.command:
+            parser.print_help(); return 1
+        return args.func(args)
+
+if __name__ == "__main__": sys.exit(run())
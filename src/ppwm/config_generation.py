@@ -1,64 +1,107 @@
-import os, subprocess
+import ipaddress, json, os, threading, time
 from datetime import datetime
+from config_model import load
+from transactions import atomic_write
+from ip_allocator import IPAllocator
+from profiling import traced
+from keys import generate_keypair, generate_keypairs, public_key
+
+NETWORK_CACHE = ".ppwm-network-cache.json"
+NETWORK_TTL = 6 * 3600
+NETWORK_TIMEOUT = 2
+PUBLIC_IP_URLS = ["https://api.ipify.org", "https://ifconfig.me/ip"]
 
 def get_input(prompt, default=None):
     return input(f"{prompt}\n(Default: {default}): ").strip() or default
 
+def get_count(prompt, default="0"):
+    while not (value := get_input(prompt, default)).isdigit():
+        print(f"'{value}' is not a valid count; enter 0 or a positive whole number.")
+    return int(value)
+
 def generate_keys():
-    priv = subprocess.check_output(['wg', 'genkey']).decode().strip()
-    return priv, subprocess.check_output(['wg', 'pubkey'], input=priv.encode()).decode().strip()
+    return generate_keypair()
 
-def get_network_info():
+def default_interface():
     try:
-        iface = [line.split()[4] for line in subprocess.check_output(['ip', 'route']).decode().splitlines() if 'default' in line][0]
-    except:
-        iface = None
+        with open("/proc/net/route") as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[1] == "00000000" and fields[7] == "00000000": return fields[0]
+    except (OSError, IndexError):
+        pass
+    return None
+
+@traced("network.fetch_public_ip")
+def fetch_public_ip(timeout=NETWORK_TIMEOUT):
+    from urllib.request import urlopen
+    for url in PUBLIC_IP_URLS:
+        try:
+            with urlopen(url, timeout=timeout) as response: public_ip = response.read(64).decode().strip()
+            ipaddress.ip_address(public_ip)
+            return public_ip
+        except (OSError, ValueError):
+            continue
+    return None
+
+@traced("network.get_network_info")
+def get_network_info(config_dir="/etc/wireguard", ttl=NETWORK_TTL):
+    iface, cache_path = default_interface(), os.path.join(config_dir, NETWORK_CACHE)
     try:
-        public_ip = subprocess.check_output(['curl', '-s', 'https://api.ipify.org']).decode().strip()
-    except:
-        public_ip = None
+        with open(cache_path) as f: cached = json.load(f)
+        if time.time() - cached["time"] < ttl and cached["iface"] == iface and cached["public_ip"]: return iface, cached["public_ip"]
+    except (OSError, ValueError, KeyError):
+        pass
+    public_ip = fetch_public_ip()
+    if public_ip:
+        try:
+            atomic_write(cache_path, json.dumps({"iface": iface, "public_ip": public_ip, "time": time.time()}))
+        except OSError:
+            pass
     return iface, public_ip
 
-def generate_config():
-    cfg_name = get_input("Enter config name", "wg0")
-    include_mtu = get_input("Include MTU?\n (yes/no)", "no").lower() == "yes"
-    mtu = get_input("Enter MTU", "1420") if include_mtu else None
-    include_dns = get_input("Include DNS?\n (yes/no)", "yes").lower() == "yes"
-    dns_ip = get_input("Enter DNS IP", "1.1.1.1") if include_dns else None
-    port = get_input("Enter listening port", "51820")
-    iface, pub_ip = get_network_info()
-
-    iface = get_input(f"Enter interface\n({'Autodetected: ' + iface if iface else 'Unable to detect, enter manually'})", iface or "")
-    pub_ip = get_input(f"Enter public IP\n({'Autodetected: ' + pub_ip if pub_ip else 'Unable to detect, enter manually'})", pub_ip or "")
-    keepalive = get_input("Persistent keepalive", "25")
+def prefetch_network_info(config_dir="/etc/wireguard"):
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(info=get_network_info(config_dir)), daemon=True)
+    worker.start()
+    def wait():
+        worker.join(NETWORK_TIMEOUT * len(PUBLIC_IP_URLS) + 1)
+        return result.get("info", (default_interface(), None))
+    return wait
+
+def render_client_config(cli_priv, client_ip, srv_pub, pub_ip, port="51820", keepalive="25", mtu=None, dns_ip=None,
+                         include_allow_deny_client=True):
+    client_allow_deny = (f"PostUp = iptables -P INPUT ACCEPT\n"
+                         f"PostUp = iptables -P FORWARD ACCEPT\n"
+                         f"PostDown = iptables -P INPUT DROP\n"
+                         f"PostDown = iptables -P FORWARD DROP\n") if include_allow_deny_client else ""
+    mtu_line = f"MTU = {mtu}\n" if mtu else ""
+    dns_line = f"DNS = {dns_ip}\n" if dns_ip else ""
 
-    if get_input("Generate keys?\n (yes/no)", "yes").lower() == "yes":
-        srv_priv, srv_pub = generate_keys()
-        cli_priv, cli_pub = generate_keys()
-    else:
-        srv_priv = get_input("Enter server private key")
-        srv_pub = get_input("Enter server public key")
-        cli_priv = get_input("Enter client private key")
-        cli_pub = get_input("Enter client public key")
+    return f"""[Interface]
+Address = {client_ip}/24
+PrivateKey = {cli_priv}
+{dns_line}
+{mtu_line}
+{client_allow_deny}[Peer]
+PublicKey = {srv_pub}
+Endpoint = {pub_ip}:{port}
+AllowedIPs = 0.0.0.0/0
+PersistentKeepalive = {keepalive}
+"""
 
-    subnet = int(get_input("Enter subnet to use\n (10.60.x.1, where x cannot be 0)", "2"))
-    client_ip = get_input(f"Enter client IP\n (10.60.{subnet}.x, where x cannot be 0 or 1)", f"10.60.{subnet}.2")
+def render_configs(cfg_name, server_keys, client_keys, subnet, client_ip, iface, pub_ip, port="51820", keepalive="25",
+                   mtu=None, dns_ip=None, include_allow_deny_server=True, include_allow_deny_client=True):
+    srv_priv, srv_pub = server_keys
+    cli_priv, cli_pub = client_keys
     wg_ip = f"10.60.{subnet}.1/24"
     subnet_cidr = f"10.60.{subnet}.0/24"
 
-    include_allow_deny_server = get_input("Add automatic allow/deny rules for the server?\n (yes/no)", "yes").lower() == "yes"
-    include_allow_deny_client = get_input("Add automatic allow/deny rules for the client?\n (yes/no)", "yes").lower() == "yes"
-
     server_allow_deny = (f"PostUp = iptables -P INPUT ACCEPT\n"
                          f"PostUp = iptables -P FORWARD ACCEPT\n"
                          f"PostDown = iptables -P INPUT DROP\n"
                          f"PostDown = iptables -P FORWARD DROP\n") if include_allow_deny_server else ""
 
-    client_allow_deny = (f"PostUp = iptables -P INPUT ACCEPT\n"
-                         f"PostUp = iptables -P FORWARD ACCEPT\n"
-                         f"PostDown = iptables -P INPUT DROP\n"
-                         f"PostDown = iptables -P FORWARD DROP\n") if include_allow_deny_client else ""
-
     postup = (f"PostUp = iptables -t nat -A POSTROUTING -s {subnet_cidr} -o {iface} -j SNAT --to-source {pub_ip}\n"
               f"PostUp = iptables -A FORWARD -i {iface} -o {cfg_name} -j ACCEPT\n"
               f"PostUp = iptables -A FORWARD -i {cfg_name} -j ACCEPT\n"
@@ -66,13 +109,11 @@ def generate_config():
               f"PostDown = iptables -t nat -D POSTROUTING -s {subnet_cidr} -o {iface} -j SNAT --to-source {pub_ip}\n"
               f"PostDown = iptables -D FORWARD -i {iface} -o {cfg_name} -j ACCEPT\n"
               f"PostDown = iptables -D FORWARD -i {cfg_name} -j ACCEPT\n")
-
-    out_dir = f"/etc/wireguard/{cfg_name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    os.makedirs(out_dir, exist_ok=True)
+    mtu_line = f"MTU = {mtu}\n" if mtu else ""
 
     srv_cfg = f"""[Interface]
 Address = {wg_ip}
-{f'MTU = {mtu}\n' if include_mtu else ''}ListenPort = {port}
+{mtu_line}ListenPort = {port}
 PrivateKey = {srv_priv}
 {postup}
 
@@ -87,20 +128,87 @@ AllowedIPs = {client_ip.split('/')[0]}/32
 PersistentKeepalive = {keepalive}
 """
 
-    cli_cfg = f"""[Interface]
-Address = {client_ip}/24
-PrivateKey = {cli_priv}
-{f'DNS = {dns_ip}\n' if include_dns else ''}
-{f'MTU = {mtu}\n' if include_mtu else ''}
-{client_allow_deny}[Peer]
-PublicKey = {srv_pub}
-Endpoint = {pub_ip}:{port}
-AllowedIPs = 0.0.0.0/0
-PersistentKeepalive = {keepalive}
-"""
+    cli_cfg = render_client_config(cli_priv, client_ip, srv_pub, pub_ip, port, keepalive, mtu, dns_ip, include_allow_deny_client)
+    return srv_cfg, cli_cfg
 
+def write_configs(cfg_name, srv_cfg, cli_cfg, config_dir="/etc/wireguard"):
+    out_dir = f"{config_dir}/{cfg_name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.makedirs(out_dir, exist_ok=True)
     for path, content in [(f"{out_dir}/{cfg_name}_server.conf", srv_cfg), (f"{out_dir}/{cfg_name}_client.conf", cli_cfg)]:
         with open(path, "w") as f: f.write(content)
+    return out_dir
+
+def provision_peers(config, count, pub_ip, keepalive="25", mtu=None, dns_ip=None, include_allow_deny_client=True, allocator=None):
+    address = config.interface_value("Address")
+    if not address: raise ValueError("Config has no [Interface] Address.")
+    prefix = address.split("/")[0].rsplit(".", 1)[0]
+    used = set(config.peer_ips()) | {address.split("/")[0]}
+    candidates = allocator.free_hosts(prefix) if allocator else range(2, 255)
+    hosts = [host for host in candidates if f"{prefix}.{host}" not in used][:count]
+    if len(hosts) < count: raise ValueError(f"Only {len(hosts)} free addresses left in {prefix}.0/24.")
+    if allocator:
+        for host in hosts: allocator.reserve(f"{prefix}.{host}")
+    srv_pub = public_key(config.interface_value("PrivateKey"))
+    port = config.interface_value("ListenPort") or "51820"
+    clients = []
+    for host, (cli_priv, cli_pub) in zip(hosts, generate_keypairs(count)):
+        client_ip = f"{prefix}.{host}"
+        config.add_peer(cli_pub, f"{client_ip}/32", keepalive)
+        clients.append((client_ip, render_client_config(cli_priv, client_ip, srv_pub, pub_ip, port, keepalive, mtu, dns_ip,
+                                                        include_allow_deny_client)))
+    return clients
+
+def write_client_configs(cfg_name, clients, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for client_ip, content in clients:
+        with open(f"{out_dir}/{cfg_name}_client_{client_ip.replace('.', '-')}.conf", "w") as f: f.write(content)
+    return out_dir
+
+def generate_config(config_dir="/etc/wireguard"):
+    network_info = prefetch_network_info(config_dir)
+    cfg_name = get_input("Enter config name", "wg0")
+    include_mtu = get_input("Include MTU?\n (yes/no)", "no").lower() == "yes"
+    if include_mtu:
+        from tuning import suggested_mtu
+        mtu = get_input("Enter MTU", suggested_mtu(config_dir))
+    else: mtu = None
+    include_dns = get_input("Include DNS?\n (yes/no)", "yes").lower() == "yes"
+    dns_ip = get_input("Enter DNS IP", "1.1.1.1") if include_dns else None
+    port = get_input("Enter listening port", "51820")
+    iface, pub_ip = network_info()
+
+    iface = get_input(f"Enter interface\n({'Autodetected: ' + iface if iface else 'Unable to detect, enter manually'})", iface or "")
+    pub_ip = get_input(f"Enter public IP\n({'Autodetected: ' + pub_ip if pub_ip else 'Unable to detect, enter manually'})", pub_ip or "")
+    keepalive = get_input("Persistent keepalive", "25")
+
+    if get_input("Generate keys?\n (yes/no)", "yes").lower() == "yes":
+        srv_priv, srv_pub = generate_keys()
+        cli_priv, cli_pub = generate_keys()
+    else:
+        srv_priv = get_input("Enter server private key")
+        srv_pub = get_input("Enter server public key")
+        cli_priv = get_input("Enter client private key")
+        cli_pub = get_input("Enter client public key")
+
+    allocator = IPAllocator(config_dir)
+    subnet = int(get_input("Enter subnet to use\n (10.60.x.1, where x cannot be 0)", str(allocator.next_subnet())))
+    if f"10.60.{subnet}" in allocator.used: print(f"Warning: 10.60.{subnet}.0/24 is already used by another config.")
+    client_ip = get_input(f"Enter client IP\n (10.60.{subnet}.x, where x cannot be 0 or 1)", allocator.next_host(f"10.60.{subnet}"))
+    if allocator.is_used(client_ip): print(f"Warning: {client_ip} is already allocated.")
+
+    include_allow_deny_server = get_input("Add automatic allow/deny rules for the server?\n (yes/no)", "yes").lower() == "yes"
+    include_allow_deny_client = get_input("Add automatic allow/deny rules for the client?\n (yes/no)", "yes").lower() == "yes"
+
+    srv_cfg, cli_cfg = render_configs(cfg_name, (srv_priv, srv_pub), (cli_priv, cli_pub), subnet, client_ip, iface, pub_ip,
+                                      port, keepalive, mtu, dns_ip, include_allow_deny_server, include_allow_deny_client)
+    out_dir = write_configs(cfg_name, srv_cfg, cli_cfg, config_dir)
+    extra_peers = get_count("Number of additional peers to provision")
+    if extra_peers > 0:
+        server = load(f"{out_dir}/{cfg_name}_server.conf")
+        allocator.reserve(client_ip)
+        write_client_configs(cfg_name, provision_peers(server, extra_peers, pub_ip, keepalive, mtu, dns_ip, include_allow_deny_client,
+                                                       allocator), out_dir)
+        server.save()
 
     print(f"Config saved to {out_dir}.")
     choice = get_input("Press 'r' to return to main menu\n or 'p' to enter Port Management.")
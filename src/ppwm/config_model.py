@@ -0,0 +1,277 @@
+import os, re
+from ruleset import IptablesBackend, compact_rules
+from nft_backend import NftBackend
+from profiling import traced
+from transactions import ConflictError, commit, digest, file_digest, locked
+
+CATEGORIES = ["Games", "Services", "Miscellaneous"]
+PORT_LINE = re.compile(r"^#?\s*Port:\s*(\d+)\s*[/(]\s*(tcp|udp)\)?(?:\s*->\s*(\d+))?(?:\s+-\s+(.*))?$", re.I)
+CLIENT_TARGET = re.compile(r"(--to-destination )[^\s:]+")
+IPSET_NAME = re.compile(r"\bppwm-[\w.-]+-(tcp|udp)\b")
+RESTORE_RULE = re.compile(r"^(iptables-restore --noflush \S+\.(up|down)\.rules|ipset restore -exist -file \S+\.ipset)$")
+NFT_RULE = re.compile(r"^nft (-f \S+\.nft|delete table ip ppwm_\w+)$")
+RULE_MODES = ["single", "multiport", "ipset", "nft"]
+APPLY_MODES = ["postup", "restore"]
+
+def rule_template(rule):
+    if "--to-destination " in rule: rule = CLIENT_TARGET.sub(r"\1<client_ip>", rule)
+    return IPSET_NAME.sub(r"ppwm-<name>-\1", rule) if "ppwm-" in rule else rule
+
+def expand_ports(spec):
+    ports = []
+    for part in filter(None, (part.strip() for part in str(spec).split(","))):
+        low, _, high = part.partition("-")
+        if not low.strip().isdigit() or (high and not high.strip().isdigit()):
+            raise ValueError(f"Invalid port '{part}'.")
+        low, high = int(low), int(high or low)
+        if not 1 <= low <= high <= 65535:
+            raise ValueError(f"Port range '{part}' is outside 1-65535.")
+        ports.extend(range(low, high + 1))
+    return list(dict.fromkeys(ports))
+
+class PortEntry:
+    def __init__(self, port, protocol, forward=None, comment=None):
+        self.port, self.protocol = int(port), protocol.lower()
+        self.forward = int(forward) if forward else None
+        self.comment = comment or None
+        self.notes = []
+
+    @property
+    def target(self):
+        return self.forward or self.port
+
+    def line(self):
+        return (f"Port: {self.port}/{self.protocol}" + (f" -> {self.forward}" if self.forward else "")
+                + (f" - {self.comment}" if self.comment else ""))
+
+class WireGuardConfig:
+    def __init__(self, path=None):
+        self.path = path
+        self.rule_mode, self.apply_mode = "single", "postup"
+        self.header, self.interface, self.peers = [], [], []
+        self.post_up, self.post_down = [], []
+        self.categories, self.notes = {}, {}
+        self.port_index, self.subsection_index = {}, {}
+        self.applied_rules, self.applied_peers = ([], []), None
+        self.loaded = None
+
+    @classmethod
+    @traced("config.parse", lambda cls, text, path=None: {"path": path, "bytes": len(text)})
+    def parse(cls, text, path=None):
+        cfg, section, subsection, peer = cls(path), None, None, None
+        for raw in text.splitlines():
+            line = raw.strip()
+            if line.startswith("[Category:"):
+                section, subsection = "category", None
+                cfg.categories.setdefault(line.split(":", 1)[1].strip(" ]"), {})
+            elif line == "[Interface]":
+                section = "interface"
+            elif line == "[Peer]":
+                section, peer = "peer", [line]
+                cfg.peers.append(peer)
+            elif section == "category":
+                category = next(reversed(cfg.categories))
+                if line.startswith("Subsection:"):
+                    subsection = line.split(":", 1)[1].strip()
+                    cfg.categories[category].setdefault(subsection, [])
+                    cfg.subsection_index[subsection] = category
+                elif (match := PORT_LINE.match(line)) and subsection is not None:
+                    cfg._index(category, subsection, PortEntry(*match.groups()))
+                elif line:
+                    entries = cfg.categories[category].get(subsection) if subsection is not None else None
+                    (entries[-1].notes if entries else cfg.notes.setdefault((category, subsection), [])).append(raw.rstrip())
+            elif section == "interface":
+                key, _, value = line.partition("=")
+                if key.strip() == "# RuleMode" and value.strip() in RULE_MODES:
+                    cfg.rule_mode = value.strip()
+                elif key.strip() == "# RuleApply" and value.strip() in APPLY_MODES:
+                    cfg.apply_mode = value.strip()
+                elif key.strip() in ("PostUp", "PostDown") and value:
+                    (cfg.post_up if key.strip() == "PostUp" else cfg.post_down).append(value.strip())
+                elif line != "# Categories and Subsections":
+                    cfg.interface.append(raw.rstrip())
+            elif section == "peer":
+                peer.append(raw.rstrip())
+            else:
+                cfg.header.append(raw.rstrip())
+        rendered = cfg._rendered()
+        cfg.post_up = [rule for rule in cfg.post_up if not cfg._managed(rule, rendered)]
+        cfg.post_down = [rule for rule in cfg.post_down if not cfg._managed(rule, rendered)]
+        cfg.mark_applied()
+        return cfg
+
+    def mark_applied(self):
+        self.applied_rules, self.applied_peers = self.effective_rules(), self.wg_config()
+
+    def _rendered(self):
+        entries, rules = [entry for _, _, entry in self.port_index.values()], set()
+        for mode in {"single", self.rule_mode} - {"nft"}:
+            for batch in compact_rules(entries, "<client_ip>", mode, "<name>"): rules.update(batch)
+        return rules
+
+    def _managed(self, rule, rendered):
+        return bool(RESTORE_RULE.match(rule) or NFT_RULE.match(rule)) or rule_template(rule) in rendered
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)[:-5] if self.path and self.path.endswith(".conf") else "wg"
+
+    def _index(self, category, subsection, entry):
+        self.categories[category][subsection].append(entry)
+        self.port_index[(entry.port, entry.protocol)] = (category, subsection, entry)
+
+    def interface_value(self, key):
+        for line in self.interface:
+            name, _, value = line.partition("=")
+            if name.strip() == key: return value.strip()
+        return None
+
+    def set_interface_value(self, key, value):
+        lines = [line for line in self.interface if line.partition("=")[0].strip() != key]
+        if value is not None:
+            at = next((i + 1 for i, line in enumerate(lines) if line.partition("=")[0].strip() == "Address"), len(lines))
+            lines.insert(at, f"{key} = {value}")
+        self.interface = lines
+
+    def peer_ips(self):
+        ips = []
+        for peer in self.peers:
+            for line in peer:
+                key, _, value = line.partition("=")
+                if key.strip() == "AllowedIPs":
+                    ips += [ip.strip().split("/")[0] for ip in value.split(",") if ip.strip().endswith("/32")]
+        return ips
+
+    def add_peer(self, public_key, allowed_ips, keepalive=None):
+        self.peers.append(["[Peer]", f"PublicKey = {public_key}", f"AllowedIPs = {allowed_ips}"]
+                          + ([f"PersistentKeepalive = {keepalive}"] if keepalive else []))
+
+    def client_ip(self):
+        for peer in self.peers:
+            for line in peer:
+                key, _, value = line.partition("=")
+                if key.strip() == "AllowedIPs" and value.strip().endswith("/32"):
+                    return value.strip().split(",")[0].split("/")[0]
+        return "<client_ip>"
+
+    def has_template(self):
+        return bool(self.categories)
+
+    def initialize_template(self):
+        for category in CATEGORIES: self.categories.setdefault(category, {})
+
+    def subsections(self, category):
+        return list(self.categories.get(category, {}))
+
+    def ports(self, subsection):
+        category = self.subsection_index.get(subsection)
+        return list(self.categories[category][subsection]) if category else []
+
+    def add_subsection(self, category, name):
+        if name in self.subsection_index: return False
+        self.categories.setdefault(category, {})[name] = []
+        self.subsection_index[name] = category
+        return True
+
+    def delete_subsection(self, name):
+        category = self.subsection_index.pop(name, None)
+        if category is None: return False
+        for entry in self.categories[category].pop(name):
+            del self.port_index[(entry.port, entry.protocol)]
+        self.notes.pop((category, name), None)
+        return True
+
+    def add_port(self, subsection, port, protocol, forward=None, comment=None):
+        protocols = ["tcp", "udp"] if protocol == "both" else [protocol]
+        if subsection not in self.subsection_index or any((int(port), p) in self.port_index for p in protocols):
+            return False
+        for proto in protocols:
+            self._index(self.subsection_index[subsection], subsection, PortEntry(port, proto, forward, comment))
+        return True
+
+    def add_ports(self, subsection, ports, protocol, forward_mapping=None, comment=None):
+        forward_mapping = forward_mapping or {}
+        added, skipped = [], []
+        for port in ports:
+            (added if self.add_port(subsection, port, protocol, forward_mapping.get(port), comment) else skipped).append(port)
+        return added, skipped
+
+    def remove_ports(self, ports, protocol):
+        return [port for port in ports if self.remove_port(port, protocol)]
+
+    def remove_port(self, port, protocol):
+        removed = False
+        for proto in (["tcp", "udp"] if protocol == "both" else [protocol]):
+            found = self.port_index.pop((int(port), proto), None)
+            if found:
+                category, subsection, entry = found
+                entries = self.categories[category][subsection]
+                at = entries.index(entry)
+                (entries[at - 1].notes if at else self.notes.setdefault((category, subsection), [])).extend(entry.notes)
+                entries.remove(entry)
+                removed = True
+        return removed
+
+    @property
+    def backend(self):
+        return (NftBackend if self.rule_mode == "nft" else IptablesBackend)(self)
+
+    def port_rules(self):
+        return self.backend.render()
+
+    def rules(self):
+        backend = self.backend
+        ups, downs = backend.hooks(*backend.render())
+        return self.post_up + ups, self.post_down + downs
+
+    def effective_rules(self):
+        ups, downs = self.port_rules()
+        return self.post_up + ups, self.post_down + downs
+
+    def wg_config(self):
+        keys = ("PrivateKey", "ListenPort", "FwMark")
+        lines = ["[Interface]"] + [line.strip() for line in self.interface if line.partition("=")[0].strip() in keys]
+        for peer in self.peers:
+            lines += [line.strip() for line in peer if line.strip() and not line.strip().startswith("#")]
+        return "\n".join(lines) + "\n"
+
+    def ruleset_files(self):
+        backend = self.backend
+        return backend.files(*backend.render())
+
+    @traced("config.serialize", lambda self: {"path": self.path})
+    def serialize(self):
+        interface = list(self.interface)
+        while interface and not interface[-1].strip(): interface.pop()
+        ups, downs = self.rules()
+        if self.rule_mode != "single": interface.append(f"# RuleMode = {self.rule_mode}")
+        if self.apply_mode != "postup": interface.append(f"# RuleApply = {self.apply_mode}")
+        lines = self.header + (["[Interface]"] + interface if interface or ups or downs else [])
+        lines += [f"PostUp = {rule}" for rule in ups] + [f"PostDown = {rule}" for rule in downs]
+        if self.categories:
+            lines += ["", "# Categories and Subsections"]
+            for category, subsections in self.categories.items():
+                lines += [f"[Category: {category}]"] + self.notes.get((category, None), [])
+                for subsection, entries in subsections.items():
+                    lines += [f"Subsection: {subsection}"] + self.notes.get((category, subsection), [])
+                    for entry in entries: lines += [entry.line()] + entry.notes
+        for peer in self.peers:
+            while lines and not lines[-1].strip(): lines.pop()
+            lines += [""] + peer
+        return "\n".join(lines).rstrip() + "\n"
+
+    @traced("config.save", lambda self, path=None: {"path": path or self.path})
+    def save(self, path=None):
+        path, text = path or self.path, self.serialize()
+        with locked(path):
+            if path == self.path and self.loaded and file_digest(path) != self.loaded:
+                raise ConflictError(f"{path} was changed by someone else since it was loaded; reload it and retry.")
+            commit(path, {**self.ruleset_files(), path: text})
+        if path == self.path: self.loaded = digest(text)
+
+@traced("config.load", lambda config_path: {"path": config_path})
+def load(config_path):
+    with open(config_path) as f: text = f.read()
+    config = WireGuardConfig.parse(text, config_path)
+    config.loaded = digest(text)
+    return config
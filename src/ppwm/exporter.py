@@ -0,0 +1,140 @@
+import re, subprocess, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from live_apply import interface_up
+from live_view import wg_dump
+from port_summary import collect_summary
+
+COUNTER_LINE = re.compile(r"^\[(\d+):(\d+)\] -A (PREROUTING|FORWARD) (.*)$")
+MATCHES = [("port", re.compile(r"--dport (\d+)\b")), ("ports", re.compile(r"--dports ([\d,:]+)")),
+           ("set", re.compile(r"--match-set (\S+) dst"))]
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def iptables_counters():
+    try:
+        output = subprocess.run(["iptables-save", "-c"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    counters, table = [], None
+    for line in output.splitlines():
+        if line.startswith("*"): table = line[1:]
+        elif (match := COUNTER_LINE.match(line)) and (proto := re.search(r"-p (tcp|udp)\b", match.group(4))):
+            for kind, pattern in MATCHES:
+                if found := pattern.search(match.group(4)):
+                    counters.append({"table": table, "chain": match.group(3), "protocol": proto.group(1), kind: found.group(1),
+                                     "packets": int(match.group(1)), "bytes": int(match.group(2))})
+                    break
+    return counters
+
+def expand_dports(spec):
+    ports = []
+    for part in spec.split(","):
+        low, _, high = part.partition(":")
+        ports.extend(range(int(low), int(high or low) + 1))
+    return ports
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def labels(**values):
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in values.items() if value is not None) + "}"
+
+def owner_of(counter, managed, sets):
+    if "set" in counter: return sets.get(counter["set"], (None, None, None))
+    owners = {managed.get((port, counter["protocol"]), (None, None, None)) for port in
+              ([int(counter["port"])] if "port" in counter else expand_dports(counter["ports"]))}
+    if len(owners) == 1: return owners.pop()
+    interfaces = {owner[0] for owner in owners}
+    return (interfaces.pop() if len(interfaces) == 1 else None), None, None
+
+def render_metrics(summary, dump, counters, now, duration):
+    managed, sets, out = {}, {}, []
+    metric = lambda name, kind, help_text: out.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+    metric("ppwm_interface_up", "gauge", "Whether the WireGuard interface is up.")
+    for interface in sorted(summary.keys() | dump.keys()):
+        out.append(f"ppwm_interface_up{labels(interface=interface)} {int(interface in dump or interface_up(interface))}")
+    metric("ppwm_managed_port_info", "gauge", "Forwarded ports managed per category and subsection.")
+    for interface, categories in summary.items():
+        for proto in ("tcp", "udp"): sets[f"ppwm-{interface}-{proto}"[:31]] = (interface, None, None)
+        for category, subsections in categories.items():
+            for subsection, ports in subsections.items():
+                for port in ports:
+                    managed[(port["port"], port["protocol"])] = (interface, category, subsection)
+                    out.append(f"ppwm_managed_port_info{labels(interface=interface, category=category, subsection=subsection, port=port['port'], protocol=port['protocol'], forward=port['forward'] or port['port'], comment=port['comment'] or '')} 1")
+    metric("ppwm_subsection_ports", "gauge", "Number of forwarded ports per subsection.")
+    for interface, categories in summary.items():
+        for category, subsections in categories.items():
+            for subsection, ports in subsections.items():
+                out.append(f"ppwm_subsection_ports{labels(interface=interface, category=category, subsection=subsection)} {len(ports)}")
+
+    peers = [(interface, peer) for interface, info in sorted(dump.items()) for peer in info["peers"]]
+    for name, kind, help_text, value in [
+            ("ppwm_peer_receive_bytes_total", "counter", "Bytes received from the peer.", lambda peer: peer["rx"]),
+            ("ppwm_peer_transmit_bytes_total", "counter", "Bytes sent to the peer.", lambda peer: peer["tx"]),
+            ("ppwm_peer_latest_handshake_seconds", "gauge", "Unix time of the latest handshake, 0 if never.", lambda peer: peer["latest_handshake"]),
+            ("ppwm_peer_handshake_age_seconds", "gauge", "Seconds since the latest handshake.",
+             lambda peer: int(now) - peer["latest_handshake"] if peer["latest_handshake"] else None)]:
+        metric(name, kind, help_text)
+        for interface, peer in peers:
+            if (sample := value(peer)) is not None:
+                out.append(f"{name}{labels(interface=interface, public_key=peer['public_key'], allowed_ips=peer['allowed_ips'])} {sample}")
+
+    for field, help_text in (("packets", "Packets matched by forwarded-port rules."), ("bytes", "Bytes matched by forwarded-port rules.")):
+        metric(f"ppwm_forward_{field}_total", "counter", help_text)
+        totals = {}
+        for counter in counters:
+            interface, category, subsection = owner_of(counter, managed, sets)
+            if interface is None: continue
+            ports = counter.get("port") or counter.get("ports", "").replace(":", "-") or counter.get("set")
+            key = labels(interface=interface, category=category, subsection=subsection, chain=counter["chain"], protocol=counter["protocol"], ports=ports)
+            totals[key] = totals.get(key, 0) + counter[field]
+        out += [f"ppwm_forward_{field}_total{key} {total}" for key, total in totals.items()]
+
+    metric("ppwm_scrape_duration_seconds", "gauge", "Time taken to sample wg, iptables and the configs.")
+    out.append(f"ppwm_scrape_duration_seconds {duration:.6f}")
+    metric("ppwm_sample_timestamp_seconds", "gauge", "Unix time the cached sample was taken.")
+    out.append(f"ppwm_sample_timestamp_seconds {now:.3f}")
+    return "\n".join(out) + "\n"
+
+class Exporter:
+    def __init__(self, config_dir="/etc/wireguard/", interval=15.0):
+        self.config_dir, self.interval = config_dir, interval
+        self.body, self.sampled = "", float("-inf")
+        self.lock = threading.Lock()
+
+    def sample(self):
+        start = time.monotonic()
+        summary, dump, counters = collect_summary(self.config_dir), wg_dump(), iptables_counters()
+        return render_metrics(summary, dump, counters, time.time(), time.monotonic() - start)
+
+    def metrics(self):
+        with self.lock:
+            if time.monotonic() - self.sampled >= self.interval:
+                self.body, self.sampled = self.sample(), time.monotonic()
+            return self.body
+
+def handler_for(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404, "Metrics are served at /metrics"); return
+            body = exporter.metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return MetricsHandler
+
+def serve(listen="127.0.0.1:9586", config_dir="/etc/wireguard/", interval=15.0):
+    host, _, port = listen.rpartition(":")
+    server = ThreadingHTTPServer((host.strip("[]") or "0.0.0.0", int(port)), handler_for(Exporter(config_dir, interval)))
+    print(f"Serving metrics on http://{listen}/metrics (sampled at most every {interval:g}s).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
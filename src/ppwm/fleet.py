@@ -0,0 +1,177 @@
+import hmac, http.client, json, os, secrets, shlex, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+AGENT_PORT = 9587
+TOKEN_FILE = ".ppwm-agent-token"
+SSH_OPTIONS = ["-o", "BatchMode=yes", "-o", "ControlMaster=auto", "-o", "ControlPath=~/.ssh/ppwm-%r@%h:%p", "-o", "ControlPersist=10m"]
+
+def load_nodes(path):
+    with open(path) as f: data = json.load(f)
+    nodes = [{"name": name, **node} for name, node in data.items()] if isinstance(data, dict) else data
+    for node in nodes:
+        node.setdefault("name", node["url"])
+        node.setdefault("token", os.environ.get("PPWM_FLEET_TOKEN", ""))
+    return nodes
+
+def operations_for(plan, node):
+    if isinstance(plan, list): return plan
+    return plan.get("operations", []) + plan.get("nodes", {}).get(node["name"], [])
+
+def run_local_batch(operations, config_dir, apply):
+    from cli import execute_batch
+    results = execute_batch(operations, config_dir, apply)
+    return {"status": int(any(not result["ok"] for result in results)), "results": results,
+            "output": "\n".join(result["message"] for result in results)}
+
+def agent_token(config_dir, token=""):
+    if token: return token, None
+    path = os.path.join(config_dir, TOKEN_FILE)
+    try:
+        with open(path) as f: token = f.read().strip()
+    except FileNotFoundError:
+        token = ""
+    if not token:
+        token = secrets.token_urlsafe(32)
+        fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f: f.write(token + "\n")
+        os.replace(path + ".tmp", path)
+    return token, path
+
+class Agent:
+    def __init__(self, config_dir="/etc/wireguard", token=""):
+        self.config_dir, self.token = config_dir, token
+
+    def authorized(self, header):
+        return bool(self.token) and hmac.compare_digest(header.encode(), f"Bearer {self.token}".encode())
+
+    def handle(self, path, body):
+        if path == "/health": return 200, {"status": 0}
+        if path == "/batch":
+            return 200, run_local_batch(body.get("operations", []), self.config_dir, body.get("apply", False))
+        if path == "/validate":
+            from validator import format_diagnostics, validate_configs
+            results = validate_configs(self.config_dir)
+            lines = [line for result in results.items() for line in format_diagnostics(*result)]
+            return 200, {"status": int(any(level == "error" for result in results.values() for _, level, _ in result)), "output": "\n".join(lines)}
+        if path == "/summary":
+            from port_summary import collect_summary
+            return 200, {"status": 0, "summary": collect_summary(self.config_dir)}
+        return 404, {"status": 1, "output": f"unknown endpoint {path}"}
+
+def handler_for(agent):
+    class AgentHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.do_POST()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b"{}"
+            if not agent.authorized(self.headers.get("Authorization", "")):
+                return self.reply(401, {"status": 1, "output": "unauthorized"})
+            try:
+                body = json.loads(raw or b"{}")
+                if not isinstance(body, dict): return self.reply(400, {"status": 1, "output": "request body must be a JSON object"})
+                self.reply(*agent.handle(self.path.split("?")[0], body))
+            except (ValueError, KeyError, OSError) as e:
+                self.reply(400, {"status": 1, "output": str(e)})
+
+        def log_message(self, *args):
+            pass
+    return AgentHandler
+
+def serve_agent(listen=f"127.0.0.1:{AGENT_PORT}", config_dir="/etc/wireguard", token=""):
+    host, _, port = listen.rpartition(":")
+    token, token_path = agent_token(config_dir, token)
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler_for(Agent(config_dir, token)))
+    print(f"Agent listening on {listen} for {config_dir}" + (f"; token in {token_path}." if token_path else "."), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+class NodeClient:
+    def __init__(self, node, timeout=30):
+        self.node, self.timeout, self.conn = node, timeout, None
+        self.url = urlsplit(node["url"] if "://" in node["url"] else f"http://{node['url']}")
+
+    def _ssh(self, endpoint, body):
+        config_dir = self.node.get("config_dir", "/etc/wireguard")
+        remote = self.node.get("command", "wireguard-manager")
+        if endpoint != "/batch":
+            return {"status": 1, "output": f"{endpoint} is only available through an HTTP agent"}
+        command = f"{remote} --config-dir {shlex.quote(config_dir)} --batch /dev/stdin" + (" --apply" if body.get("apply") else "")
+        target = self.url.netloc if not self.url.port else self.url.netloc.rsplit(":", 1)[0]
+        port = ["-p", str(self.url.port)] if self.url.port else []
+        result = subprocess.run(["ssh", *SSH_OPTIONS, *port, target, command], input=json.dumps(body.get("operations", [])),
+                                capture_output=True, text=True, timeout=self.timeout)
+        return {"status": result.returncode, "output": result.stdout + result.stderr}
+
+    def request(self, endpoint, body=None):
+        body = body or {}
+        if self.url.scheme == "ssh": return self._ssh(endpoint, body)
+        payload = json.dumps(body).encode()
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(payload))}
+        if self.node.get("token"): headers["Authorization"] = f"Bearer {self.node['token']}"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or AGENT_PORT, timeout=self.timeout)
+            try:
+                self.conn.request("POST", endpoint, payload, headers)
+                response = self.conn.getresponse()
+                return json.loads(response.read() or b"{}")
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt == 2: raise
+            except ValueError as e:
+                self.close()
+                return {"status": 1, "output": f"invalid response: {e}"}
+
+    def close(self):
+        if self.conn: self.conn.close()
+        self.conn = None
+
+class Fleet:
+    def __init__(self, nodes, concurrency=16, timeout=30):
+        self.clients = {node["name"]: NodeClient(node, timeout) for node in nodes}
+        self.concurrency = concurrency
+
+    def call(self, endpoint, body_for):
+        def one(name):
+            try:
+                return self.clients[name].request(endpoint, body_for(self.clients[name].node))
+            except (OSError, subprocess.SubprocessError, http.client.HTTPException) as e:
+                self.clients[name].close()
+                return {"status": 1, "output": f"unreachable: {e}"}
+        names = list(self.clients)
+        if not names: return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(names)))) as pool:
+            return dict(zip(names, pool.map(one, names)))
+
+    def push(self, plan, apply=False):
+        return self.call("/batch", lambda node: {"operations": operations_for(plan, node), "apply": apply})
+
+    def close(self):
+        for client in self.clients.values(): client.close()
+
+def print_results(results):
+    failed = [name for name, result in results.items() if result.get("status")]
+    for name, result in results.items():
+        print(f"=== {name}: {'FAILED' if result.get('status') else 'ok'} ===")
+        if result.get("output"): print(result["output"].rstrip())
+        if "summary" in result: print(json.dumps(result["summary"], indent=2))
+    print(f"{len(results) - len(failed)}/{len(results)} node(s) succeeded" + (f"; failed: {', '.join(failed)}" if failed else "."))
+    return 1 if failed else 0
@@ -0,0 +1,92 @@
+import ipaddress, json, os, re
+from transactions import atomic_write
+
+INDEX_FILE = ".ppwm-ip-index.json"
+GENERATED_DIR = re.compile(r"-\d{8}-\d{6}$")
+HOSTS = sum(1 << host for host in range(2, 255))
+
+def scan_addresses(path):
+    addresses = []
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition("=")
+            if key.strip() not in ("Address", "AllowedIPs"): continue
+            for cidr in value.split(","):
+                try:
+                    network = ipaddress.ip_interface(cidr.strip())
+                except ValueError:
+                    continue
+                if network.version == 4 and (key.strip() == "Address" or network.network.prefixlen == 32):
+                    addresses.append(str(network.ip))
+    return addresses
+
+class IPAllocator:
+    def __init__(self, config_dir="/etc/wireguard", base="10.60"):
+        self.config_dir, self.base = config_dir, base
+        self.index_path = os.path.join(config_dir, INDEX_FILE)
+        self.files, self.used = {}, {}
+        try:
+            with open(self.index_path) as f: self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+        self.refresh()
+
+    def config_files(self):
+        names = []
+        for name in sorted(os.listdir(self.config_dir) if os.path.isdir(self.config_dir) else []):
+            if name.endswith(".conf"): names.append(name)
+            elif GENERATED_DIR.search(name) and os.path.isdir(os.path.join(self.config_dir, name)):
+                names += [f"{name}/{conf}" for conf in sorted(os.listdir(os.path.join(self.config_dir, name))) if conf.endswith("_server.conf")]
+        return names
+
+    def refresh(self):
+        changed, files = False, {}
+        for name in self.config_files():
+            stat = os.stat(os.path.join(self.config_dir, name))
+            cached = self.files.get(name)
+            if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                files[name] = cached
+            else:
+                files[name] = {"mtime": stat.st_mtime_ns, "size": stat.st_size,
+                               "addresses": scan_addresses(os.path.join(self.config_dir, name))}
+                changed = True
+        changed = changed or files.keys() != self.files.keys()
+        self.files, self.used = files, {}
+        for entry in files.values():
+            for address in entry["addresses"]: self._mark(address)
+        if changed: self.save()
+
+    def save(self):
+        try:
+            atomic_write(self.index_path, json.dumps({"files": self.files}))
+        except OSError:
+            pass
+
+    def _mark(self, address):
+        prefix, _, host = address.rpartition(".")
+        self.used[prefix] = self.used.get(prefix, 0) | (1 << int(host))
+
+    def is_used(self, address):
+        prefix, _, host = address.rpartition(".")
+        return bool(self.used.get(prefix, 0) >> int(host) & 1)
+
+    def next_subnet(self):
+        for x in range(1, 256):
+            if f"{self.base}.{x}" not in self.used: return x
+        raise ValueError(f"No free /24 left in {self.base}.0.0/16.")
+
+    def free_hosts(self, prefix):
+        free = HOSTS & ~self.used.get(prefix, 0)
+        while free:
+            low = free & -free
+            yield low.bit_length() - 1
+            free ^= low
+
+    def next_host(self, prefix):
+        host = next(self.free_hosts(prefix), None)
+        if host is None: raise ValueError(f"No free address left in {prefix}.0/24.")
+        return f"{prefix}.{host}"
+
+    def reserve(self, address):
+        if self.is_used(address): raise ValueError(f"{address} is already allocated.")
+        self._mark(address)
@@ -0,0 +1,34 @@
+import base64, os, subprocess
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+except ImportError:
+    X25519PrivateKey = None
+
+from profiling import traced
+
+def clamp(raw):
+    raw = bytearray(raw)
+    raw[0] &= 248; raw[31] = (raw[31] & 127) | 64
+    return bytes(raw)
+
+def _wg(command, stdin=None):
+    try:
+        return subprocess.run(["wg", command], input=stdin, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(f"wg {command} failed ({e}); install wireguard-tools or the 'cryptography' package to generate keys.") from e
+
+def public_key(private_b64):
+    if not X25519PrivateKey: return _wg("pubkey", private_b64)
+    pub = X25519PrivateKey.from_private_bytes(base64.b64decode(private_b64)).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return base64.b64encode(pub).decode()
+
+def generate_keypair():
+    private = base64.b64encode(clamp(os.urandom(32))).decode() if X25519PrivateKey else _wg("genkey")
+    return private, public_key(private)
+
+@traced("keys.generate_keypairs", lambda count: {"count": count})
+def generate_keypairs(count):
+    if X25519PrivateKey: return [generate_keypair() for _ in range(count)]
+    from utilities_module import run_concurrently
+    return list(run_concurrently(lambda _: generate_keypair(), range(count)).values())
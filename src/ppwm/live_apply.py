@@ -0,0 +1,48 @@
+import json, os, subprocess, tempfile
+from transactions import atomic_write, sidecar
+from profiling import traced
+
+def interface_up(name):
+    return os.path.exists(f"/sys/class/net/{name}")
+
+def interface_index(name):
+    try:
+        with open(f"/sys/class/net/{name}/ifindex") as f: return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+def recorded_state(config):
+    try:
+        with open(sidecar(config.path, ".applied")) as f: state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return (state["rules"], state["peers"]) if state.get("ifindex") == interface_index(config.name) else None
+
+def record_state(config):
+    state = {"ifindex": interface_index(config.name), "rules": config.applied_rules, "peers": config.applied_peers}
+    try:
+        atomic_write(sidecar(config.path, ".applied"), json.dumps(state))
+    except OSError:
+        pass
+
+@traced("apply.sync_peers", lambda config: {"interface": config.name})
+def sync_peers(config):
+    with tempfile.NamedTemporaryFile("w", suffix=".conf") as stripped:
+        stripped.write(config.wg_config()); stripped.flush()
+        result = subprocess.run(["wg", "syncconf", config.name, stripped.name], capture_output=True, text=True)
+    if result.returncode: raise RuntimeError(f"wg syncconf failed: {result.stderr.strip()}")
+
+@traced("apply.hot_apply", lambda config: {"interface": config.name})
+def hot_apply(config):
+    if not interface_up(config.name): return None
+    recorded = recorded_state(config)
+    if recorded: config.applied_rules, config.applied_peers = recorded
+    backend = config.backend
+    removed, added = backend.diff(config.applied_rules, config.effective_rules())
+    backend.remove(removed)
+    backend.apply(added)
+    peers_changed = config.wg_config() != config.applied_peers
+    if peers_changed: sync_peers(config)
+    config.mark_applied()
+    record_state(config)
+    return len(removed), len(added), peers_changed
@@ -0,0 +1,97 @@
+import os, socket, struct, subprocess, time
+from port_summary import collect_summary
+
+TCP_LISTEN, UDP_UNCONNECTED = "0A", "07"
+
+def wg_dump():
+    try:
+        output = subprocess.run(["wg", "show", "all", "dump"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    interfaces = {}
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) == 5:
+            interfaces[fields[0]] = {"listen_port": fields[3], "peers": []}
+        elif len(fields) == 9:
+            interfaces.setdefault(fields[0], {"listen_port": "", "peers": []})["peers"].append({
+                "public_key": fields[1], "endpoint": fields[3], "allowed_ips": fields[4], "latest_handshake": int(fields[5]),
+                "rx": int(fields[6]), "tx": int(fields[7])})
+    return interfaces
+
+def decode_address(hex_address):
+    address, port = hex_address.split(":")
+    raw = bytes.fromhex(address)
+    if len(raw) == 4: return socket.inet_ntop(socket.AF_INET, raw[::-1]), int(port, 16)
+    return socket.inet_ntop(socket.AF_INET6, b"".join(struct.pack("<I", word) for word in struct.unpack(">4I", raw))), int(port, 16)
+
+def proc_sockets(listening_only=True):
+    sockets = []
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        try:
+            with open(f"/proc/net/{proto}") as f: lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            state = fields[3]
+            if listening_only and state not in (TCP_LISTEN if proto.startswith("tcp") else UDP_UNCONNECTED): continue
+            local_ip, port = decode_address(fields[1])
+            sockets.append({"proto": proto, "local_ip": local_ip, "port": port, "remote": "%s:%d" % decode_address(fields[2]),
+                            "state": state, "inode": fields[9]})
+    return sockets
+
+def socket_owners(inodes):
+    owners, wanted = {}, {f"socket:[{inode}]" for inode in inodes}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            links = [os.readlink(f"/proc/{pid}/fd/{fd}") for fd in os.listdir(f"/proc/{pid}/fd")]
+            matches = wanted.intersection(links)
+            if not matches: continue
+            with open(f"/proc/{pid}/comm") as f: name = f.read().strip()
+        except OSError:
+            continue
+        for link in matches: owners[link[8:-1]] = f"{pid}/{name}"
+    return owners
+
+def managed_ports(config_dir="/etc/wireguard/"):
+    ports = {}
+    for interface, categories in collect_summary(config_dir).items():
+        for subsections in categories.values():
+            for subsection, entries in subsections.items():
+                for entry in entries: ports[(entry["port"], entry["protocol"])] = (interface, subsection, entry["forward"])
+    return ports
+
+def human_bytes(count):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if count < 1024: return f"{count:.0f}{unit}" if unit == "B" else f"{count:.1f}{unit}"
+        count /= 1024
+    return f"{count:.1f}TiB"
+
+def render(dump, previous, elapsed, forwarded, listening, now):
+    lines = [f"{'Interface':<10}{'Peer':<14}{'Endpoint':<24}{'Handshake':<12}{'RX':>10}{'TX':>10}{'RX/s':>10}{'TX/s':>10}"]
+    for interface, info in sorted(dump.items()):
+        for peer in info["peers"]:
+            before = previous.get(peer["public_key"], peer)
+            age = f"{now - peer['latest_handshake']}s ago" if peer["latest_handshake"] else "never"
+            lines.append(f"{interface:<10}{peer['public_key'][:12]:<14}{peer['endpoint']:<24}{age:<12}{human_bytes(peer['rx']):>10}"
+                         f"{human_bytes(peer['tx']):>10}{human_bytes((peer['rx'] - before['rx']) / elapsed):>10}"
+                         f"{human_bytes((peer['tx'] - before['tx']) / elapsed):>10}")
+    lines += ["", f"{'Port':<12}{'Interface':<12}{'Subsection':<24}{'Forward':<10}{'Local listener'}"]
+    for (port, proto), (interface, subsection, forward) in sorted(forwarded.items()):
+        lines.append(f"{f'{port}/{proto}':<12}{interface:<12}{subsection:<24}{str(forward or port):<10}{'yes' if (port, proto) in listening else 'no'}")
+    return "\n".join(lines)
+
+def live_view(interval=1.0, iterations=None, config_dir="/etc/wireguard/"):
+    previous, last, count = {}, time.monotonic(), 0
+    try:
+        while iterations is None or count < iterations:
+            dump = wg_dump()
+            listening = {(s["port"], s["proto"].rstrip("6")) for s in proc_sockets()}
+            now = time.monotonic()
+            print("\033[H\033[J" + render(dump, previous, max(now - last, 1e-3), managed_ports(config_dir), listening, int(time.time())), flush=True)
+            previous = {peer["public_key"]: peer for info in dump.values() for peer in info["peers"]}
+            last, count = now, count + 1
+            if iterations is None or count < iterations: time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,64 @@
+import re, subprocess
+from ruleset import Backend
+
+NFT_ELEMENT = re.compile(r"^nft add element (ip \S+ \S+) \{ (\S+ \. \d+)(?: : (.+))? \}$")
+
+def table_name(name):
+    return "ppwm_" + re.sub(r"\W", "_", name)
+
+def nft_rules(entries, client_ip, name="wg"):
+    table = f"ip {table_name(name)}"
+    ups = [f"nft add table {table}",
+           f"nft add map {table} fwd {{ type inet_proto . inet_service : ipv4_addr . inet_service ; }}",
+           f"nft add set {table} accept {{ type inet_proto . inet_service ; }}",
+           f"nft add chain {table} prerouting {{ type nat hook prerouting priority -100 ; }}",
+           f"nft add chain {table} forward {{ type filter hook forward priority 0 ; }}",
+           f"nft add rule {table} prerouting dnat ip addr . port to meta l4proto . th dport map @fwd",
+           f"nft add rule {table} forward meta l4proto . ct original proto-dst @accept accept"]
+    for entry in sorted(entries, key=lambda entry: (entry.protocol, entry.port)):
+        ups += [f"nft add element {table} fwd {{ {entry.protocol} . {entry.port} : {client_ip} . {entry.target} }}",
+                f"nft add element {table} accept {{ {entry.protocol} . {entry.port} }}"]
+    return ups, [f"nft delete table {table}"]
+
+def nft_script(ups, name="wg"):
+    table = f"ip {table_name(name)}"
+    return "\n".join([f"add table {table}", f"delete table {table}"] + [rule[4:] for rule in ups if rule.startswith("nft ")]) + "\n"
+
+def nft_elements(rules):
+    elements = {}
+    for rule in rules:
+        if match := NFT_ELEMENT.match(rule): elements[(match.group(1), match.group(2))] = match.group(3)
+    return elements
+
+def run_nft(commands):
+    result = subprocess.run(["nft", "-f", "-"], input="\n".join(commands) + "\n", capture_output=True, text=True)
+    if result.returncode: raise RuntimeError(f"nft failed: {result.stderr.strip()}")
+
+class NftBackend(Backend):
+    setup = ("nft add table", "nft add map", "nft add set", "nft add chain", "nft add rule")
+
+    def render(self):
+        return nft_rules(self.entries(), self.config.client_ip(), self.config.name)
+
+    def hooks(self, ups, downs):
+        return [f"nft -f {self.path('.nft')}"], downs
+
+    def files(self, ups, downs):
+        return {self.path(".nft"): nft_script(ups, self.config.name)}
+
+    def is_member(self, rule):
+        return bool(NFT_ELEMENT.match(rule))
+
+    def incremental(self, old_ups, new_ups, removed):
+        old_elements, new_elements = nft_elements(old_ups), nft_elements(new_ups)
+        dropped = {rule[len("nft delete table "):] for rule in removed if rule.startswith("nft delete table ")}
+        gone = [f"nft delete element {element[0]} {{ {element[1]} }}" for element, value in old_elements.items()
+                if element[0].rsplit(" ", 1)[0] not in dropped and (element not in new_elements or new_elements[element] != value)]
+        fresh = [f"nft add element {element[0]} {{ {element[1]}{f' : {value}' if value else ''} }}"
+                 for element, value in new_elements.items() if element not in old_elements or old_elements[element] != value]
+        return gone, fresh
+
+    def batches(self, rules):
+        (restore, iptables), (shell, other) = super().batches(rules)
+        return [(restore, iptables), (run_nft, [rule[4:] for rule in other if rule.startswith("nft ")]),
+                (shell, [rule for rule in other if not rule.startswith("nft ")])]
@@ -0,0 +1,117 @@
+import http.client, json, os, re, threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from transactions import atomic_write
+
+PANEL_CACHE = ".ppwm-panel-cache.json"
+PANEL_TAG = "panel #"
+PER_PAGE = 100
+
+class PanelError(RuntimeError):
+    pass
+
+class PanelClient:
+    def __init__(self, base_url, api_key, cache_path=None, timeout=10, concurrency=8):
+        self.url = urlsplit(base_url.rstrip("/"))
+        self.api_key, self.cache_path, self.timeout, self.concurrency = api_key, cache_path, timeout, concurrency
+        self.cache, self.local = {}, threading.local()
+        self.stats = {"requests": 0, "not_modified": 0}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f: self.cache = json.load(f)
+            except (OSError, ValueError):
+                self.cache = {}
+
+    def _connection(self):
+        if getattr(self.local, "conn", None) is None:
+            connection = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+            self.local.conn = connection(self.url.hostname, self.url.port, timeout=self.timeout)
+        return self.local.conn
+
+    def get(self, path, params=None):
+        target = f"{self.url.path}{path}" + (f"?{urlencode(params)}" if params else "")
+        headers = {"Authorization": f"Bearer {self.api_key}", "Accept": "application/json"}
+        cached = self.cache.get(target)
+        if cached and cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                conn.request("GET", target, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.local.conn = None
+                if attempt == 2: raise
+        self.stats["requests"] += 1
+        if response.status == 304 and cached:
+            self.stats["not_modified"] += 1
+            return cached["body"]
+        if response.status != 200: raise PanelError(f"GET {target} returned {response.status}: {body[:200].decode(errors='replace')}")
+        data = json.loads(body)
+        if response.getheader("ETag") or response.getheader("Last-Modified"):
+            self.cache[target] = {"etag": response.getheader("ETag"), "last_modified": response.getheader("Last-Modified"), "body": data}
+        else:
+            self.cache.pop(target, None)
+        return data
+
+    def allocations(self, node, per_page=PER_PAGE):
+        path, params = f"/api/application/nodes/{node}/allocations", {"include": "server", "per_page": per_page}
+        first = self.get(path, dict(params, page=1))
+        pages = first.get("meta", {}).get("pagination", {}).get("total_pages", 1)
+        results = [first]
+        if pages > 1:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, pages - 1)) as pool:
+                results += pool.map(lambda page: self.get(path, dict(params, page=page)), range(2, pages + 1))
+        return [item["attributes"] for result in results for item in result.get("data", [])]
+
+    def save_cache(self):
+        if not self.cache_path: return
+        try:
+            atomic_write(self.cache_path, json.dumps(self.cache))
+        except OSError:
+            pass
+
+def subsection_name(allocation):
+    server = allocation.get("relationships", {}).get("server", {})
+    name = (server.get("attributes") or {}).get("name") if isinstance(server, dict) else None
+    return re.sub(r"\s+", " ", name).strip() if name else None
+
+def desired_ports(allocations, protocol="both"):
+    desired = {}
+    for allocation in allocations:
+        subsection = subsection_name(allocation)
+        if not allocation.get("assigned") or not subsection: continue
+        comment = f"{PANEL_TAG}{allocation['id']}" + (f" {allocation['notes']}" if allocation.get("notes") else "")
+        for proto in (["tcp", "udp"] if protocol == "both" else [protocol]):
+            desired[(int(allocation["port"]), proto)] = (subsection, comment)
+    return desired
+
+def plan_sync(config, desired, index=None):
+    synced = {key: (subsection, entry) for key, (_, subsection, entry) in config.port_index.items()
+              if (entry.comment or "").startswith(PANEL_TAG)}
+    remove = [key for key, (subsection, _) in synced.items() if key not in desired or desired[key][0] != subsection]
+    retag = [key for key, (subsection, entry) in synced.items() if key in desired and desired[key][0] == subsection and desired[key][1] != entry.comment]
+    add = [key for key in desired if key not in synced or key in remove]
+    conflicts = [(port, proto, "/".join((config.name, config.port_index[(port, proto)][1]))) for port, proto in add
+                 if (port, proto) in config.port_index and (port, proto) not in synced]
+    if index: conflicts += [found for port, proto in add if (port, proto) not in config.port_index
+                            for found in index.conflicts([port], proto, config.name)]
+    blocked = {(port, proto) for port, proto, _ in conflicts}
+    return {"add": [key for key in add if key not in blocked], "remove": remove, "retag": retag, "conflicts": conflicts}
+
+def apply_sync(config, desired, plan, category="Games", index=None):
+    emptied = set()
+    for port, proto in plan["remove"]:
+        emptied.add(config.port_index[(port, proto)][1])
+        config.remove_port(port, proto)
+    for key in plan["retag"]: config.port_index[key][2].comment = desired[key][1]
+    for port, proto in sorted(plan["add"]):
+        subsection, comment = desired[(port, proto)]
+        if subsection not in config.subsection_index:
+            if not config.has_template(): config.initialize_template()
+            config.add_subsection(category, subsection)
+        if config.add_port(subsection, port, proto, comment=comment) and index: index.mark(port, proto, (config.name, subsection))
+    for subsection in emptied:
+        if not config.ports(subsection): config.delete_subsection(subsection)
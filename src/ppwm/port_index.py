@@ -0,0 +1,58 @@
+import subprocess
+from port_summary import collect_summary
+
+PROTOCOLS = ["tcp", "udp"]
+ALL_PORTS = (1 << 65536) - 2  # bits 1..65535
+
+def protocols(protocol):
+    return PROTOCOLS if protocol == "both" else [protocol]
+
+def live_listeners():
+    listeners = {proto: set() for proto in PROTOCOLS}
+    try:
+        output = subprocess.run(["ss", "-H", "-tuln"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return listeners
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 5 and fields[0] in listeners and fields[4].rpartition(":")[2].isdigit():
+            listeners[fields[0]].add(int(fields[4].rpartition(":")[2]))
+    return listeners
+
+class PortIndex:
+    def __init__(self, config_dir="/etc/wireguard/", include_listeners=True):
+        self.owners = {}
+        self.used = {proto: 0 for proto in PROTOCOLS}
+        for interface, categories in collect_summary(config_dir).items():
+            for subsections in categories.values():
+                for subsection, ports in subsections.items():
+                    for port in ports: self.mark(port["port"], port["protocol"], (interface, subsection))
+        self.listeners = live_listeners() if include_listeners else {proto: set() for proto in PROTOCOLS}
+        for proto, ports in self.listeners.items():
+            for port in ports: self.used[proto] |= 1 << port
+
+    def mark(self, port, protocol, owner):
+        for proto in protocols(protocol):
+            self.owners.setdefault((port, proto), []).append(owner)
+            self.used[proto] |= 1 << port
+
+    def conflicts(self, ports, protocol, interface=None):
+        found = []
+        for port in ports:
+            for proto in protocols(protocol):
+                owners = [owner for owner in self.owners.get((port, proto), []) if owner[0] != interface]
+                if owners: found.append((port, proto, f"{owners[0][0]}/{owners[0][1]}"))
+                elif (port, proto) not in self.owners and port in self.listeners[proto]: found.append((port, proto, "local listener"))
+        return found
+
+    def find_free_block(self, count, protocol="tcp", start=1024, end=65535):
+        free = ALL_PORTS
+        for proto in protocols(protocol): free &= ~self.used[proto]
+        free &= ((1 << (end + 1)) - 1) & ~((1 << start) - 1)
+        run, width = free, 1
+        while width < count:
+            step = min(width, count - width)
+            run &= run >> step
+            width += step
+        if not run: return None
+        return (run & -run).bit_length() - 1
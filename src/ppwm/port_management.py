@@ -1,8 +1,16 @@
 import os
+from backup_restore import backup_file
+from config_model import APPLY_MODES, CATEGORIES, RULE_MODES, expand_ports, load
+from live_apply import hot_apply
+from port_index import PortIndex
+from transactions import ConflictError, locked
 
 def get_input(prompt, default=None):
     return input(f"{prompt}\n(Default: {default}): ").strip() or default
 
+def valid_port(value):
+    return bool(value) and value.isdigit() and 1 <= int(value) <= 65535
+
 def list_configs(config_dir="/etc/wireguard"):
     return [f for f in os.listdir(config_dir) if f.endswith(".conf")]
 
@@ -15,99 +23,87 @@ def select_config():
     choice = get_input("Select a configuration by number")
     return configs[int(choice) - 1] if choice.isdigit() and 1 <= int(choice) <= len(configs) else None
 
-def initialize_template(config_path):
-    with open(config_path, "a") as config:
-        config.write("\n[Category: Games]\n[Category: Services]\n[Category: Miscellaneous]\n")
+def save_config(config):
+    with locked(config.path):
+        try:
+            config.save()
+        except ConflictError as e:
+            return print(f"Not saved: {e}")
+        try:
+            applied = hot_apply(config)
+        except RuntimeError as e:
+            return print(f"Saved, but applying to the running interface failed: {e}")
+        if applied:
+            print(f"Applied to running {config.name}: {applied[0]} rule(s) removed, {applied[1]} added" + (", peers synced." if applied[2] else "."))
+
+def initialize_template(config):
+    config.initialize_template()
+    save_config(config)
     print("Template initialized.")
 
-def list_categories(config_path):
-    with open(config_path) as config: lines = config.readlines()
-    games, services, miscellaneous, current = [], [], [], None
-    for line in lines:
-        if "[Category: Games]" in line: current = games
-        elif "[Category: Services]" in line: current = services
-        elif "[Category: Miscellaneous]" in line: current = miscellaneous
-        elif line.startswith("Subsection:") and current is not None:
-            current.append(line.split(":", 1)[1].strip())
-    return games, services, miscellaneous
-
-def add_subsection(config_path, category):
+def list_categories(config):
+    return tuple(config.subsections(category) for category in CATEGORIES)
+
+def add_subsection(config, category):
     new_name = get_input(f"Enter name for new subsection in {category}")
-    games, services, miscellaneous = list_categories(config_path)
-    if new_name in (games if category == "Games" else services if category == "Services" else miscellaneous):
-        print(f"Subsection '{new_name}' already exists in {category}.")
+    if not new_name: return
+    if not config.add_subsection(category, new_name):
+        print(f"Subsection '{new_name}' already exists in {config.subsection_index[new_name]}.")
     else:
-        with open(config_path, "a") as config: config.write(f"Subsection: {new_name}\n")
+        save_config(config)
         print(f"Added subsection '{new_name}' to {category}.")
 
-def display_ports(config_path, category, subsection):
-    with open(config_path) as config: lines = config.readlines()
-    ports, found = [], False
-    for line in lines:
-        if line.strip() == f"Subsection: {subsection}": found = True
-        elif found and line.startswith("Port:"): ports.append(line.strip())
-        elif found and not line.startswith("Port:"): break
+def display_ports(config, category, subsection):
+    ports = [entry.line() for entry in config.ports(subsection)]
     for i, port in enumerate(ports, 1): print(f"{i}. {port}")
     return ports
 
-def generate_postup_postdown(config_path, port, protocol, action, forward_port=None):
-    with open(config_path, "a" if action == "add" else "r+") as config:
-        config.seek(0); lines = config.readlines(); config.truncate(0)
-        for line in lines:
-            if f"Port: {port}/{protocol}" in line and action == "delete": continue
-            config.write(line)
-        if action == "add":
-            target_port = forward_port or port
-            if protocol in ["tcp", "udp"]:
-                config.write(f"PostUp = iptables -t nat -A PREROUTING -p {protocol} --dport {port} -j DNAT --to-destination <client_ip>:{target_port}\n")
-                config.write(f"PostUp = iptables -A FORWARD -p {protocol} --dport {port} -j ACCEPT\n")
-                config.write(f"PostDown = iptables -t nat -D PREROUTING -p {protocol} --dport {port} -j DNAT --to-destination <client_ip>:{target_port}\n")
-                config.write(f"PostDown = iptables -D FORWARD -p {protocol} --dport {port} -j ACCEPT\n")
-            elif protocol == "both":
-                for proto in ["tcp", "udp"]:
-                    config.write(f"PostUp = iptables -t nat -A PREROUTING -p {proto} --dport {port} -j DNAT --to-destination <client_ip>:{target_port}\n")
-                    config.write(f"PostUp = iptables -A FORWARD -p {proto} --dport {port} -j ACCEPT\n")
-                    config.write(f"PostDown = iptables -t nat -D PREROUTING -p {proto} --dport {port} -j DNAT --to-destination <client_ip>:{target_port}\n")
-                    config.write(f"PostDown = iptables -D FORWARD -p {proto} --dport {port} -j ACCEPT\n")
+def generate_postup_postdown(config, port, protocol, action, forward_port=None, subsection=None):
+    if action == "add":
+        return config.add_port(subsection, port, protocol, forward_port)
+    return config.remove_port(port, protocol)
 
 def backup_prompt(config_path):
     if get_input("Would you like to create a backup before proceeding? (yes/no)", "yes").lower() == "yes":
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        backup_name = f"{os.path.basename(config_path)}-{timestamp}"
-        backup_dir = os.path.join(os.path.dirname(config_path), "backups")
-        os.makedirs(backup_dir, exist_ok=True)
-        backup_path = os.path.join(backup_dir, backup_name)
-        os.rename(config_path, backup_path)
-        print(f"Backup created at {backup_path}.")
-
-def modify_ports(config_path, category, subsection, action):
-    backup_prompt(config_path)  # Backup before modifications
-    ports = display_ports(config_path, category, subsection)
+        print(f"Backup created: {backup_file(os.path.basename(config_path), os.path.dirname(config_path))}.")
+
+def modify_ports(config, category, subsection, action):
+    backup_prompt(config.path)  # Backup before modifications
+    ports = display_ports(config, category, subsection)
     if not ports and action != "add": return
     if action == "add":
         protocol = get_input("Enter protocol\n (tcp/udp/both)", "tcp").lower()
         if protocol not in ["tcp", "udp", "both"]: return
         port_input = get_input("Enter ports (e.g., 667, 669-671)")
+        try:
+            port_list = expand_ports(port_input or "")
+        except ValueError as e:
+            print(f"{e} Returning to menu.")
+            return
         forward_to_different_port = get_input("Forward these ports to different ports on the client?\n (yes/no)", "no").lower()
         if forward_to_different_port == "yes" and "-" in port_input:
             print("Forwarding ranges of ports to different client ports is not supported. Please add individual ports instead.")
             return
         forward_mapping = {}
         if forward_to_different_port == "yes":
-            for port in port_input.split(","):
-                target_port = get_input(f"Enter the client port to forward {port.strip()} to")
-                if not target_port.isdigit() or int(target_port) < 1 or int(target_port) > 65535:
+            for port in port_list:
+                target_port = get_input(f"Enter the client port to forward {port} to")
+                if not valid_port(target_port):
                     print("Invalid port number. Returning to menu.")
                     return
-                forward_mapping[port.strip()] = target_port
-        for part in port_input.split(","):
-            port = part.strip()
-            if forward_to_different_port == "yes":
-                generate_postup_postdown(config_path, port, protocol, action, forward_mapping.get(port))
-            else:
-                generate_postup_postdown(config_path, port, protocol, action)
-        print(f"Added ports to {subsection} in {category}.")
-        backup_prompt(config_path)  # Backup after adding ports
+                forward_mapping[port] = target_port
+        conflicts = PortIndex(os.path.dirname(config.path)).conflicts(port_list, protocol, config.name)
+        if conflicts:
+            print("Port conflicts:\n" + "\n".join(f" {port}/{proto} used by {owner}" for port, proto, owner in conflicts))
+            if get_input("Add the remaining ports and skip these? (yes/no)", "no").lower() != "yes": return
+            port_list = [port for port in port_list if port not in {conflict[0] for conflict in conflicts}]
+        comment = get_input("Enter a comment for these ports (optional)", "")
+        added, skipped = config.add_ports(subsection, port_list, protocol, forward_mapping, comment)
+        if skipped: print(f"Skipped ports already managed: {', '.join(map(str, skipped))}")
+        if not added: return
+        save_config(config)
+        print(f"Added {len(added)} port(s) to {subsection} in {category}.")
+        backup_prompt(config.path)  # Backup after adding ports
     elif action in ["edit", "delete"]:
         choice = get_input(f"Select a port to {action} by number")
         if not choice.isdigit() or int(choice) < 1 or int(choice) > len(ports): return
@@ -115,26 +111,84 @@ def modify_ports(config_path, category, subsection, action):
         port, protocol = selected_port.split()[1].split("/")
         if action == "edit":
             new_protocol = get_input("Enter new protocol\n (tcp/udp/both)", protocol).lower()
+            if new_protocol not in ["tcp", "udp", "both"]: return print("Invalid protocol. Returning to menu.")
             new_port = get_input("Enter new port", port)
+            if not valid_port(new_port): return print("Enter a single port number between 1 and 65535. Returning to menu.")
             forward_to_different_port = get_input("Forward to a different client port?\n (yes/no)", "no").lower()
             forward_port = None
             if forward_to_different_port == "yes":
                 forward_port = get_input(f"Enter the client port to forward {new_port} to")
-            generate_postup_postdown(config_path, port, protocol, "delete")
-            generate_postup_postdown(config_path, new_port, new_protocol, "add", forward_port)
-            backup_prompt(config_path)  # Backup after modifying ports
+                if not valid_port(forward_port): return print("Invalid port number. Returning to menu.")
+            try:
+                conflicts = PortIndex(os.path.dirname(config.path)).conflicts(expand_ports(new_port), new_protocol, config.name)
+            except ValueError as e:
+                return print(f"{e} Returning to menu.")
+            if conflicts:
+                return print(f"Port {new_port}/{new_protocol} is already used by {conflicts[0][2]}.")
+            taken = [key for key in ((int(new_port), p) for p in (["tcp", "udp"] if new_protocol == "both" else [new_protocol]))
+                     if key in config.port_index and key != (int(port), protocol)]
+            if taken:
+                return print(f"Port {taken[0][0]}/{taken[0][1]} is already managed in {config.port_index[taken[0]][1]}; {port}/{protocol} kept.")
+            old = config.port_index[(int(port), protocol)][2]
+            generate_postup_postdown(config, port, protocol, "delete")
+            if not config.add_port(subsection, new_port, new_protocol, forward_port, old.comment):
+                config.add_port(subsection, port, protocol, old.forward, old.comment)
+                return print(f"Could not add {new_port}/{new_protocol}; {port}/{protocol} kept.")
+            save_config(config)
+            print(f"Edited port {port}/{protocol} to {new_port}/{new_protocol} in {subsection} ({category}).")
+            backup_prompt(config.path)  # Backup after modifying ports
         elif action == "delete":
-            generate_postup_postdown(config_path, port, protocol, "delete")
-            backup_prompt(config_path)  # Backup before deleting ports
-        print(f"{action.capitalize()}d port for {subsection} in {category}.")
-
-def delete_subsection(config_path, category, subsection):
-    backup_prompt(config_path)  # Backup before deleting subsection
-    with open(config_path) as config: lines = config.readlines()
-    with open(config_path, "w") as config:
-        skip = False
-        for line in lines:
-            if line.strip() == f"Subsection: {subsection}": skip = True
-            elif skip and not line.startswith("Port: "): skip = False
-            elif not skip: config.write(line)
+            generate_postup_postdown(config, port, protocol, "delete")
+            save_config(config)
+            print(f"Deleted port {port}/{protocol} from {subsection} ({category}).")
+            backup_prompt(config.path)  # Backup before deleting ports
+
+def delete_subsection(config, category, subsection):
+    backup_prompt(config.path)  # Backup before deleting subsection
+    config.delete_subsection(subsection)
+    save_config(config)
     print(f"Deleted subsection {subsection} from {category}.")
+
+def select_rule_mode(config):
+    print("Rule modes:\n single: one rule pair per port\n multiport: up to 15 ports per rule\n ipset: one rule per protocol backed by an ipset\n nft: one nftables verdict map lookup for all ports")
+    mode = get_input("Select rule mode", config.rule_mode).lower()
+    if mode not in RULE_MODES: return print("Invalid rule mode.")
+    apply_mode = get_input("Apply rules via\n (postup: one PostUp line per rule / restore: one iptables-restore per interface)", config.apply_mode).lower()
+    if apply_mode not in APPLY_MODES: return print("Invalid apply mode.")
+    config.rule_mode, config.apply_mode = mode, apply_mode
+    save_config(config)
+    print(f"Rule mode set to {mode}, applied via {apply_mode}.")
+
+def subsection_menu(config, category, subsection):
+    while True:
+        choice = input(f"=== {category}: {subsection} ===\n1. Add Ports\n2. Edit Port\n3. Delete Port\n4. Delete Subsection\nx. Return\nYour choice: ").strip()
+        if choice == "1": modify_ports(config, category, subsection, "add")
+        elif choice == "2": modify_ports(config, category, subsection, "edit")
+        elif choice == "3": modify_ports(config, category, subsection, "delete")
+        elif choice == "4": return delete_subsection(config, category, subsection)
+        elif choice == "x": break
+        else: print("Invalid choice. Try again.")
+
+def manage_ports():
+    selected = select_config()
+    if not selected: return
+    config = load(os.path.join("/etc/wireguard", selected))
+    if not config.has_template():
+        if get_input("No port template found. Generate it now? (yes/no)", "yes").lower() != "yes": return
+        initialize_template(config)
+    while True:
+        for i, category in enumerate(CATEGORIES, 1): print(f"{i}. {category}")
+        print(f"m. Rule Mode ({config.rule_mode}, {config.apply_mode})")
+        choice = get_input("Select a category by number (x to return)", "x")
+        if choice == "m":
+            select_rule_mode(config)
+            continue
+        if not choice.isdigit() or not 1 <= int(choice) <= len(CATEGORIES): break
+        category = CATEGORIES[int(choice) - 1]
+        subsections = config.subsections(category)
+        if not subsections: print(f"No {category.lower()} subsections.")
+        for i, subsection in enumerate(subsections, 1): print(f"{i}. {subsection}")
+        choice = get_input("Select a subsection by number, or 'a' to add one", "a")
+        if choice == "a": add_subsection(config, category)
+        elif choice.isdigit() and 1 <= int(choice) <= len(subsections):
+            subsection_menu(config, category, subsections[int(choice) - 1])
@@ -1,53 +1,105 @@
-import os
+import csv, io, json, os
 from datetime import datetime
+from config_model import load
+from transactions import atomic_write
+
+SUMMARY_CACHE = ".ppwm-summary-cache.json"
+EXPORT_FORMATS = ["text", "json", "csv"]
+_cache = {}
 
 def list_configs(config_dir="/etc/wireguard"):
     return [f for f in os.listdir(config_dir) if f.endswith(".conf")]
 
-def summarize_ports():
-    config_dir = "/etc/wireguard/"
-    configs = list_configs(config_dir)
+def summarize_config(config_path):
+    config = load(config_path)
+    return {category: {subsection: [{"port": entry.port, "protocol": entry.protocol, "forward": entry.forward, "comment": entry.comment}
+                                     for entry in entries]
+                       for subsection, entries in subsections.items()}
+            for category, subsections in config.categories.items()}
+
+def collect_summary(config_dir="/etc/wireguard/"):
+    cache_path = os.path.join(config_dir, SUMMARY_CACHE)
+    cache = _cache.setdefault(os.path.abspath(config_dir), {})
+    if not cache:
+        try:
+            with open(cache_path) as f: cache.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    summary, changed = {}, False
+    for config_file in sorted(list_configs(config_dir)):
+        stat = os.stat(os.path.join(config_dir, config_file))
+        key = [stat.st_mtime_ns, stat.st_size]
+        cached = cache.get(config_file)
+        if not cached or cached["key"] != key:
+            cached = cache[config_file] = {"key": key, "summary": summarize_config(os.path.join(config_dir, config_file))}
+            changed = True
+        summary[config_file[:-5]] = cached["summary"]  # Strip .conf
+    for stale in set(cache) - {f"{name}.conf" for name in summary}:
+        del cache[stale]; changed = True
+    if changed:
+        try:
+            atomic_write(cache_path, json.dumps(cache))
+        except OSError:
+            pass
+    return summary
+
+def format_summary(summary, fmt="text"):
+    if fmt == "json":
+        return json.dumps(summary, indent=2) + "\n"
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["interface", "category", "subsection", "port", "protocol", "forward", "comment"])
+        for interface, categories in summary.items():
+            for category, subsections in categories.items():
+                for subsection, ports in subsections.items():
+                    for port in ports:
+                        writer.writerow([interface, category, subsection, port["port"], port["protocol"], port["forward"] or "", port["comment"] or ""])
+        return out.getvalue()
+    return "".join(build_summary(summary=summary))
+
+def build_summary(config_dir="/etc/wireguard/", summary=None):
+    lines = []
+    for interface, categories in (collect_summary(config_dir) if summary is None else summary).items():
+        lines.append(f"Interface: {interface}\n")
+        for category, subsections in categories.items():
+            lines.append(f"{category}:\n")
+            for subsection_name, ports in subsections.items():
+                lines.append(f"  - {subsection_name}:\n")
+                for port in ports:
+                    lines.append(f"    {port['port']}/{port['protocol']}" + (f" - {port['comment']}" if port["comment"] else "") + "\n")
+                    if port["forward"]: lines.append(f"      -> {port['forward']}\n")
+    return lines
+
+def export_summary(summary, export_path=None, fmt="text"):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension = "txt" if fmt == "text" else fmt
+    export_path = export_path or f"/etc/wireguard/managed_ports_summary_{timestamp}.{extension}"
+    with open(export_path, "w") as summary_file:
+        summary_file.write(format_summary(summary, fmt))
+    return export_path
 
-    if not configs:
+def summarize_ports(config_dir="/etc/wireguard/"):
+    summary = collect_summary(config_dir)
+    if not summary:
         print("No WireGuard configurations found.")
         return
 
     print("=== Managed Ports Summary ===")
-    summary = []
-
-    for config_file in configs:
-        with open(os.path.join(config_dir, config_file), "r") as f:
-            config_data = f.readlines()
-
-        interface_name = config_file[:-5]  # Strip .conf
-        summary.append(f"Interface: {interface_name}\n")
-        current_category = None
-
-        for line in config_data:
-            line = line.strip()
-            if line.startswith("[Category:"):
-                current_category = line.split(":")[1].strip(" ]")
-                summary.append(f"{current_category}:\n")
-            elif line.startswith("Subsection:"):
-                subsection_name = line.split(":")[1].strip()
-                summary.append(f"  - {subsection_name}:\n")
-            elif line.startswith("# Port:"):
-                port_info = line.split(":", 1)[1].strip()
-                summary.append(f"    {port_info}\n")
-            elif line.startswith("# Forward:"):
-                forward_info = line.split(":", 1)[1].strip()
-                summary.append(f"      -> {forward_info}\n")
-
-    for entry in summary:
+    for entry in build_summary(summary=summary):
         print(entry)
+    return summary
 
-    export = input("Export summary to file? (yes/no)\n(Default: no): ").strip().lower() or "no"
-    if export == "yes":
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        export_path = f"/etc/wireguard/managed_ports_summary_{timestamp}.txt"
-        with open(export_path, "w") as summary_file:
-            summary_file.write("\n".join(summary))
-        print(f"Summary exported to {export_path}.")
+def export_ports_summary():
+    summary = collect_summary()
+    if not summary:
+        print("No WireGuard configurations found.")
+        return
+    fmt = input("Export format (text/json/csv)\n(Default: text): ").strip().lower() or "text"
+    if fmt not in EXPORT_FORMATS:
+        print("Invalid format.")
+        return
+    print(f"Summary exported to {export_summary(summary, fmt=fmt)}.")
 
 def port_summary_menu():
     while True:
@@ -55,7 +107,7 @@ def port_summary_menu():
         if choice == "1":
             summarize_ports()
         elif choice == "2":
-            summarize_ports()
+            export_ports_summary()
         elif choice == "x":
             break
         else:
@@ -0,0 +1,146 @@
+import atexit, builtins, contextlib, functools, json, os, subprocess, sys, tempfile, threading, time
+
+PROFILE_ENV = "PPWM_PROFILE"
+_state = {"enabled": False, "path": None, "start": 0.0}
+_spans, _null = [], contextlib.nullcontext()
+_originals = {}
+
+def _now():
+    return (time.perf_counter() - _state["start"]) * 1e6
+
+def _record(name, start, args):
+    _spans.append({"name": name, "cat": name.split(".")[0], "ph": "X", "ts": round(start, 1), "dur": round(_now() - start, 1),
+                   "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+
+@contextlib.contextmanager
+def _span(name, args):
+    start = _now()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        _record(name, start, args)
+
+def span(name, **args):
+    return _span(name, args) if _state["enabled"] else _null
+
+def traced(name, describe=None):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*a, **kw):
+            if not _state["enabled"]: return func(*a, **kw)
+            with _span(name, describe(*a, **kw) if describe else {}):
+                return func(*a, **kw)
+        return wrapper
+    return decorate
+
+def _command(args):
+    command = args[0] if args else ""
+    return (command if isinstance(command, str) else " ".join(map(str, command)))[:200]
+
+class _File:
+    def __init__(self, file, path, mode):
+        self._file, self._args, self._start = file, {"path": str(path), "mode": mode, "bytes": 0}, _now()
+        self._name = "file.write" if any(c in mode for c in "wax+") else "file.read"
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        for line in self._file:
+            self._args["bytes"] += len(line)
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, *a):
+        data = self._file.read(*a)
+        self._args["bytes"] += len(data)
+        return data
+
+    def readline(self, *a):
+        data = self._file.readline(*a)
+        self._args["bytes"] += len(data)
+        return data
+
+    def readlines(self, *a):
+        lines = self._file.readlines(*a)
+        self._args["bytes"] += sum(map(len, lines))
+        return lines
+
+    def write(self, data):
+        self._args["bytes"] += len(data)
+        return self._file.write(data)
+
+    def close(self):
+        if self._file.closed: return
+        self._file.close()
+        if _state["enabled"]: _record(self._name, self._start, self._args)
+
+def _wrap_open(original):
+    @functools.wraps(original)
+    def wrapper(file, mode="r", *a, **kw):
+        handle = original(file, mode, *a, **kw)
+        return _File(handle, file, mode) if _state["enabled"] else handle
+    return wrapper
+
+def _wrap_subprocess(original, name):
+    @functools.wraps(original)
+    def wrapper(*a, **kw):
+        with span(name, command=_command(a or [kw.get("args", "")])) as args:
+            result = original(*a, **kw)
+            if args is not None and hasattr(result, "returncode"): args["returncode"] = result.returncode
+            return result
+    return wrapper
+
+def enable(target=None):
+    if _state["enabled"]: return
+    path = target if target and target not in ("1", "true", "yes") else \
+        os.path.join(tempfile.gettempdir(), f"ppwm-trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    _state.update(enabled=True, path=path, start=time.perf_counter())
+    _originals.update({(builtins, "open"): builtins.open, (os, "fdopen"): os.fdopen, (subprocess, "run"): subprocess.run,
+                       (subprocess, "check_output"): subprocess.check_output, (os, "system"): os.system})
+    builtins.open, os.fdopen = _wrap_open(builtins.open), _wrap_open(os.fdopen)
+    subprocess.run, subprocess.check_output = _wrap_subprocess(subprocess.run, "subprocess.run"), _wrap_subprocess(subprocess.check_output, "subprocess.check_output")
+    os.system = _wrap_subprocess(os.system, "subprocess.system")
+    atexit.register(finish)
+
+def enable_from_env():
+    if os.environ.get(PROFILE_ENV): enable(os.environ[PROFILE_ENV])
+
+def disable():
+    for (module, name), original in _originals.items(): setattr(module, name, original)
+    _originals.clear()
+    _state["enabled"] = False
+
+def summarize(spans, wall_us):
+    rows = {}
+    for s in spans:
+        row = rows.setdefault(s["name"], {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+        row["count"] += 1; row["total"] += s["dur"]; row["max"] = max(row["max"], s["dur"])
+        row["bytes"] += s["args"].get("bytes", 0)
+    lines = [f"{'Span':<36}{'count':>7}{'total ms':>11}{'mean ms':>10}{'max ms':>10}{'% wall':>8}{'bytes':>11}"]
+    for name, row in sorted(rows.items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{name:<36}{row['count']:>7}{row['total'] / 1000:>11.2f}{row['total'] / row['count'] / 1000:>10.2f}"
+                     f"{row['max'] / 1000:>10.2f}{100 * row['total'] / wall_us if wall_us else 0:>8.1f}{row['bytes'] or '':>11}")
+    lines.append(f"Wall time: {wall_us / 1000:.2f} ms")
+    return "\n".join(lines)
+
+def finish():
+    if not _state["enabled"]: return
+    wall = _now()
+    disable()
+    spans = sorted(_spans, key=lambda s: s["ts"])
+    trace = {"traceEvents": spans, "displayTimeUnit": "ms", "otherData": {"argv": sys.argv, "wall_us": round(wall, 1)}}
+    try:
+        with open(_state["path"], "w") as f: json.dump(trace, f)
+        written = f"Trace written to {_state['path']} ({len(spans)} spans)."
+    except OSError as e:
+        written = f"Could not write trace to {_state['path']}: {e}"
+    print(f"\n{summarize(spans, wall)}\n{written}", file=sys.stderr)
@@ -0,0 +1,186 @@
+import os, re, shlex, subprocess
+from profiling import traced
+
+IPSET_ADD = re.compile(r"^ipset add (\S+) (\d+)(?:-(\d+))? -exist$")
+MULTIPORT_LIMIT = 15
+
+def split_rule(rule):
+    tokens = shlex.split(rule)
+    if not tokens or tokens[0] != "iptables": return None
+    table = "filter"
+    if "-t" in tokens:
+        i = tokens.index("-t")
+        table = tokens[i + 1]
+        del tokens[i:i + 2]
+    return table, shlex.join(tokens[1:])
+
+def render_restore(rules):
+    tables = {}
+    for table, command in rules:
+        tables.setdefault(table, {"policies": [], "commands": []})
+        args = shlex.split(command)
+        if args[0] == "-P": tables[table]["policies"].append(f":{args[1]} {args[2]} [0:0]")
+        else: tables[table]["commands"].append(command)
+    lines = []
+    for table, body in tables.items():
+        lines += [f"*{table}"] + body["policies"] + body["commands"] + ["COMMIT"]
+    return "\n".join(lines) + "\n" if lines else ""
+
+def partition_rules(rules):
+    iptables, other = [], []
+    for rule in rules:
+        split = split_rule(rule)
+        if split: iptables.append(split)
+        else: other.append(rule)
+    return iptables, other
+
+def port_rules(entry, client_ip):
+    proto, port = entry.protocol, entry.port
+    dnat = f"-p {proto} --dport {port} -j DNAT --to-destination {client_ip}:{entry.target}"
+    accept = f"-p {proto} --dport {port} -j ACCEPT"
+    return ([f"iptables -t nat -A PREROUTING {dnat}", f"iptables -A FORWARD {accept}"],
+            [f"iptables -t nat -D PREROUTING {dnat}", f"iptables -D FORWARD {accept}"])
+
+def port_runs(ports):
+    runs = []
+    for port in sorted(ports):
+        if runs and runs[-1][1] == port - 1: runs[-1][1] = port
+        else: runs.append([port, port])
+    return runs
+
+def multiport_groups(runs):
+    groups, group, used = [], [], 0
+    for low, high in runs:
+        cost = 1 if low == high else 2
+        if used + cost > MULTIPORT_LIMIT:
+            groups.append(group); group, used = [], 0
+        group.append(str(low) if low == high else f"{low}:{high}"); used += cost
+    return groups + [group] if group else groups
+
+def compact_rules(entries, client_ip, mode, name="wg"):
+    ups, downs, by_proto = [], [], {}
+    for entry in sorted(entries, key=lambda entry: (entry.protocol, entry.port)):
+        if mode == "single" or entry.forward not in (None, entry.port):
+            up, down = port_rules(entry, client_ip)
+            ups += up; downs += down
+        else:
+            by_proto.setdefault(entry.protocol, []).append(entry.port)
+    for proto, ports in by_proto.items():
+        runs = port_runs(ports)
+        if mode == "multiport":
+            matches = [f"-p {proto} -m multiport --dports {','.join(group)}" for group in multiport_groups(runs)]
+        else:
+            ipset = f"ppwm-{name[:22]}-{proto}"
+            ups += [f"ipset create {ipset} bitmap:port range 1-65535 -exist"]
+            ups += [f"ipset add {ipset} {low if low == high else f'{low}-{high}'} -exist" for low, high in runs]
+            matches = [f"-p {proto} -m set --match-set {ipset} dst"]
+        for match in matches:
+            ups += [f"iptables -t nat -A PREROUTING {match} -j DNAT --to-destination {client_ip}", f"iptables -A FORWARD {match} -j ACCEPT"]
+            downs += [f"iptables -t nat -D PREROUTING {match} -j DNAT --to-destination {client_ip}", f"iptables -D FORWARD {match} -j ACCEPT"]
+        if mode == "ipset": downs.append(f"ipset destroy {ipset}")
+    return ups, downs
+
+def ipset_members(rules):
+    members = {}
+    for rule in rules:
+        if match := IPSET_ADD.match(rule):
+            low = int(match.group(2))
+            members.setdefault(match.group(1), set()).update(range(low, int(match.group(3) or low) + 1))
+    return members
+
+def ipset_specs(ports):
+    return [str(low) if low == high else f"{low}-{high}" for low, high in port_runs(ports)]
+
+def run_restore(rules):
+    result = subprocess.run(["iptables-restore", "--noflush"], input=render_restore(rules), capture_output=True, text=True)
+    if result.returncode: raise RuntimeError(f"iptables-restore failed: {result.stderr.strip()}")
+
+def run_shell(commands):
+    for command in commands:
+        result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        if result.returncode: raise RuntimeError(f"'{command}' failed: {result.stderr.strip()}")
+
+class Backend:
+    setup = ()
+
+    def __init__(self, config):
+        self.config = config
+
+    def entries(self):
+        return [entry for _, _, entry in self.config.port_index.values()]
+
+    def path(self, suffix):
+        return os.path.join(os.path.dirname(os.path.abspath(self.config.path or ".")), self.config.name + suffix)
+
+    def hooks(self, ups, downs):
+        return ups, downs
+
+    def files(self, ups, downs):
+        return {}
+
+    def is_member(self, rule):
+        return False
+
+    def incremental(self, old_ups, new_ups, removed):
+        return [], []
+
+    def diff(self, old, new):
+        (old_ups, old_downs), (new_ups, new_downs) = old, new
+        removed = [rule for rule in old_downs if rule not in set(new_downs)]
+        gone, fresh = self.incremental(old_ups, new_ups, removed)
+        added = [rule for rule in new_ups if rule not in set(old_ups) and not self.is_member(rule)] + fresh
+        added.sort(key=lambda rule: not rule.startswith(self.setup))
+        return removed + gone, added
+
+    def batches(self, rules):
+        iptables, other = partition_rules(rules)
+        return [(run_restore, iptables), (run_shell, other)]
+
+    @traced("apply.run_commands", lambda self, rules, steps: {"rules": len(rules)})
+    def run(self, rules, steps):
+        for runner, batch in steps:
+            if batch: runner(batch)
+
+    def remove(self, rules):
+        self.run(rules, self.batches(rules))
+
+    def apply(self, rules):
+        self.run(rules, reversed(self.batches(rules)))
+
+class IptablesBackend(Backend):
+    setup = ("ipset create",)
+
+    def render(self):
+        return compact_rules(self.entries(), self.config.client_ip(), self.config.rule_mode, self.config.name)
+
+    def ruleset_paths(self):
+        return self.path(".up.rules"), self.path(".down.rules")
+
+    def hooks(self, ups, downs):
+        if self.config.apply_mode != "restore": return ups, downs
+        up_path, down_path = self.ruleset_paths()
+        other = partition_rules(ups)[1]
+        sets = [f"ipset restore -exist -file {self.path('.ipset')}"] if any(rule.startswith("ipset ") for rule in other) else []
+        return (sets + [rule for rule in other if not rule.startswith("ipset ")] + [f"iptables-restore --noflush {up_path}"],
+                [f"iptables-restore --noflush {down_path}"] + partition_rules(downs)[1])
+
+    def files(self, ups, downs):
+        if self.config.apply_mode != "restore": return {}
+        up_path, down_path = self.ruleset_paths()
+        iptables, other = partition_rules(ups)
+        files = {up_path: render_restore(iptables), down_path: render_restore(partition_rules(downs)[0])}
+        sets = [rule[len("ipset "):].removesuffix(" -exist") for rule in other if rule.startswith("ipset ")]
+        if sets: files[self.path(".ipset")] = "\n".join(sets) + "\n"
+        return files
+
+    def is_member(self, rule):
+        return bool(IPSET_ADD.match(rule))
+
+    def incremental(self, old_ups, new_ups, removed):
+        gone, fresh = [], []
+        old_members, new_members = ipset_members(old_ups), ipset_members(new_ups)
+        for name in old_members.keys() | new_members.keys():
+            dropped, added = old_members.get(name, set()) - new_members.get(name, set()), new_members.get(name, set()) - old_members.get(name, set())
+            if name in new_members: gone += [f"ipset del {name} {spec} -exist" for spec in ipset_specs(dropped)]
+            fresh += [f"ipset add {name} {spec} -exist" for spec in ipset_specs(added)]
+        return gone, fresh
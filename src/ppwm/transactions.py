@@ -0,0 +1,110 @@
+import fcntl, hashlib, json, os, tempfile, threading, time
+from contextlib import contextmanager
+from profiling import span, traced
+
+JOURNAL_SUFFIX = ".journal"
+_locks, _guard = {}, threading.Lock()
+
+class ConflictError(RuntimeError):
+    pass
+
+class LockTimeout(RuntimeError):
+    pass
+
+def fsync_dir(path):
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@traced("file.atomic_write", lambda path, text: {"path": path, "bytes": len(text)})
+def atomic_write(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush(); os.fsync(f.fileno())
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o600)
+        os.replace(tmp_path, path)
+        fsync_dir(os.path.dirname(os.path.abspath(path)))
+    except BaseException:
+        if os.path.exists(tmp_path): os.unlink(tmp_path)
+        raise
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def file_digest(path):
+    try:
+        with open(path) as f: return digest(f.read())
+    except FileNotFoundError:
+        return None
+
+def sidecar(path, suffix):
+    path = os.path.abspath(path)
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}{suffix}")
+
+class _PathLock:
+    def __init__(self):
+        self.rlock, self.fd, self.depth = threading.RLock(), None, 0
+
+@contextmanager
+def locked(path, timeout=None):
+    key = os.path.abspath(path)
+    with _guard: lock = _locks.setdefault(key, _PathLock())
+    with span("lock.wait", path=path):
+        if not lock.rlock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f"Timed out waiting for {path} to be unlocked.")
+    try:
+        if lock.depth == 0:
+            fd = os.open(sidecar(key, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            with span("lock.flock", path=path):
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | (0 if deadline is None else fcntl.LOCK_NB))
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            os.close(fd)
+                            raise LockTimeout(f"Timed out waiting for {path} to be unlocked.")
+                        time.sleep(0.05)
+            lock.fd = fd
+        lock.depth += 1
+        try:
+            yield
+        finally:
+            lock.depth -= 1
+            if lock.depth == 0:
+                fcntl.flock(lock.fd, fcntl.LOCK_UN); os.close(lock.fd)
+                lock.fd = None
+    finally:
+        lock.rlock.release()
+
+@traced("file.commit", lambda path, files: {"path": path, "files": len(files), "bytes": sum(map(len, files.values()))})
+def commit(path, files):
+    journal = sidecar(path, JOURNAL_SUFFIX)
+    with locked(path):
+        atomic_write(journal, json.dumps({"files": {os.path.abspath(name): text for name, text in files.items()}}))
+        for name, text in files.items(): atomic_write(name, text)
+        os.unlink(journal)
+        fsync_dir(os.path.dirname(journal))
+
+def recover(config_dir="/etc/wireguard"):
+    recovered = []
+    if not os.path.isdir(config_dir): return recovered
+    for name in sorted(os.listdir(config_dir)):
+        if not (name.startswith(".") and name.endswith(f".conf{JOURNAL_SUFFIX}")): continue
+        journal = os.path.join(config_dir, name)
+        config_path = os.path.join(config_dir, name[1:-len(JOURNAL_SUFFIX)])
+        with locked(config_path):
+            if not os.path.exists(journal): continue
+            try:
+                with open(journal) as f: files = json.load(f)["files"]
+            except (OSError, ValueError, KeyError):
+                files = {}
+            for target, text in files.items(): atomic_write(target, text)
+            os.unlink(journal)
+        if files: recovered.append(config_path)
+    return recovered
@@ -0,0 +1,195 @@
+import json, os, subprocess
+from config_generation import default_interface
+from config_model import load
+from live_apply import interface_up
+from live_view import wg_dump
+from transactions import atomic_write, locked
+from utilities_module import read_sysctl, run_concurrently, write_sysctl
+
+TUNING_PROFILE = ".ppwm-tuning.json"
+SYSCTL_FILE = "/etc/sysctl.d/90-ppwm-tuning.conf"
+MODPROBE_FILE = "/etc/modprobe.d/ppwm-conntrack.conf"
+HASHSIZE = "/sys/module/nf_conntrack/parameters/hashsize"
+WG_OVERHEAD = {4: 60, 6: 80}
+IP_HEADER = {4: 28, 6: 48}
+MIN_MTU, MAX_PATH_MTU, DEFAULT_MTU = 1280, 1500, 1420
+FLOWS_PER_PORT, FLOWS_PER_PEER, CONNTRACK_FLOOR = 256, 1024, 262144
+UDP_BUFFER, NETDEV_BACKLOG = 16777216, 5000
+OFFLOAD = {"rx-udp-gro-forwarding": "on", "rx-gro-list": "off"}
+
+def family(host):
+    return 6 if ":" in host else 4
+
+def endpoint_host(endpoint):
+    host = endpoint.rsplit(":", 1)[0] if endpoint.count(":") == 1 or endpoint.startswith("[") else endpoint
+    return host.strip("[]")
+
+def ping_fits(host, payload):
+    try:
+        return subprocess.run(["ping", f"-{family(host)}", "-M", "do", "-c", "1", "-W", "1", "-s", str(payload), host],
+                              capture_output=True, timeout=5).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def probe_path_mtu(host, low=MIN_MTU, high=MAX_PATH_MTU):
+    header = IP_HEADER[family(host)]
+    if ping_fits(host, high - header): return high
+    if not ping_fits(host, low - header): return None
+    while high - low > 1:
+        mid = (low + high) // 2
+        if ping_fits(host, mid - header): low = mid
+        else: high = mid
+    return low
+
+def peer_endpoints(config):
+    hosts = {endpoint_host(peer["endpoint"]) for peer in wg_dump().get(config.name, {}).get("peers", []) if peer["endpoint"] != "(none)"}
+    for peer in config.peers:
+        for line in peer:
+            key, _, value = line.partition("=")
+            if key.strip() == "Endpoint" and value.strip(): hosts.add(endpoint_host(value.strip()))
+    return sorted(hosts)
+
+def tunnel_mtu(hosts):
+    path_mtus = run_concurrently(probe_path_mtu, hosts)
+    mtus = [mtu - WG_OVERHEAD[family(host)] for host, mtu in path_mtus.items() if mtu]
+    return max(MIN_MTU, min(mtus)) if mtus else None
+
+def conntrack_size(ports, peers):
+    needed, size = ports * FLOWS_PER_PORT + peers * FLOWS_PER_PEER, CONNTRACK_FLOOR
+    while size < needed * 2: size *= 2
+    return size, size // 4
+
+def read_hashsize():
+    try:
+        with open(HASHSIZE) as f: return f.read().strip()
+    except OSError:
+        return None
+
+def write_hashsize(value):
+    try:
+        with open(HASHSIZE, "w") as f: f.write(str(value))
+    except OSError:
+        write_sysctl("net.netfilter.nf_conntrack_buckets", value)
+
+def ethtool_features(iface):
+    try:
+        output = subprocess.run(["ethtool", "-k", iface], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    features = {}
+    for line in output.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() in OFFLOAD and value.split(): features[key.strip()] = value.split()[0]
+    return features
+
+def set_features(iface, features):
+    if not iface or not features: return
+    subprocess.run(["ethtool", "-K", iface] + [word for item in features.items() for word in item], capture_output=True)
+
+def raised(key, target):
+    current = read_sysctl(key)
+    return max(int(current), target) if current.isdigit() else target
+
+def load_configs(config_dir):
+    return [load(os.path.join(config_dir, name)) for name in sorted(os.listdir(config_dir)) if name.endswith(".conf")]
+
+def plan_profile(config_dir="/etc/wireguard", probe=True, mtu=None, iface=None):
+    configs = load_configs(config_dir)
+    conntrack_max, buckets = conntrack_size(sum(len(c.port_index) for c in configs), sum(len(c.peers) for c in configs))
+    iface = iface or default_interface()
+    mtus = {config.name: mtu for config in configs} if mtu else {}
+    if probe and not mtu:
+        mtus = {config.name: tunnel_mtu(hosts) for config in configs if (hosts := peer_endpoints(config))}
+    return {"sysctl": {"net.netfilter.nf_conntrack_max": raised("net.netfilter.nf_conntrack_max", conntrack_max),
+                       "net.core.rmem_max": raised("net.core.rmem_max", UDP_BUFFER), "net.core.wmem_max": raised("net.core.wmem_max", UDP_BUFFER),
+                       "net.core.netdev_max_backlog": raised("net.core.netdev_max_backlog", NETDEV_BACKLOG), "net.ipv4.tcp_mtu_probing": 1},
+            "hashsize": max(buckets, int(read_hashsize() or 0)), "iface": iface, "offload": dict(OFFLOAD) if iface else {},
+            "mtu": {name: value for name, value in mtus.items() if value}}
+
+def snapshot(config_dir, plan):
+    configs = {config.name: config for config in load_configs(config_dir)}
+    features = ethtool_features(plan["iface"]) if plan["iface"] else {}
+    return {"sysctl": {key: read_sysctl(key) for key in plan["sysctl"]}, "hashsize": read_hashsize(), "iface": plan["iface"],
+            "offload": {key: features[key] for key in plan["offload"] if key in features},
+            "mtu": {name: configs[name].interface_value("MTU") for name in plan["mtu"] if name in configs}}
+
+def load_profile(config_dir="/etc/wireguard"):
+    try:
+        with open(os.path.join(config_dir, TUNING_PROFILE)) as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def set_mtus(config_dir, mtus):
+    for name, value in mtus.items():
+        path = os.path.join(config_dir, f"{name}.conf")
+        if not os.path.exists(path): continue
+        with locked(path):
+            config = load(path)
+            config.set_interface_value("MTU", value)
+            config.save()
+        if interface_up(name): subprocess.run(["ip", "link", "set", "dev", name, "mtu", str(value or DEFAULT_MTU)], capture_output=True)
+
+def write_persistent(plan):
+    for path, text in ((SYSCTL_FILE, "".join(f"{key} = {value}\n" for key, value in plan["sysctl"].items())),
+                       (MODPROBE_FILE, f"options nf_conntrack hashsize={plan['hashsize']}\n")):
+        try:
+            atomic_write(path, f"# Managed by wireguard-manager tuning; remove with 'tune revert'.\n{text}")
+        except OSError as e:
+            print(f"Could not persist {path}: {e}")
+
+def apply_profile(config_dir="/etc/wireguard", plan=None):
+    profile = load_profile(config_dir)
+    plan = plan or profile["plan"]
+    previous = snapshot(config_dir, plan)
+    if profile:
+        for part in ("sysctl", "offload", "mtu"): previous[part].update(profile["previous"][part])
+        previous["hashsize"], previous["iface"] = profile["previous"]["hashsize"], profile["previous"]["iface"]
+    atomic_write(os.path.join(config_dir, TUNING_PROFILE), json.dumps({"plan": plan, "previous": previous}, indent=2))
+    for key, value in plan["sysctl"].items(): write_sysctl(key, value)
+    if plan["hashsize"]: write_hashsize(plan["hashsize"])
+    set_features(plan["iface"], plan["offload"])
+    set_mtus(config_dir, plan["mtu"])
+    write_persistent(plan)
+    return plan
+
+def revert_profile(config_dir="/etc/wireguard"):
+    profile = load_profile(config_dir)
+    if not profile: return None
+    previous = profile["previous"]
+    for key, value in previous["sysctl"].items():
+        if value != "unknown": write_sysctl(key, value)
+    if previous["hashsize"]: write_hashsize(previous["hashsize"])
+    set_features(previous["iface"], previous["offload"])
+    set_mtus(config_dir, previous["mtu"])
+    for path in (SYSCTL_FILE, MODPROBE_FILE):
+        if os.path.exists(path): os.unlink(path)
+    os.unlink(os.path.join(config_dir, TUNING_PROFILE))
+    return previous
+
+def suggested_mtu(config_dir="/etc/wireguard"):
+    profile = load_profile(config_dir)
+    mtus = profile["plan"]["mtu"].values() if profile else []
+    return str(min(mtus)) if mtus else str(DEFAULT_MTU)
+
+def format_plan(plan, previous):
+    lines = [f"{key} = {previous['sysctl'].get(key)} -> {value}" for key, value in plan["sysctl"].items()]
+    lines.append(f"nf_conntrack hashsize = {previous['hashsize']} -> {plan['hashsize']}")
+    lines += [f"{plan['iface']} {key} = {previous['offload'].get(key, 'unknown')} -> {value}" for key, value in plan["offload"].items()]
+    lines += [f"{name} MTU = {previous['mtu'].get(name) or 'default'} -> {value}" for name, value in plan["mtu"].items()]
+    if not plan["mtu"]: lines.append("MTU unchanged: no peer endpoints to probe (pass --mtu to set one).")
+    return "\n".join(lines)
+
+def tuning_menu(config_dir="/etc/wireguard"):
+    profile = load_profile(config_dir)
+    print("A tuning profile is applied." if profile else "No tuning profile is applied.")
+    choice = input("=== Throughput Tuning ===\n1. Probe and Apply Profile\n2. Revert Profile\nx. Return\nYour choice: ").strip()
+    if choice == "1":
+        mtu = input("Tunnel MTU (blank to probe peer endpoints): ").strip()
+        if mtu and not (mtu.isdigit() and MIN_MTU <= int(mtu) <= MAX_PATH_MTU): return print("Invalid MTU.")
+        plan = plan_profile(config_dir, mtu=int(mtu) if mtu else None)
+        print(format_plan(plan, profile["previous"] if profile else snapshot(config_dir, plan)))
+        if input("Apply this profile?\n (yes/no)\n(Default: no): ").strip().lower() == "yes":
+            apply_profile(config_dir, plan)
+            print("Tuning profile applied and persisted.")
+    elif choice == "2":
+        print("Tuning profile reverted." if revert_profile(config_dir) else "No tuning profile to revert.")
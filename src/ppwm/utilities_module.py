@@ -1,18 +1,78 @@
-import os, subprocess
+import glob, os, re, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from live_view import live_view, proc_sockets, socket_owners, wg_dump
+from ruleset import render_restore
+from validator import format_diagnostics, validate_configs
+
+SYSTEMD_DIR = "/etc/systemd/system"
+
+def run_concurrently(func, items, max_workers=16):
+    items = list(items)
+    if not items: return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return dict(zip(items, pool.map(func, items)))
+
+def read_sysctl(key):
+    try:
+        with open(f"/proc/sys/{key.replace('.', '/')}") as f: return f.read().strip()
+    except OSError:
+        try:
+            return subprocess.check_output(["sysctl", "-n", key], text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+
+def write_sysctl(key, value):
+    try:
+        with open(f"/proc/sys/{key.replace('.', '/')}", "w") as f: f.write(str(value))
+    except OSError:
+        os.system(f"sysctl -w {key}={value}")
+
+def enabled_units():
+    if not os.path.isdir(SYSTEMD_DIR): return None
+    return {os.path.basename(link)[:-8] for link in glob.glob(os.path.join(SYSTEMD_DIR, "*.wants", "wg-quick@*.service"))}
+
+def systemctl_status(config):
+    result = subprocess.run(["systemctl", "is-enabled", f"wg-quick@{config}"], capture_output=True, text=True)
+    return "enabled" if "enabled" in result.stdout else "disabled"
 
 def get_wireguard_status(configs):
-    statuses = {}
-    for config in configs:
-        result = subprocess.run(["systemctl", "is-enabled", f"wg-quick@{config}"], capture_output=True, text=True)
-        statuses[config] = "enabled" if "enabled" in result.stdout else "disabled"
-    return statuses
+    units = enabled_units()
+    if units is None: return run_concurrently(systemctl_status, configs)
+    return {config: "enabled" if f"wg-quick@{config}" in units else "disabled" for config in configs}
+
+def collect_status(config_dir="/etc/wireguard/"):
+    configs = [f[:-5] for f in os.listdir(config_dir) if f.endswith(".conf")]
+    autostart = get_wireguard_status(configs)
+    keys = ["net.ipv4.ip_forward", "net.ipv6.conf.all.forwarding", "net.ipv6.conf.all.disable_ipv6", "net.ipv6.conf.default.disable_ipv6"]
+    return {"interfaces": {config: {"autostart": autostart[config], "up": os.path.exists(f"/sys/class/net/{config}")} for config in configs},
+            "sysctl": {key: read_sysctl(key) for key in keys}}
+
+def status_overview():
+    status = collect_status()
+    print("=== WireGuard Status ===")
+    for name, info in sorted(status["interfaces"].items()):
+        print(f"{name:<16}{'up' if info['up'] else 'down':<8}autostart: {info['autostart']}")
+    for key, value in status["sysctl"].items():
+        print(f"{key} = {value}")
+
+def interface_rules(interface):
+    try:
+        output = subprocess.run(["iptables-save", "-t", "filter"], capture_output=True, text=True).stdout
+    except OSError:
+        return []
+    matches = re.compile(rf"(?:^| )-[io] {re.escape(interface)}(?: |$)")
+    return [("filter", "-D" + line[2:]) for line in output.splitlines() if line.startswith("-A ") and matches.search(line)]
 
 def set_default_policies(policy, interface=None):
-    os.system(f"iptables -P INPUT {policy}")
-    os.system(f"iptables -P FORWARD {policy}")
-    os.system(f"iptables -P OUTPUT ACCEPT")
-    os.system(f"iptables -F -i {interface}" if interface else "iptables -F")
-    print(f"Default policies set to {policy} for interface {interface}." if interface else f"Default policies set to {policy}. All rules flushed.")
+    rules = [("filter", f"-P INPUT {policy}"), ("filter", f"-P FORWARD {policy}"), ("filter", "-P OUTPUT ACCEPT")]
+    flushed = interface_rules(interface) if interface else [("filter", "-F")]
+    try:
+        result = subprocess.run(["iptables-restore", "--noflush"], input=render_restore(rules + flushed), capture_output=True, text=True)
+    except OSError as e:
+        return print(f"Could not run iptables-restore: {e}")
+    if result.returncode: return print(f"iptables-restore failed, nothing was changed: {result.stderr.strip()}")
+    print(f"Default policies set to {policy}; removed {len(flushed)} filter rule(s) matching interface {interface}." if interface
+          else f"Default policies set to {policy}. All rules flushed.")
 
 def reset_iptables():
     mode = input("Do you want to reset:\n (1) Global settings\n (2) WireGuard interface settings?\n(Default: 1): ").strip() or "1"
@@ -29,11 +89,11 @@ def reset_iptables():
 
 def toggle_forwarding(ip_version):
     key = "net.ipv4.ip_forward" if ip_version == "IPv4" else "net.ipv6.conf.all.forwarding"
-    current_status = "enabled" if subprocess.check_output(["sysctl", key], text=True).split("=")[1].strip() == "1" else "disabled"
+    current_status = "enabled" if read_sysctl(key) == "1" else "disabled"
     print(f"Current {ip_version} forwarding status: {current_status}")
     enable = input(f"Enable {ip_version} forwarding?\n (yes/no)\n(Default: {'yes' if current_status == 'disabled' else 'no'}): ").strip().lower() or ("yes" if current_status == "disabled" else "no")
     status = "1" if enable == "yes" else "0"
-    os.system(f"sysctl -w {key}={status}")
+    write_sysctl(key, status)
     if input("Make this change permanent?\n (yes/no)\n(Default: no): ").strip().lower() == "yes":
         with open("/etc/sysctl.conf", "a") as f: f.write(f"{key}={status}\n")
         os.system("sysctl -p")
@@ -48,16 +108,10 @@ def forwarding_menu():
         else: print("Invalid choice. Try again.")
 
 def disable_ipv6():
-    def get_status(key):
-        try:
-            return subprocess.check_output(["sysctl", key], text=True).split("=")[1].strip()
-        except subprocess.CalledProcessError:
-            return "unknown"
-
     ipv6_status = {
-        "all": "disabled" if get_status("net.ipv6.conf.all.disable_ipv6") == "1" else "enabled",
-        "default": "disabled" if get_status("net.ipv6.conf.default.disable_ipv6") == "1" else "enabled",
-        "forwarding": "enabled" if get_status("net.ipv6.conf.all.forwarding") == "1" else "disabled"
+        "all": "disabled" if read_sysctl("net.ipv6.conf.all.disable_ipv6") == "1" else "enabled",
+        "default": "disabled" if read_sysctl("net.ipv6.conf.default.disable_ipv6") == "1" else "enabled",
+        "forwarding": "enabled" if read_sysctl("net.ipv6.conf.all.forwarding") == "1" else "disabled"
     }
 
     print("=== Current IPv6 Status ===")
@@ -70,11 +124,11 @@ def disable_ipv6():
         print("IPv6 disable operation canceled.")
         return
 
-    os.system("sysctl -w net.ipv6.conf.all.disable_ipv6=1")
-    os.system("sysctl -w net.ipv6.conf.default.disable_ipv6=1")
+    write_sysctl("net.ipv6.conf.all.disable_ipv6", 1)
+    write_sysctl("net.ipv6.conf.default.disable_ipv6", 1)
     forward_disable = input("Disable IPv6 forwarding as well?\n (yes/no)\n(Default: yes): ").strip().lower() or "yes"
     if forward_disable == "yes":
-        os.system("sysctl -w net.ipv6.conf.all.forwarding=0")
+        write_sysctl("net.ipv6.conf.all.forwarding", 0)
 
     make_permanent = input("Make this change permanent?\n (yes/no)\n(Default: no): ").strip().lower() or "no"
     if make_permanent == "yes":
@@ -89,16 +143,20 @@ def disable_ipv6():
     if input("Reboot now?\n (yes/no)\n(Default: no): ").strip().lower() == "yes":
         os.system("reboot")
 
-def validate_wireguard_configs():
-    configs = [f for f in os.listdir("/etc/wireguard/") if f.endswith(".conf")]
-    if not configs: return print("No WireGuard configuration files found.")
-    for cfg in configs:
-        result = subprocess.run(["wg", "showconf", os.path.join("/etc/wireguard/", cfg)], capture_output=True)
-        print(f"Config: {cfg} - {'Valid' if result.returncode == 0 else 'Invalid'}")
+def validate_wireguard_configs(config_dir="/etc/wireguard/"):
+    results = validate_configs(config_dir)
+    if not results: return print("No WireGuard configuration files found.")
+    errors = 0
+    for path, diagnostics in results.items():
+        errors += sum(level == "error" for _, level, _ in diagnostics)
+        print(f"Config: {os.path.basename(path)} - {'Invalid' if any(level == 'error' for _, level, _ in diagnostics) else 'Valid'}")
+        for line in format_diagnostics(path, diagnostics): print(f"  {line}")
+    return errors
 
 def view_active_connections():
-    try: print(subprocess.check_output(["wg"], text=True))
-    except subprocess.CalledProcessError as e: print(f"Error retrieving active connections: {e}")
+    if not wg_dump(): return print("No active WireGuard interfaces found.")
+    print("Refreshing every second. Press Ctrl+C to return.")
+    live_view()
 
 def toggle_interface_autostart():
     configs = [f[:-5] for f in os.listdir("/etc/wireguard/") if f.endswith(".conf")]
@@ -119,18 +177,20 @@ def toggle_interface_autostart():
 def view_services_and_processes_by_port():
     print("=== Services and Processes by Port ===")
     try:
-        result = subprocess.check_output(["ss", "-tuln"], text=True).splitlines()
+        sockets = proc_sockets()
+        owners = socket_owners(s["inode"] for s in sockets)
         header = f"{'Proto':<8}{'Local Address':<25}{'Foreign Address':<25}{'State':<15}{'PID/Program Name':<20}"
         print(header)
         print("=" * len(header))
-        for line in result[1:]:
-            print(line)
+        for s in sorted(sockets, key=lambda s: (s["proto"], s["port"])):
+            state = "LISTEN" if s["proto"].startswith("tcp") else "UNCONN"
+            print(f"{s['proto']:<8}{s['local_ip'] + ':' + str(s['port']):<25}{s['remote']:<25}{state:<15}{owners.get(s['inode'], '-'):<20}")
     except Exception as e:
         print(f"Error retrieving port information: {e}")
 
 def utilities_menu():
     while True:
-        choice = input("=== Utilities Menu ===\n1. Reset iptables Rules\n2. Enable/Disable Forwarding\n3. Disable IPv6\n4. Validate WireGuard Configurations\n5. View Active WireGuard Connections\n6. Toggle Interface Autostart\n7. View Services and Processes by Port\nx. Return to Main Menu\nYour choice: ").strip()
+        choice = input("=== Utilities Menu ===\n1. Reset iptables Rules\n2. Enable/Disable Forwarding\n3. Disable IPv6\n4. Validate WireGuard Configurations\n5. View Active WireGuard Connections\n6. Toggle Interface Autostart\n7. View Services and Processes by Port\n8. Status Overview\n9. Throughput Tuning\nx. Return to Main Menu\nYour choice: ").strip()
         if choice == "1": reset_iptables()
         elif choice == "2": forwarding_menu()
         elif choice == "3": disable_ipv6()
@@ -138,5 +198,9 @@ def utilities_menu():
         elif choice == "5": view_active_connections()
         elif choice == "6": toggle_interface_autostart()
         elif choice == "7": view_services_and_processes_by_port()
+        elif choice == "8": status_overview()
+        elif choice == "9":
+            from tuning import tuning_menu
+            tuning_menu()
         elif choice == "x": break
         else: print("Invalid choice. Try again.")
@@ -0,0 +1,147 @@
+import base64, binascii, ipaddress, os, shlex
+from concurrent.futures import ProcessPoolExecutor
+from config_model import CATEGORIES, PORT_LINE
+
+KEY_FIELDS = ("PrivateKey", "PublicKey", "PresharedKey")
+POOL_THRESHOLD = 64
+ADD_FLAGS = {"-A": "-D", "-I": "-D", "-N": "-X"}
+
+def valid_key(value):
+    try:
+        return len(value) == 44 and len(base64.b64decode(value, validate=True)) == 32
+    except (binascii.Error, ValueError):
+        return False
+
+def normalize(rule):
+    try:
+        return shlex.join(shlex.split(rule))
+    except ValueError:
+        return rule
+
+def undo_of(rule):
+    try:
+        tokens = shlex.split(rule)
+    except ValueError:
+        return None
+    if tokens[:1] == ["iptables-restore"] and tokens[-1].endswith(".up.rules"):
+        return shlex.join(tokens[:-1] + [tokens[-1][:-9] + ".down.rules"])
+    if tokens[:2] == ["ipset", "create"] and len(tokens) > 2: return f"ipset destroy {tokens[2]}"
+    if tokens[:1] != ["iptables"]: return None
+    for i, token in enumerate(tokens):
+        if token in ADD_FLAGS:
+            rest = tokens[i + 2:]
+            if token == "-I" and rest and rest[0].isdigit(): rest = rest[1:]
+            return shlex.join(tokens[:i] + [ADD_FLAGS[token], tokens[i + 1]] + ([] if token == "-N" else rest))
+    return None
+
+def validate_text(text):
+    diagnostics, section, category, subsection = [], None, None, None
+    headers, addresses, private_key, ports, subsections, ups, downs, peers = [], [], False, {}, {}, [], [], []
+    issue = lambda line, level, message: diagnostics.append((line, level, message))
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if "<client_ip>" in line:
+            issue(number, "error", "unresolved <client_ip> placeholder; the rule was generated before the config had a peer")
+        if line.startswith("[Category:"):
+            section, category, subsection = "category", line.split(":", 1)[1].strip(" ]"), None
+            if category not in CATEGORIES: issue(number, "warning", f"unknown category '{category}' (expected one of {', '.join(CATEGORIES)})")
+            continue
+        if line.startswith("["):
+            section = {"[Interface]": "interface", "[Peer]": "peer"}.get(line)
+            if section is None: issue(number, "error", f"unknown section {line}")
+            elif section == "interface": headers.append(number)
+            else: peers.append({"line": number, "keys": {}})
+            continue
+        if not line or line == "# Categories and Subsections": continue
+        if section == "category":
+            if line.startswith("Subsection:"):
+                subsection = line.split(":", 1)[1].strip()
+                if not subsection: issue(number, "error", "empty subsection name")
+                elif subsection in subsections: issue(number, "error", f"subsection '{subsection}' already defined on line {subsections[subsection]}")
+                else: subsections[subsection] = number
+            elif match := PORT_LINE.match(line):
+                port, proto, forward = int(match.group(1)), match.group(2).lower(), match.group(3)
+                if subsection is None: issue(number, "error", "port listed outside a subsection")
+                if not 1 <= port <= 65535 or (forward and not 1 <= int(forward) <= 65535):
+                    issue(number, "error", f"port {port}{f' -> {forward}' if forward else ''} is outside 1-65535")
+                if (port, proto) in ports: issue(number, "error", f"duplicate port {port}/{proto} (first listed on line {ports[(port, proto)]})")
+                else: ports[(port, proto)] = number
+            elif not line.startswith("#"):
+                issue(number, "warning", f"unrecognised line in category section: {line}")
+            continue
+        if line.startswith("#") or section is None:
+            if section is None and not line.startswith("#"): issue(number, "error", "setting outside of any section")
+            continue
+        key, sep, value = (part.strip() for part in line.partition("="))
+        if not sep:
+            issue(number, "error", f"expected 'Key = Value', got: {line}"); continue
+        if key in KEY_FIELDS and not valid_key(value):
+            issue(number, "error", f"{key} is not a base64-encoded 32-byte key")
+        if section == "interface":
+            if key == "PostUp": ups += [(number, rule.strip()) for rule in value.split(";") if rule.strip()]
+            elif key == "PostDown": downs += [(number, rule.strip()) for rule in value.split(";") if rule.strip()]
+            elif key == "ListenPort" and not (value.isdigit() and 1 <= int(value) <= 65535):
+                issue(number, "error", f"ListenPort '{value}' is not a port number")
+            elif key == "Address":
+                for address in value.split(","):
+                    try:
+                        addresses.append((number, ipaddress.ip_interface(address.strip())))
+                    except ValueError:
+                        issue(number, "error", f"invalid address '{address.strip()}'")
+            elif key == "PrivateKey":
+                private_key = True
+        elif section == "peer":
+            peers[-1]["keys"][key] = number
+            if key == "AllowedIPs":
+                for network in value.split(","):
+                    try:
+                        peers[-1].setdefault("networks", []).append((number, ipaddress.ip_network(network.strip(), strict=False)))
+                    except ValueError:
+                        issue(number, "error", f"invalid AllowedIPs entry '{network.strip()}'")
+            elif key == "Endpoint" and not value.rpartition(":")[2].isdigit():
+                issue(number, "error", f"Endpoint '{value}' has no port")
+
+    if not headers: issue(1, "error", "missing [Interface] section")
+    elif len(headers) > 1: issue(headers[1], "error", f"second [Interface] section (first on line {headers[0]})")
+    elif not private_key:
+        issue(headers[0], "error", "[Interface] has no PrivateKey")
+    if ports and not subsections: issue(min(ports.values()), "error", "ports listed without any subsection")
+
+    seen = []
+    for peer in peers:
+        if "PublicKey" not in peer["keys"]: issue(peer["line"], "error", "[Peer] has no PublicKey")
+        for number, network in peer.get("networks", []):
+            for address_line, address in addresses:
+                if network.version == address.version and network.prefixlen == network.max_prefixlen and network.network_address == address.ip:
+                    issue(number, "error", f"AllowedIPs {network} is the interface's own address (line {address_line})")
+            for other_line, other in seen:
+                if network.version == other.version and network.overlaps(other):
+                    issue(number, "error", f"AllowedIPs {network} overlaps {other} of another peer (line {other_line})")
+        seen += peer.get("networks", [])
+
+    down_rules = {normalize(rule) for _, rule in downs}
+    for number, rule in ups:
+        undo = undo_of(rule)
+        if undo and undo not in down_rules: issue(number, "warning", f"PostUp has no matching PostDown: {undo}")
+    undone = {undo_of(rule) for _, rule in ups}
+    for number, rule in downs:
+        if rule.startswith("ipset destroy") and any(up.startswith("ipset restore") for _, up in ups): continue
+        if (" -D " in f" {rule} " or rule.startswith(("ipset destroy", "iptables-restore"))) and normalize(rule) not in undone:
+            issue(number, "warning", f"PostDown removes something PostUp never adds: {rule}")
+    return sorted(diagnostics)
+
+def validate_file(path):
+    try:
+        with open(path) as f: return validate_text(f.read())
+    except (OSError, UnicodeDecodeError) as e:
+        return [(0, "error", str(e))]
+
+def validate_configs(config_dir="/etc/wireguard/", max_workers=None):
+    paths = sorted(os.path.join(config_dir, f) for f in os.listdir(config_dir) if f.endswith(".conf"))
+    if len(paths) < POOL_THRESHOLD: return {path: validate_file(path) for path in paths}
+    workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(validate_file, paths, chunksize=max(1, len(paths) // (workers * 4)))))
+
+def format_diagnostics(path, diagnostics):
+    return [f"{path}:{line}: {level}: {message}" for line, level, message in diagnostics]
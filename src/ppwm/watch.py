@@ -0,0 +1,147 @@
+import ctypes, ctypes.util, os, select, struct, time
+from datetime import datetime
+from config_model import load
+from live_apply import hot_apply
+from transactions import commit, digest, file_digest, locked
+from validator import validate_file
+
+IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE = 0x8, 0x40, 0x80, 0x200
+EVENT = struct.Struct("iIII")
+
+def log(message):
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+def refresh_hooks(text, config):
+    ups, downs = config.rules()
+    hooks = [f"PostUp = {rule}\n" for rule in ups] + [f"PostDown = {rule}\n" for rule in downs]
+    lines, section, at, end = [], None, None, None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith("["): section = "interface" if stripped == "[Interface]" else "other"
+        if section == "interface" and stripped.partition("=")[0].strip() in ("PostUp", "PostDown"):
+            at = len(lines) if at is None else at; continue
+        lines.append(line)
+        if section == "interface" and stripped and not stripped.startswith("#"): end = len(lines)
+    if end and not lines[end - 1].endswith("\n"): lines[end - 1] += "\n"
+    at = at if at is not None else end if end is not None else len(lines)
+    return "".join(lines[:at] + hooks + lines[at:])
+
+class Inotify:
+    def __init__(self, path, mask=IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0 or libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            raise OSError(ctypes.get_errno(), f"inotify unavailable for {path}")
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = EVENT.unpack_from(data, offset)
+            names.append((data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0").decode(errors="replace"), mask))
+            offset += EVENT.size + length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class Poller:
+    def __init__(self, path):
+        self.path = path
+        self.seen = self.scan()
+
+    def scan(self):
+        return {entry.name: (entry.stat().st_mtime_ns, entry.stat().st_size) for entry in os.scandir(self.path) if entry.name.endswith(".conf")}
+
+    def read(self):
+        current, previous = self.scan(), self.seen
+        self.seen = current
+        return [(name, IN_CLOSE_WRITE) for name, key in current.items() if previous.get(name) != key] + \
+               [(name, IN_DELETE) for name in previous.keys() - current.keys()]
+
+    def close(self):
+        pass
+
+class Reconciler:
+    def __init__(self, config_dir="/etc/wireguard", apply=True):
+        self.config_dir, self.apply, self.state = config_dir, apply, {}
+        for name in sorted(os.listdir(config_dir)):
+            if name.endswith(".conf"):
+                try:
+                    config = load(os.path.join(config_dir, name))
+                except (OSError, ValueError) as e:
+                    log(f"{name}: not loaded: {e}"); continue
+                self.state[name] = (config.applied_rules, config.applied_peers, config.loaded)
+
+    def forget(self, name):
+        if self.state.pop(name, None): log(f"{name}: removed; running interface left as is.")
+
+    def reconcile(self, name):
+        path = os.path.join(self.config_dir, name)
+        errors = [f"line {line}: {message}" for line, level, message in validate_file(path) if level == "error"]
+        if errors:
+            log(f"{name}: not applied, {len(errors)} validation error(s): " + "; ".join(errors[:3])); return
+        with locked(path):
+            try:
+                config = load(path)
+            except (OSError, ValueError) as e:
+                log(f"{name}: not loaded: {e}"); return
+            previous = self.state.get(name)
+            if previous and previous[2] == config.loaded: return
+            if previous: config.applied_rules, config.applied_peers = previous[0], previous[1]
+            stale = {p: text for p, text in config.ruleset_files().items() if file_digest(p) != digest(text)}
+            with open(path) as f: text = f.read()
+            refreshed = refresh_hooks(text, config)
+            if refreshed != text:
+                if digest(text) != config.loaded:
+                    log(f"{name}: changed while reconciling; retrying on the next event."); return
+                stale[path] = refreshed
+            if stale:
+                commit(path, stale)
+                config.loaded = digest(refreshed)
+                log(f"{name}: updated {', '.join(os.path.basename(p) for p in stale)}" + (" (PostUp/PostDown lines only)." if path in stale else "."))
+            applied = None
+            if self.apply and previous:
+                try:
+                    applied = hot_apply(config)
+                except RuntimeError as e:
+                    log(f"{name}: live apply failed: {e}"); return
+            if applied: log(f"{name}: applied {applied[0]} removal(s), {applied[1]} addition(s){', peers synced' if applied[2] else ''}.")
+            elif previous: log(f"{name}: changed; interface {'down' if self.apply else 'not applied (--no-apply)'}, state recorded.")
+            else: log(f"{name}: new config recorded.")
+            config.mark_applied()
+            self.state[name] = (config.applied_rules, config.applied_peers, config.loaded)
+
+def watch(config_dir="/etc/wireguard", debounce=0.5, apply=True, poll_interval=2.0):
+    reconciler = Reconciler(config_dir, apply)
+    try:
+        source = Inotify(config_dir)
+        log(f"Watching {config_dir} with inotify ({len(reconciler.state)} config(s)).")
+    except (OSError, AttributeError) as e:
+        source = Poller(config_dir)
+        log(f"Watching {config_dir} by polling every {poll_interval:g}s ({e}).")
+    pending, deadline = {}, None
+    try:
+        while True:
+            timeout = poll_interval if isinstance(source, Poller) else (max(0, deadline - time.monotonic()) if deadline else None)
+            if not isinstance(source, Poller): select.select([source], [], [], timeout)
+            else: time.sleep(timeout)
+            for name, mask in source.read():
+                if name.endswith(".conf") and not name.startswith("."):
+                    pending[name] = mask
+                    deadline = time.monotonic() + debounce
+            if pending and (isinstance(source, Poller) or time.monotonic() >= deadline):
+                for name, mask in sorted(pending.items()):
+                    if mask & (IN_DELETE | IN_MOVED_FROM) and not os.path.exists(os.path.join(config_dir, name)): reconciler.forget(name)
+                    elif os.path.exists(os.path.join(config_dir, name)): reconciler.reconcile(name)
+                pending, deadline = {}, None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
@@ -0,0 +1,62 @@
+import os
+import backup_restore
+from backup_store import STORE_DIR, BackupStore
+
+def versions(count):
+    return [f"[Interface]\nAddress = 10.60.1.1/24\nListenPort = {51820 + i}\n" + "".join(f"Port: {p}/tcp\n" for p in range(i + 1))
+            for i in range(count)]
+
+def test_snapshot_restore_round_trip(tmp_path):
+    path, store = tmp_path / "wg0.conf", BackupStore(str(tmp_path / "store"), keep=20)
+    records = []
+    for i, text in enumerate(versions(12)):
+        path.write_text(text)
+        os.utime(path, ns=(i, i))
+        record, created = store.snapshot(str(path))
+        assert created
+        records.append(record)
+    assert store.snapshot(str(path)) == (records[-1], False)
+    assert [r["id"] for r in store.snapshots("wg0")] == [r["id"] for r in records]
+    for record, text in zip(records, versions(12)):
+        assert store.read_blob(record["hash"]).decode() == text
+    assert store.restore("wg0", records[3], str(tmp_path)) == str(path)
+    assert path.read_text() == versions(12)[3]
+    assert "+ListenPort = 51824\n" in store.diff(records[3], records[4])
+
+def test_prune_keeps_chains_readable(tmp_path):
+    path, store = tmp_path / "wg0.conf", BackupStore(str(tmp_path / "store"), keep=3)
+    for i, text in enumerate(versions(10)):
+        path.write_text(text)
+        os.utime(path, ns=(i, i))
+        store.snapshot(str(path))
+    kept = store.snapshots("wg0")
+    assert len(kept) == 3
+    assert [store.read_blob(r["hash"]).decode() for r in kept] == versions(10)[-3:]
+    assert store.gc() == 0
+
+def test_legacy_backups_are_cataloged_and_restored(tmp_path):
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    (backups / "wg0.conf-20240501-120000").write_text("legacy\n")
+    (tmp_path / "wg0.conf").write_text("current\n")
+    records = backup_restore.list_snapshots(str(tmp_path), "wg0")
+    assert len(records) == 1 and backup_restore.format_snapshot(records[0]).startswith(f"#{records[0]['id']} wg0 @ 2024-05-01 12:00:00")
+    assert backup_restore.list_snapshots(str(tmp_path), "wg0") == records
+    assert backup_restore.restore_file("wg0.conf-20240501-120000", str(tmp_path)) == str(tmp_path / "wg0.conf")
+    assert (tmp_path / "wg0.conf").read_text() == "legacy\n"
+    assert (backups / "wg0.conf-20240501-120000").exists()
+
+def test_legacy_backups_are_imported_once(tmp_path, monkeypatch):
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    for stamp in ("20240501-120000", "20240502-120000", "20240503-120000"):
+        (backups / f"wg0.conf-{stamp}").write_text(f"legacy {stamp}\n")
+    imports, collections = [], []
+    original_import = BackupStore.import_file
+    monkeypatch.setattr(BackupStore.__init__, "__defaults__", (STORE_DIR, 2))
+    monkeypatch.setattr(BackupStore, "import_file", lambda self, *a: imports.append(a[0]) or original_import(self, *a))
+    monkeypatch.setattr(BackupStore, "_collect", lambda self: collections.append(1) or 0)
+    first = backup_restore.list_snapshots(str(tmp_path), "wg0")
+    assert [backup_restore.format_snapshot(r).split(" @ ")[1][:10] for r in first] == ["2024-05-02", "2024-05-03"]
+    for _ in range(3): assert backup_restore.list_snapshots(str(tmp_path), "wg0") == first
+    assert len(imports) == 3 and collections == []
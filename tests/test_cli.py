@@ -0,0 +1,76 @@
+import json
+import pytest
+import cli, port_index
+
+CONFIG = """[Interface]
+Address = 10.60.{subnet}.1/24
+PrivateKey = x
+
+# Categories and Subsections
+[Category: Games]
+Subsection: Web
+Port: 8080/tcp
+"""
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_index, "live_listeners", lambda: {"tcp": set(), "udp": set()})
+    for subnet, name in enumerate(("wg0", "wg1"), 1): (tmp_path / f"{name}.conf").write_text(CONFIG.format(subnet=subnet))
+    return tmp_path
+
+def batch(config_dir, operations):
+    path = config_dir / "batch.json"
+    path.write_text(json.dumps({"operations": operations}))
+    return cli.run(["--config-dir", str(config_dir), "--batch", str(path)])
+
+def contents(config_dir):
+    return {name: (config_dir / f"{name}.conf").read_text() for name in ("wg0", "wg1")}
+
+def test_batch_applies_all_operations(config_dir, capsys):
+    assert batch(config_dir, [{"action": "add", "config": "wg0", "subsection": "Web", "ports": "9000-9001"},
+                              {"action": "add_subsection", "config": "wg1", "subsection": "Game", "category": "Games"},
+                              {"action": "add", "config": "wg1", "subsection": "Game", "ports": "7000", "protocol": "udp"}]) == 0
+    assert "Port: 9001/tcp" in contents(config_dir)["wg0"] and "Port: 7000/udp" in contents(config_dir)["wg1"]
+    assert capsys.readouterr().out.count("applied") == 2
+
+def test_mixed_batch_leaves_failing_config_untouched(config_dir, capsys):
+    before = contents(config_dir)
+    assert batch(config_dir, [{"action": "add", "config": "wg0", "subsection": "Web", "ports": "9000"},
+                              {"action": "add", "config": "wg1", "subsection": "Web", "ports": "9100"},
+                              {"action": "delete", "config": "wg1", "ports": "1234"}]) == 1
+    after = contents(config_dir)
+    assert "Port: 9000/tcp" in after["wg0"] and after["wg1"] == before["wg1"]
+    out = capsys.readouterr().out
+    assert "wg0.conf: applied 1 operation(s)." in out and "wg1.conf: not changed; 1 of 2 operation(s) failed." in out
+
+def test_fully_failed_batch_reports_failure(config_dir, capsys):
+    before = contents(config_dir)
+    assert batch(config_dir, [{"action": "add", "config": "wg1", "subsection": "Web", "ports": "8080"},
+                              {"action": "delete_subsection", "config": "wg1", "subsection": "Nope"}]) == 1
+    assert contents(config_dir) == before
+    out = capsys.readouterr().out
+    assert "conflicts: 8080/tcp (wg0/Web)" in out and "no subsection Nope" in out and "applied" not in out
+
+def test_rolled_back_ports_do_not_conflict(config_dir):
+    assert batch(config_dir, [{"action": "add", "config": "wg0", "subsection": "Web", "ports": "9000"},
+                              {"action": "delete", "config": "wg0", "ports": "1"},
+                              {"action": "add", "config": "wg1", "subsection": "Web", "ports": "9000"}]) == 1
+    assert "Port: 9000/tcp" not in contents(config_dir)["wg0"] and "Port: 9000/tcp" in contents(config_dir)["wg1"]
+
+@pytest.mark.parametrize("operation, message", [
+    ("add", "operation must be a JSON object"),
+    ({"action": "rename", "config": "wg0"}, "unknown action 'rename'"),
+    ({"action": "add", "config": "wg0", "subsection": "Web"}, "missing ports"),
+    ({"action": "add", "subsection": "Web", "ports": "1"}, "missing config"),
+    ({"action": "delete", "config": "../etc/passwd", "ports": "1"}, "is not a config"),
+    ({"action": "add", "config": "wg0", "subsection": "Web", "ports": "1", "protocol": "icmp"}, "Invalid protocol 'icmp'"),
+    ({"action": "add", "config": "wg0", "subsection": "Web", "ports": "70000"}, "outside 1-65535"),
+])
+def test_malformed_operations(config_dir, capsys, operation, message):
+    before = contents(config_dir)
+    assert batch(config_dir, [operation]) == 1
+    assert message in capsys.readouterr().out and contents(config_dir) == before
+
+def test_operations_must_be_a_list(config_dir, capsys):
+    assert batch(config_dir, {"action": "add"}) == 1
+    assert "operations must be a JSON list" in capsys.readouterr().out
@@ -0,0 +1,12 @@
+import builtins
+import config_generation
+
+def test_peer_count_is_reprompted_until_valid(monkeypatch, capsys):
+    answers = iter(["three", "-2", "2.5", "4"])
+    monkeypatch.setattr(builtins, "input", lambda prompt: next(answers))
+    assert config_generation.get_count("Number of additional peers to provision") == 4
+    assert capsys.readouterr().out.count("not a valid count") == 3
+
+def test_peer_count_defaults_to_zero(monkeypatch):
+    monkeypatch.setattr(builtins, "input", lambda prompt: "")
+    assert config_generation.get_count("Number of additional peers to provision") == 0
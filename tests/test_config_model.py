@@ -0,0 +1,83 @@
+import pytest
+from config_model import RULE_MODES, WireGuardConfig, load
+
+HEADER = """[Interface]
+Address = 10.60.1.1/24
+ListenPort = 51820
+PrivateKey = x
+PostUp = iptables -t nat -A POSTROUTING -s 10.60.1.0/24 -o eth0 -j SNAT --to-source 203.0.113.1
+PostDown = iptables -t nat -D POSTROUTING -s 10.60.1.0/24 -o eth0 -j SNAT --to-source 203.0.113.1
+"""
+CUSTOM = ["iptables -I INPUT -p tcp --dport 25565 -m limit --limit 10/s -j ACCEPT",
+          "iptables -A FORWARD -s 198.51.100.0/24 -p tcp --dport 25565 -j ACCEPT",
+          "iptables -A FORWARD -p tcp --dport 25565 -j LOG --log-prefix mc"]
+CATEGORIES = """
+# Categories and Subsections
+[Category: Games]
+# game servers live here
+Subsection: Minecraft
+# java edition
+Port: 25565/tcp - survival
+# keep in sync with the panel
+Port: 25566/tcp -> 25567
+Port: 27015/udp
+Port: 27016/udp
+[Category: Services]
+[Category: Miscellaneous]
+
+[Peer]
+PublicKey = y
+AllowedIPs = 10.60.1.2/32
+"""
+
+def managed_lines(text):
+    return [line for line in text.splitlines() if line.startswith(("PostUp", "PostDown")) and "SNAT" not in line and not any(rule in line for rule in CUSTOM)]
+
+def test_custom_rules_survive(tmp_path):
+    config = WireGuardConfig.parse(HEADER + "".join(f"PostUp = {rule}\n" for rule in CUSTOM) + CATEGORIES, str(tmp_path / "wg0.conf"))
+    assert config.post_up[1:] == CUSTOM
+    text = config.serialize()
+    assert all(text.count(rule) == 1 for rule in CUSTOM)
+    assert WireGuardConfig.parse(text, str(tmp_path / "wg0.conf")).serialize() == text
+    config.remove_port(25565, "tcp")
+    text = config.serialize()
+    assert all(text.count(rule) == 1 for rule in CUSTOM) and "--dport 25565 -j DNAT" not in text
+
+@pytest.mark.parametrize("rule_mode", RULE_MODES)
+@pytest.mark.parametrize("apply_mode", ["postup", "restore"])
+def test_round_trip_is_stable(tmp_path, rule_mode, apply_mode):
+    config = WireGuardConfig.parse(HEADER + CATEGORIES, str(tmp_path / "wg0.conf"))
+    config.rule_mode, config.apply_mode = rule_mode, apply_mode
+    config.save()
+    text = (tmp_path / "wg0.conf").read_text()
+    reloaded = load(str(tmp_path / "wg0.conf"))
+    assert reloaded.post_up == [HEADER.splitlines()[4][len("PostUp = "):]] and len(reloaded.post_down) == 1
+    assert reloaded.serialize() == text
+
+def test_notes_survive(tmp_path):
+    config = WireGuardConfig.parse(HEADER + CATEGORIES, str(tmp_path / "wg0.conf"))
+    text = config.serialize()
+    for note in ("# game servers live here", "# java edition", "# keep in sync with the panel"): assert text.count(note) == 1
+    assert text.index("# keep in sync with the panel") < text.index("Port: 25566/tcp")
+    config.remove_port(25565, "tcp")
+    text = config.serialize()
+    assert "# keep in sync with the panel" in text and "Port: 25565/tcp" not in text
+
+def test_legacy_rules_are_replaced(tmp_path):
+    legacy = HEADER + "".join(
+        f"PostUp = iptables -t nat -A PREROUTING -p {proto} --dport {port} -j DNAT --to-destination <client_ip>:{target}\n"
+        f"PostUp = iptables -A FORWARD -p {proto} --dport {port} -j ACCEPT\n"
+        f"PostDown = iptables -t nat -D PREROUTING -p {proto} --dport {port} -j DNAT --to-destination <client_ip>:{target}\n"
+        f"PostDown = iptables -D FORWARD -p {proto} --dport {port} -j ACCEPT\n"
+        for port, proto, target in ((25565, "tcp", 25565), (25566, "tcp", 25567), (27015, "udp", 27015), (27016, "udp", 27016))) + CATEGORIES
+    config = WireGuardConfig.parse(legacy, str(tmp_path / "wg0.conf"))
+    assert len(config.post_up) == len(config.post_down) == 1
+    text = config.serialize()
+    assert "<client_ip>" not in text and "--to-destination 10.60.1.2:25567" in text
+    assert len(managed_lines(text)) == 16 and len(set(managed_lines(text))) == 16
+
+def test_rules_for_an_old_peer_address_are_managed(tmp_path):
+    text = WireGuardConfig.parse(HEADER + CATEGORIES, str(tmp_path / "wg0.conf")).serialize()
+    config = WireGuardConfig.parse(text.replace("AllowedIPs = 10.60.1.2/32", "AllowedIPs = 10.60.1.9/32"), str(tmp_path / "wg0.conf"))
+    assert len(config.post_up) == 1
+    assert "10.60.1.2" not in config.serialize()
@@ -0,0 +1,34 @@
+import http.client, json, os, stat, threading
+from http.server import ThreadingHTTPServer
+import pytest
+from fleet import TOKEN_FILE, Agent, agent_token, handler_for
+
+@pytest.fixture
+def agent(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_for(Agent(str(tmp_path), "secret")))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    def request(body, token="secret", path="/batch"):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        conn.request("POST", path, body, {"Authorization": f"Bearer {token}"} if token else {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    yield request
+    server.shutdown(); server.server_close()
+
+def test_generated_token_is_private_and_reused(tmp_path):
+    token, path = agent_token(str(tmp_path))
+    assert path == str(tmp_path / TOKEN_FILE) and len(token) >= 32
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert agent_token(str(tmp_path)) == (token, path)
+    assert agent_token(str(tmp_path), "given") == ("given", None)
+
+def test_agent_requires_token(agent):
+    assert agent("{}", token=None)[0] == 401
+    assert agent("{}", token="wrong")[0] == 401
+    assert agent("{}", path="/health") == (200, {"status": 0})
+    assert not Agent("/nonexistent", "").authorized("Bearer ")
+
+@pytest.mark.parametrize("body", ["[]", "3", '"batch"', "not json"])
+def test_agent_rejects_bad_bodies(agent, body):
+    status, payload = agent(body)
+    assert status == 400 and payload["status"] == 1
@@ -0,0 +1,59 @@
+import glob, json, os
+import pytest
+import cli, config_generation
+from ip_allocator import INDEX_FILE, IPAllocator, scan_addresses
+
+SERVER = """[Interface]
+Address = 10.60.{subnet}.1/24
+PrivateKey = x
+
+[Peer]
+PublicKey = y
+AllowedIPs = 10.60.{subnet}.2/32, 192.168.0.0/16
+"""
+
+def write(config_dir, name, subnet):
+    path = config_dir / f"{name}.conf"
+    path.write_text(SERVER.format(subnet=subnet))
+    return path
+
+def test_scan_addresses(tmp_path):
+    assert scan_addresses(write(tmp_path, "wg0", 1)) == ["10.60.1.1", "10.60.1.2"]
+
+def test_allocation(tmp_path):
+    write(tmp_path, "wg0", 1); write(tmp_path, "wg1", 2)
+    allocator = IPAllocator(str(tmp_path))
+    assert allocator.next_subnet() == 3
+    assert allocator.is_used("10.60.1.2") and not allocator.is_used("10.60.1.3")
+    assert allocator.next_host("10.60.1") == "10.60.1.3"
+    assert allocator.next_host("10.60.9") == "10.60.9.2"
+    allocator.reserve("10.60.1.3")
+    assert allocator.next_host("10.60.1") == "10.60.1.4"
+    with pytest.raises(ValueError, match="already allocated"):
+        allocator.reserve("10.60.1.3")
+
+def test_full_subnet(tmp_path):
+    allocator = IPAllocator(str(tmp_path))
+    for host in range(2, 255): allocator.reserve(f"10.60.5.{host}")
+    with pytest.raises(ValueError, match="No free address"):
+        allocator.next_host("10.60.5")
+
+def test_index_tracks_changes(tmp_path):
+    write(tmp_path, "wg0", 1)
+    IPAllocator(str(tmp_path))
+    with open(tmp_path / INDEX_FILE) as f: assert json.load(f)["files"]["wg0.conf"]["addresses"] == ["10.60.1.1", "10.60.1.2"]
+    path = write(tmp_path, "wg0", 7)
+    os.utime(path, ns=(1, 1))
+    allocator = IPAllocator(str(tmp_path))
+    assert allocator.is_used("10.60.7.1") and not allocator.is_used("10.60.1.1")
+    os.unlink(path)
+    assert IPAllocator(str(tmp_path)).used == {}
+
+def test_generated_configs_are_allocated(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_generation, "generate_keys", lambda: ("a2V5", "cHVi"))
+    for name in ("wg0", "wg1"):
+        assert cli.run(["--config-dir", str(tmp_path), "generate", "--name", name, "--iface", "eth0", "--public-ip", "203.0.113.1"]) == 0
+    servers = sorted(glob.glob(str(tmp_path / "*-*" / "*_server.conf")))
+    addresses = [next(line for line in open(path) if line.startswith("Address")) for path in servers]
+    assert addresses == ["Address = 10.60.1.1/24\n", "Address = 10.60.2.1/24\n"]
+    assert IPAllocator(str(tmp_path)).next_subnet() == 3
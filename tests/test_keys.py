@@ -0,0 +1,51 @@
+import base64, subprocess
+import pytest
+import keys
+
+PRIVATE = "dwdtCnMYpX08FsFyUbJmRd9ML4frwJkqsXf7pR25LCo="
+PUBLIC = "hSDwCYkwp1R0i33ctD73Wg2/Og0mOBr066SpjqqbTmo="
+
+@pytest.fixture
+def fake_wg(monkeypatch):
+    calls = []
+    def run(args, input=None, **kw):
+        calls.append((args, input))
+        return subprocess.CompletedProcess(args, 0, (PRIVATE if args[1] == "genkey" else PUBLIC) + "\n", "")
+    monkeypatch.setattr(keys, "X25519PrivateKey", None)
+    monkeypatch.setattr(keys.subprocess, "run", run)
+    return calls
+
+def test_clamp():
+    clamped = keys.clamp(b"\xff" * 32)
+    assert clamped[0] == 248 and clamped[31] == 127 and clamped[1:31] == b"\xff" * 30
+    assert keys.clamp(b"\x00" * 32)[31] == 64
+
+def test_wg_fallback(fake_wg):
+    assert keys.generate_keypair() == (PRIVATE, PUBLIC)
+    assert fake_wg == [(["wg", "genkey"], None), (["wg", "pubkey"], PRIVATE)]
+
+def test_wg_fallback_batch(fake_wg):
+    assert keys.generate_keypairs(12) == [(PRIVATE, PUBLIC)] * 12
+    assert len(fake_wg) == 24
+
+def test_missing_wg(monkeypatch):
+    def run(args, **kw): raise FileNotFoundError(2, "No such file or directory", "wg")
+    monkeypatch.setattr(keys, "X25519PrivateKey", None)
+    monkeypatch.setattr(keys.subprocess, "run", run)
+    with pytest.raises(RuntimeError, match="wireguard-tools"):
+        keys.generate_keypair()
+
+def test_failing_wg(monkeypatch):
+    def run(args, **kw): raise subprocess.CalledProcessError(1, args, "", "bad key")
+    monkeypatch.setattr(keys, "X25519PrivateKey", None)
+    monkeypatch.setattr(keys.subprocess, "run", run)
+    with pytest.raises(RuntimeError, match="wg pubkey failed"):
+        keys.public_key("not-a-key")
+
+def test_cryptography_matches_rfc7748():
+    pytest.importorskip("cryptography")
+    assert keys.X25519PrivateKey is not None
+    assert keys.public_key(PRIVATE) == PUBLIC
+    private, public = keys.generate_keypair()
+    assert len(base64.b64decode(private)) == 32 and keys.public_key(private) == public
+    assert len(set(keys.generate_keypairs(5))) == 5
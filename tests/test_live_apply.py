@@ -0,0 +1,115 @@
+import json, subprocess
+import pytest
+import live_apply
+from config_model import WireGuardConfig, load
+
+CONFIG = """[Interface]
+Address = 10.60.1.1/24
+PrivateKey = x
+
+[Category: Games]
+Subsection: A
+Port: 8080/tcp
+Port: 8081/tcp
+Port: 9000/udp -> 9001
+
+[Peer]
+PublicKey = y
+AllowedIPs = 10.60.1.2/32
+"""
+NFT_SETUP = ["add table ip ppwm_wg0",
+             "add map ip ppwm_wg0 fwd { type inet_proto . inet_service : ipv4_addr . inet_service ; }",
+             "add set ip ppwm_wg0 accept { type inet_proto . inet_service ; }",
+             "add chain ip ppwm_wg0 prerouting { type nat hook prerouting priority -100 ; }",
+             "add chain ip ppwm_wg0 forward { type filter hook forward priority 0 ; }",
+             "add rule ip ppwm_wg0 prerouting dnat ip addr . port to meta l4proto . th dport map @fwd",
+             "add rule ip ppwm_wg0 forward meta l4proto . ct original proto-dst @accept accept"]
+
+def restore(nat, filter):
+    return (["iptables-restore", "--noflush"], "".join(f"*{table}\n" + "".join(f"{rule}\n" for rule in rules) + "COMMIT\n"
+                                                       for table, rules in (("nat", nat), ("filter", filter)) if rules))
+
+def nft(*commands):
+    return (["nft", "-f", "-"], "".join(f"{command}\n" for command in commands))
+
+def dnat(op, proto, port, target=None):
+    return f"-{op} PREROUTING -p {proto} --dport {port} -j DNAT --to-destination 10.60.1.2:{target or port}"
+
+def accept(op, proto, port):
+    return f"-{op} FORWARD -p {proto} --dport {port} -j ACCEPT"
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    calls, state = [], {"ifindex": 7}
+    def run(command, **kw):
+        calls.append((command, kw.get("input")))
+        return subprocess.CompletedProcess(command, 0, "", "")
+    monkeypatch.setattr(subprocess, "run", run)
+    monkeypatch.setattr(live_apply, "interface_up", lambda name: True)
+    monkeypatch.setattr(live_apply, "interface_index", lambda name: state["ifindex"])
+    WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf")).save()
+    def change(edit):
+        config = load(str(tmp_path / "wg0.conf"))
+        edit(config)
+        config.save()
+        calls.clear()
+        return live_apply.hot_apply(config), [call for call in calls if call[0][:2] != ["wg", "syncconf"]]
+    change.state = state
+    return change
+
+def mode(name):
+    return lambda config: setattr(config, "rule_mode", name)
+
+def test_single_to_ipset(live):
+    assert live(mode("ipset")) == ((4, 4, False), [
+        restore([dnat("D", "tcp", 8080), dnat("D", "tcp", 8081)], [accept("D", "tcp", 8080), accept("D", "tcp", 8081)]),
+        ("ipset create ppwm-wg0-tcp bitmap:port range 1-65535 -exist", None),
+        ("ipset add ppwm-wg0-tcp 8080-8081 -exist", None),
+        restore(["-A PREROUTING -p tcp -m set --match-set ppwm-wg0-tcp dst -j DNAT --to-destination 10.60.1.2"],
+                ["-A FORWARD -p tcp -m set --match-set ppwm-wg0-tcp dst -j ACCEPT"])])
+
+def test_ipset_members_change_incrementally(live):
+    live(mode("ipset"))
+    assert live(lambda config: (config.add_port("A", 8082, "tcp"), config.remove_port(8080, "tcp"))) == ((1, 1, False), [
+        ("ipset del ppwm-wg0-tcp 8080 -exist", None), ("ipset add ppwm-wg0-tcp 8082 -exist", None)])
+
+def test_ipset_to_nft(live):
+    live(mode("ipset"))
+    assert live(mode("nft")) == ((5, 13, False), [
+        restore([dnat("D", "udp", 9000, 9001), "-D PREROUTING -p tcp -m set --match-set ppwm-wg0-tcp dst -j DNAT --to-destination 10.60.1.2"],
+                [accept("D", "udp", 9000), "-D FORWARD -p tcp -m set --match-set ppwm-wg0-tcp dst -j ACCEPT"]),
+        ("ipset destroy ppwm-wg0-tcp", None),
+        nft(*NFT_SETUP, "add element ip ppwm_wg0 fwd { tcp . 8080 : 10.60.1.2 . 8080 }", "add element ip ppwm_wg0 accept { tcp . 8080 }",
+            "add element ip ppwm_wg0 fwd { tcp . 8081 : 10.60.1.2 . 8081 }", "add element ip ppwm_wg0 accept { tcp . 8081 }",
+            "add element ip ppwm_wg0 fwd { udp . 9000 : 10.60.1.2 . 9001 }", "add element ip ppwm_wg0 accept { udp . 9000 }")])
+
+def test_nft_elements_change_incrementally(live):
+    live(mode("nft"))
+    def edit(config):
+        config.remove_port(9000, "udp"); config.add_port("A", 9000, "udp", 9002); config.remove_port(8081, "tcp")
+    assert live(edit) == ((3, 1, False), [nft("delete element ip ppwm_wg0 fwd { tcp . 8081 }", "delete element ip ppwm_wg0 accept { tcp . 8081 }",
+                                              "delete element ip ppwm_wg0 fwd { udp . 9000 }"),
+                                          nft("add element ip ppwm_wg0 fwd { udp . 9000 : 10.60.1.2 . 9002 }")])
+
+def test_nft_to_single(live):
+    live(mode("nft"))
+    assert live(mode("single")) == ((1, 6, False), [
+        ("nft delete table ip ppwm_wg0", None),
+        restore([dnat("A", "tcp", 8080), dnat("A", "tcp", 8081), dnat("A", "udp", 9000, 9001)],
+                [accept("A", "tcp", 8080), accept("A", "tcp", 8081), accept("A", "udp", 9000)])])
+
+def test_recorded_state_survives_reload(live, tmp_path):
+    live(mode("ipset"))
+    with open(tmp_path / ".wg0.conf.applied") as f: assert json.load(f)["ifindex"] == 7
+    assert live(lambda config: None) == ((0, 0, False), [])
+
+def test_recreated_interface_uses_the_file(live, tmp_path):
+    live(lambda config: config.add_port("A", 8082, "tcp"))
+    (tmp_path / "wg0.conf").write_text(CONFIG)
+    live.state["ifindex"] = 8
+    assert live(lambda config: config.add_port("A", 8083, "tcp")) == ((0, 2, False), [restore([dnat("A", "tcp", 8083)], [accept("A", "tcp", 8083)])])
+
+def test_stale_sidecar_for_same_interface_is_diffed(live, tmp_path):
+    live(lambda config: config.add_port("A", 8082, "tcp"))
+    (tmp_path / "wg0.conf").write_text(CONFIG)
+    assert live(lambda config: None) == ((2, 0, False), [restore([dnat("D", "tcp", 8082)], [accept("D", "tcp", 8082)])])
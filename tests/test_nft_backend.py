@@ -0,0 +1,68 @@
+from config_model import PortEntry, WireGuardConfig
+from nft_backend import nft_rules, nft_script
+
+CONFIG = """[Interface]
+Address = 10.60.1.1/24
+# RuleMode = nft
+
+[Category: Games]
+Subsection: A
+Port: 80/tcp
+Port: 90/udp -> 91
+
+[Peer]
+AllowedIPs = 10.60.1.2/32
+"""
+
+def test_script_golden():
+    ups, downs = nft_rules([PortEntry(8443, "tcp", 443), PortEntry(53, "udp")], "10.0.0.2", "wg0.x")
+    assert downs == ["nft delete table ip ppwm_wg0_x"]
+    assert nft_script(ups, "wg0.x") == """add table ip ppwm_wg0_x
+delete table ip ppwm_wg0_x
+add table ip ppwm_wg0_x
+add map ip ppwm_wg0_x fwd { type inet_proto . inet_service : ipv4_addr . inet_service ; }
+add set ip ppwm_wg0_x accept { type inet_proto . inet_service ; }
+add chain ip ppwm_wg0_x prerouting { type nat hook prerouting priority -100 ; }
+add chain ip ppwm_wg0_x forward { type filter hook forward priority 0 ; }
+add rule ip ppwm_wg0_x prerouting dnat ip addr . port to meta l4proto . th dport map @fwd
+add rule ip ppwm_wg0_x forward meta l4proto . ct original proto-dst @accept accept
+add element ip ppwm_wg0_x fwd { tcp . 8443 : 10.0.0.2 . 443 }
+add element ip ppwm_wg0_x accept { tcp . 8443 }
+add element ip ppwm_wg0_x fwd { udp . 53 : 10.0.0.2 . 53 }
+add element ip ppwm_wg0_x accept { udp . 53 }
+"""
+
+def test_hooks_and_files(tmp_path):
+    config = WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf"))
+    assert config.rules() == ([f"nft -f {tmp_path}/wg0.nft"], ["nft delete table ip ppwm_wg0"])
+    assert list(config.ruleset_files()) == [f"{tmp_path}/wg0.nft"]
+
+def diff(config):
+    return config.backend.diff(config.applied_rules, config.effective_rules())
+
+def test_element_level_diff(tmp_path):
+    config = WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf"))
+    config.remove_port(80, "tcp"); config.add_port("A", 81, "tcp")
+    config.remove_port(90, "udp"); config.add_port("A", 90, "udp", 92)
+    assert diff(config) == (["nft delete element ip ppwm_wg0 fwd { tcp . 80 }", "nft delete element ip ppwm_wg0 accept { tcp . 80 }",
+                             "nft delete element ip ppwm_wg0 fwd { udp . 90 }"],
+                            ["nft add element ip ppwm_wg0 fwd { tcp . 81 : 10.60.1.2 . 81 }", "nft add element ip ppwm_wg0 accept { tcp . 81 }",
+                             "nft add element ip ppwm_wg0 fwd { udp . 90 : 10.60.1.2 . 92 }"])
+
+def test_client_address_change_rewrites_map_entries_only(tmp_path):
+    config = WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf"))
+    config.peers = [["[Peer]", "AllowedIPs = 10.60.1.3/32"]]
+    removed, added = diff(config)
+    assert removed == ["nft delete element ip ppwm_wg0 fwd { tcp . 80 }", "nft delete element ip ppwm_wg0 fwd { udp . 90 }"]
+    assert added == ["nft add element ip ppwm_wg0 fwd { tcp . 80 : 10.60.1.3 . 80 }", "nft add element ip ppwm_wg0 fwd { udp . 90 : 10.60.1.3 . 91 }"]
+
+def test_leaving_nft_drops_the_table_without_element_deletes(tmp_path):
+    config = WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf"))
+    config.rule_mode = "multiport"
+    removed, added = diff(config)
+    assert removed == ["nft delete table ip ppwm_wg0"] and all(rule.startswith("iptables ") for rule in added)
+
+def test_batches_split_nft_from_iptables_and_shell(tmp_path):
+    backend = WireGuardConfig.parse(CONFIG, str(tmp_path / "wg0.conf")).backend
+    steps = backend.batches(["iptables -A FORWARD -j ACCEPT", "nft add element ip ppwm_wg0 accept { tcp . 1 }", "sysctl -w x=1"])
+    assert [batch for _, batch in steps] == [[("filter", "-A FORWARD -j ACCEPT")], ["add element ip ppwm_wg0 accept { tcp . 1 }"], ["sysctl -w x=1"]]
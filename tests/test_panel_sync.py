@@ -0,0 +1,114 @@
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import cli, port_index
+from config_model import load
+from panel_sync import PanelClient, apply_sync, desired_ports, plan_sync
+from port_index import PortIndex
+
+WG0 = """[Interface]
+Address = 10.60.1.1/24
+PrivateKey = x
+
+# Categories and Subsections
+[Category: Games]
+Subsection: Minecraft
+Port: 25565/tcp - panel #1
+Port: 25575/tcp - panel #2
+Subsection: Manual
+Port: 8080/tcp
+"""
+WG1 = """[Interface]
+Address = 10.60.2.1/24
+PrivateKey = x
+
+# Categories and Subsections
+[Category: Games]
+Subsection: Other
+Port: 27015/tcp
+"""
+
+def allocation(id, port, server=None, notes=None):
+    return {"object": "allocation", "attributes": {"id": id, "ip": "0.0.0.0", "port": port, "notes": notes, "assigned": bool(server),
+            "relationships": {"server": {"object": "server", "attributes": {"name": server}} if server else {}}}}
+
+ALLOCATIONS = [allocation(1, 25565, "Minecraft"), allocation(3, 25566, "Minecraft  Creative", "creative"),
+               allocation(4, 27015, "Counter Strike"), allocation(5, 8080, "Web"), allocation(6, 30000)]
+
+@pytest.fixture
+def panel():
+    requests = []
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            params = dict(part.split("=") for part in query.split("&"))
+            requests.append((path, params, self.headers.get("Authorization"), self.headers.get("If-None-Match")))
+            page, per_page = int(params["page"]), int(params["per_page"])
+            etag = f'"{page}-{len(ALLOCATIONS)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304); self.end_headers(); return
+            body = json.dumps({"data": ALLOCATIONS[(page - 1) * per_page:page * per_page],
+                               "meta": {"pagination": {"total_pages": -(-len(ALLOCATIONS) // per_page)}}}).encode()
+            self.send_response(200)
+            self.send_header("ETag", etag); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests
+    server.shutdown(); server.server_close()
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_index, "live_listeners", lambda: {"tcp": set(), "udp": set()})
+    (tmp_path / "wg0.conf").write_text(WG0)
+    (tmp_path / "wg1.conf").write_text(WG1)
+    return tmp_path
+
+def test_allocations_follow_pagination(panel):
+    url, requests = panel
+    client = PanelClient(url, "key")
+    assert [a["id"] for a in client.allocations(1, per_page=2)] == [1, 3, 4, 5, 6]
+    assert sorted(r[1]["page"] for r in requests) == ["1", "2", "3"]
+    assert {(r[0], r[1]["per_page"], r[1]["include"], r[2]) for r in requests} == {("/api/application/nodes/1/allocations", "2", "server", "Bearer key")}
+
+def test_unchanged_pages_are_served_from_the_cache(panel, tmp_path):
+    url, requests = panel
+    cache = str(tmp_path / "cache.json")
+    first = PanelClient(url, "key", cache)
+    expected = first.allocations(1, per_page=2)
+    first.save_cache()
+    second = PanelClient(url, "key", cache)
+    assert second.allocations(1, per_page=2) == expected
+    assert second.stats == {"requests": 3, "not_modified": 3}
+    assert sorted(r[3] for r in requests[3:]) == ['"1-5"', '"2-5"', '"3-5"']
+
+def test_plan_reports_conflicts_across_configs(config_dir):
+    config, desired = load(str(config_dir / "wg0.conf")), desired_ports([a["attributes"] for a in ALLOCATIONS], "tcp")
+    plan = plan_sync(config, desired, PortIndex(str(config_dir)))
+    assert plan == {"add": [(25566, "tcp")], "remove": [(25575, "tcp")], "retag": [],
+                    "conflicts": [(8080, "tcp", "wg0/Manual"), (27015, "tcp", "wg1/Other")]}
+    assert plan_sync(config, desired)["conflicts"] == [(8080, "tcp", "wg0/Manual")]
+
+def test_apply_keeps_operator_ports_and_updates_the_index(config_dir):
+    config, desired = load(str(config_dir / "wg0.conf")), desired_ports([a["attributes"] for a in ALLOCATIONS], "tcp")
+    index = PortIndex(str(config_dir))
+    apply_sync(config, desired, plan_sync(config, desired, index), index=index)
+    assert config.ports("Minecraft Creative")[0].line() == "Port: 25566/tcp - panel #3 creative"
+    assert [entry.port for entry in config.ports("Minecraft")] == [25565] and [entry.port for entry in config.ports("Manual")] == [8080]
+    assert "Counter Strike" not in config.subsection_index
+    assert index.conflicts([25566], "tcp", "wg1") == [(25566, "tcp", "wg0/Minecraft Creative")]
+
+def test_sync_command(panel, config_dir, capsys):
+    url, _ = panel
+    args = ["--config-dir", str(config_dir), "sync", "wg0", "--panel", url, "--node", "1", "--api-key", "key", "--protocol", "tcp", "--per-page", "2"]
+    assert cli.run(args + ["--dry-run"]) == 0
+    out = capsys.readouterr().out
+    assert "5 allocation(s) in 3 request(s) (0 not modified): 1 to add, 1 to remove, 0 to update." in out
+    assert "skipped conflicts: 8080/tcp (wg0/Manual), 27015/tcp (wg1/Other)" in out
+    assert (config_dir / "wg0.conf").read_text() == WG0
+    assert cli.run(args) == 0
+    assert "(3 not modified)" in capsys.readouterr().out
+    text = (config_dir / "wg0.conf").read_text()
+    assert "Port: 25566/tcp - panel #3 creative" in text and "25575" not in text and "27015" not in text
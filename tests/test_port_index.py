@@ -0,0 +1,38 @@
+import pytest
+import port_index
+from port_index import PortIndex
+
+CONFIG = """[Interface]
+Address = 10.60.{subnet}.1/24
+PrivateKey = x
+
+# Categories and Subsections
+[Category: Games]
+Subsection: {subsection}
+{ports}
+"""
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_index, "live_listeners", lambda: {"tcp": {22}, "udp": set()})
+    (tmp_path / "wg0.conf").write_text(CONFIG.format(subnet=1, subsection="Minecraft", ports="Port: 25565/tcp\nPort: 1024/tcp"))
+    (tmp_path / "wg1.conf").write_text(CONFIG.format(subnet=2, subsection="Valheim", ports="Port: 2456/udp\nPort: 1026/udp"))
+    return str(tmp_path)
+
+def test_conflicts(config_dir):
+    index = PortIndex(config_dir)
+    assert index.conflicts([25565], "tcp", "wg1") == [(25565, "tcp", "wg0/Minecraft")]
+    assert index.conflicts([25565], "tcp", "wg0") == []
+    assert index.conflicts([2456, 2457], "both", "wg0") == [(2456, "udp", "wg1/Valheim")]
+    assert index.conflicts([22], "tcp") == [(22, "tcp", "local listener")]
+    assert PortIndex(config_dir, include_listeners=False).conflicts([22], "tcp") == []
+
+def test_find_free_block(config_dir):
+    index = PortIndex(config_dir)
+    assert index.find_free_block(1, "tcp") == 1025
+    assert index.find_free_block(1, "both") == 1025
+    assert index.find_free_block(2, "both") == 1027
+    assert index.find_free_block(3, "udp", start=1024) == 1027
+    assert index.find_free_block(100, "tcp", start=25500, end=25600) is None
+    assert index.find_free_block(35, "tcp", start=25531, end=25600) == 25566
+    assert index.find_free_block(36, "tcp", start=25530, end=25600) is None
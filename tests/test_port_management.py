@@ -0,0 +1,53 @@
+import builtins
+import pytest
+import port_index, port_management
+from config_model import load
+
+CONFIG = """[Interface]
+Address = 10.60.1.1/24
+PrivateKey = x
+
+# Categories and Subsections
+[Category: Games]
+Subsection: Web
+Port: 8080/tcp - site
+Port: 9090/tcp
+
+[Peer]
+PublicKey = y
+AllowedIPs = 10.60.1.2/32
+"""
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_index, "live_listeners", lambda: {"tcp": set(), "udp": set()})
+    (tmp_path / "wg0.conf").write_text(CONFIG)
+    (tmp_path / "wg1.conf").write_text("[Interface]\nAddress = 10.60.2.1/24\n\n[Category: Games]\nSubsection: Other\nPort: 7000/udp\n")
+    return str(tmp_path / "wg0.conf")
+
+def edit(monkeypatch, path, *answers):
+    answers = iter(("no", "1") + answers + ("no",))
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(answers))
+    port_management.modify_ports(load(path), "Games", "Web", "edit")
+    return {key: (entry.forward, entry.comment) for key, (_, _, entry) in load(path).port_index.items()}
+
+def test_edit_moves_port(config, monkeypatch, capsys):
+    assert edit(monkeypatch, config, "tcp", "8081", "yes", "80") == {(8081, "tcp"): (80, "site"), (9090, "tcp"): (None, None)}
+    assert "Edited port 8080/tcp to 8081/tcp" in capsys.readouterr().out
+
+def test_edit_to_both_protocols(config, monkeypatch):
+    assert set(edit(monkeypatch, config, "both", "8080", "no")) == {(8080, "tcp"), (8080, "udp"), (9090, "tcp")}
+
+@pytest.mark.parametrize("answers, message", [
+    (("tcp", "9090", "no"), "9090/tcp is already managed in Web; 8080/tcp kept"),
+    (("udp", "7000", "no"), "Port 7000/udp is already used by wg1/Other"),
+    (("tcp", "70000"), "Enter a single port number between 1 and 65535"),
+    (("tcp", "8081-8090"), "Enter a single port number between 1 and 65535"),
+    (("tcp", "8081", "yes", "0"), "Invalid port number"),
+    (("sctp",), "Invalid protocol"),
+])
+def test_rejected_edit_keeps_config(config, monkeypatch, capsys, answers, message):
+    with open(config) as f: before = f.read()
+    edit(monkeypatch, config, *answers)
+    assert message in capsys.readouterr().out
+    with open(config) as f: assert f.read() == before
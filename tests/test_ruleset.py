@@ -0,0 +1,99 @@
+import pytest
+from config_model import PortEntry, WireGuardConfig
+from ruleset import compact_rules, multiport_groups, port_runs
+
+ENTRIES = [PortEntry(port, "tcp") for port in range(1000, 1028, 2)] + [PortEntry(port, "tcp") for port in (2000, 2001, 2002)] \
+          + [PortEntry(53, "udp"), PortEntry(54, "udp"), PortEntry(8443, "tcp", 443)]
+EVEN = ",".join(map(str, range(1000, 1028, 2)))
+SINGLE = """iptables -t nat -A PREROUTING -p tcp --dport 8443 -j DNAT --to-destination 10.0.0.2:443
+iptables -A FORWARD -p tcp --dport 8443 -j ACCEPT"""
+SINGLE_DOWN = SINGLE.replace(" -A ", " -D ")
+
+def golden(text):
+    return [line for line in text.format(even=EVEN, single=SINGLE, single_down=SINGLE_DOWN).splitlines() if line]
+
+def test_multiport_groups_respect_the_match_limit():
+    assert multiport_groups(port_runs(range(1, 31, 2))) == [[str(port) for port in range(1, 31, 2)]]
+    assert multiport_groups(port_runs(range(1, 33, 2))) == [[str(port) for port in range(1, 31, 2)], ["31"]]
+    assert multiport_groups(port_runs(list(range(1, 29, 2)) + [40, 41])) == [[str(port) for port in range(1, 29, 2)], ["40:41"]]
+    assert multiport_groups(port_runs(list(range(1, 27, 2)) + [40, 41])) == [[str(port) for port in range(1, 27, 2)] + ["40:41"]]
+
+def test_multiport_rendering():
+    assert compact_rules(ENTRIES, "10.0.0.2", "multiport", "wg0") == (golden("""
+{single}
+iptables -t nat -A PREROUTING -p tcp -m multiport --dports {even} -j DNAT --to-destination 10.0.0.2
+iptables -A FORWARD -p tcp -m multiport --dports {even} -j ACCEPT
+iptables -t nat -A PREROUTING -p tcp -m multiport --dports 2000:2002 -j DNAT --to-destination 10.0.0.2
+iptables -A FORWARD -p tcp -m multiport --dports 2000:2002 -j ACCEPT
+iptables -t nat -A PREROUTING -p udp -m multiport --dports 53:54 -j DNAT --to-destination 10.0.0.2
+iptables -A FORWARD -p udp -m multiport --dports 53:54 -j ACCEPT
+"""), golden("""
+{single_down}
+iptables -t nat -D PREROUTING -p tcp -m multiport --dports {even} -j DNAT --to-destination 10.0.0.2
+iptables -D FORWARD -p tcp -m multiport --dports {even} -j ACCEPT
+iptables -t nat -D PREROUTING -p tcp -m multiport --dports 2000:2002 -j DNAT --to-destination 10.0.0.2
+iptables -D FORWARD -p tcp -m multiport --dports 2000:2002 -j ACCEPT
+iptables -t nat -D PREROUTING -p udp -m multiport --dports 53:54 -j DNAT --to-destination 10.0.0.2
+iptables -D FORWARD -p udp -m multiport --dports 53:54 -j ACCEPT
+"""))
+
+def test_ipset_rendering():
+    ups, downs = compact_rules(ENTRIES, "10.0.0.2", "ipset", "wg0")
+    assert ups == golden("""
+{single}
+ipset create ppwm-wg0-tcp bitmap:port range 1-65535 -exist
+""") + [f"ipset add ppwm-wg0-tcp {port} -exist" for port in range(1000, 1028, 2)] + golden("""
+ipset add ppwm-wg0-tcp 2000-2002 -exist
+iptables -t nat -A PREROUTING -p tcp -m set --match-set ppwm-wg0-tcp dst -j DNAT --to-destination 10.0.0.2
+iptables -A FORWARD -p tcp -m set --match-set ppwm-wg0-tcp dst -j ACCEPT
+ipset create ppwm-wg0-udp bitmap:port range 1-65535 -exist
+ipset add ppwm-wg0-udp 53-54 -exist
+iptables -t nat -A PREROUTING -p udp -m set --match-set ppwm-wg0-udp dst -j DNAT --to-destination 10.0.0.2
+iptables -A FORWARD -p udp -m set --match-set ppwm-wg0-udp dst -j ACCEPT
+""")
+    assert downs == golden("""
+{single_down}
+iptables -t nat -D PREROUTING -p tcp -m set --match-set ppwm-wg0-tcp dst -j DNAT --to-destination 10.0.0.2
+iptables -D FORWARD -p tcp -m set --match-set ppwm-wg0-tcp dst -j ACCEPT
+ipset destroy ppwm-wg0-tcp
+iptables -t nat -D PREROUTING -p udp -m set --match-set ppwm-wg0-udp dst -j DNAT --to-destination 10.0.0.2
+iptables -D FORWARD -p udp -m set --match-set ppwm-wg0-udp dst -j ACCEPT
+ipset destroy ppwm-wg0-udp
+""")
+
+def test_ipset_names_fit_the_kernel_limit():
+    ups, _ = compact_rules([PortEntry(80, "tcp"), PortEntry(80, "udp")], "10.0.0.2", "ipset", "a-very-long-interface-name")
+    assert [rule.split()[2] for rule in ups if rule.startswith("ipset create")] == ["ppwm-a-very-long-interface--tcp", "ppwm-a-very-long-interface--udp"]
+
+def test_restore_mode_files(tmp_path):
+    config = WireGuardConfig.parse("[Interface]\nAddress = 10.60.1.1/24\n# RuleMode = ipset\n# RuleApply = restore\n\n"
+                                   "[Category: Games]\nSubsection: A\nPort: 80/tcp\nPort: 81/tcp\nPort: 90/tcp -> 91\n\n"
+                                   "[Peer]\nAllowedIPs = 10.60.1.2/32\n", str(tmp_path / "wg0.conf"))
+    assert config.rules() == ([f"ipset restore -exist -file {tmp_path}/wg0.ipset", f"iptables-restore --noflush {tmp_path}/wg0.up.rules"],
+                              [f"iptables-restore --noflush {tmp_path}/wg0.down.rules", "ipset destroy ppwm-wg0-tcp"])
+    files = config.ruleset_files()
+    assert files[f"{tmp_path}/wg0.ipset"] == "create ppwm-wg0-tcp bitmap:port range 1-65535\nadd ppwm-wg0-tcp 80-81\n"
+    assert files[f"{tmp_path}/wg0.up.rules"] == """*nat
+-A PREROUTING -p tcp --dport 90 -j DNAT --to-destination 10.60.1.2:91
+-A PREROUTING -p tcp -m set --match-set ppwm-wg0-tcp dst -j DNAT --to-destination 10.60.1.2
+COMMIT
+*filter
+-A FORWARD -p tcp --dport 90 -j ACCEPT
+-A FORWARD -p tcp -m set --match-set ppwm-wg0-tcp dst -j ACCEPT
+COMMIT
+"""
+    assert files[f"{tmp_path}/wg0.down.rules"] == files[f"{tmp_path}/wg0.up.rules"].replace("-A ", "-D ")
+
+@pytest.mark.parametrize("mode", ["multiport", "ipset"])
+def test_ipset_membership_changes_are_element_level(tmp_path, mode):
+    config = WireGuardConfig.parse(f"[Interface]\n# RuleMode = {mode}\n\n[Category: Games]\nSubsection: A\nPort: 80/tcp\nPort: 81/tcp\n\n"
+                                   "[Peer]\nAllowedIPs = 10.60.1.2/32\n", str(tmp_path / "wg0.conf"))
+    config.remove_port(81, "tcp"); config.add_port("A", 85, "tcp")
+    removed, added = config.backend.diff(config.applied_rules, config.effective_rules())
+    if mode == "ipset":
+        assert (removed, added) == (["ipset del ppwm-wg0-tcp 81 -exist"], ["ipset add ppwm-wg0-tcp 85 -exist"])
+    else:
+        assert removed == ["iptables -t nat -D PREROUTING -p tcp -m multiport --dports 80:81 -j DNAT --to-destination 10.60.1.2",
+                           "iptables -D FORWARD -p tcp -m multiport --dports 80:81 -j ACCEPT"]
+        assert added == ["iptables -t nat -A PREROUTING -p tcp -m multiport --dports 80,85 -j DNAT --to-destination 10.60.1.2",
+                         "iptables -A FORWARD -p tcp -m multiport --dports 80,85 -j ACCEPT"]
@@ -0,0 +1,88 @@
+import json, os
+import pytest
+import transactions
+from config_model import WireGuardConfig, load
+from transactions import ConflictError, commit, recover, sidecar
+
+CONFIG = """[Interface]
+Address = 10.60.1.1/24
+# RuleApply = restore
+
+[Category: Games]
+Subsection: A
+Port: 8080/tcp
+"""
+
+def crash_after(monkeypatch, writes):
+    real, done = transactions.atomic_write, []
+    def write(path, text):
+        if len(done) == writes: raise KeyboardInterrupt("power cut")
+        done.append(path); real(path, text)
+    monkeypatch.setattr(transactions, "atomic_write", write)
+
+def test_interrupted_commit_is_replayed(tmp_path, monkeypatch):
+    conf, rules = str(tmp_path / "wg0.conf"), str(tmp_path / "wg0.up.rules")
+    commit(conf, {rules: "old rules\n", conf: "old config\n"})
+    crash_after(monkeypatch, 2)
+    with pytest.raises(KeyboardInterrupt):
+        commit(conf, {rules: "new rules\n", conf: "new config\n"})
+    monkeypatch.undo()
+    assert (open(rules).read(), open(conf).read()) == ("new rules\n", "old config\n")
+    assert os.path.exists(sidecar(conf, ".journal"))
+    assert recover(str(tmp_path)) == [conf]
+    assert (open(rules).read(), open(conf).read()) == ("new rules\n", "new config\n")
+    assert not os.path.exists(sidecar(conf, ".journal")) and recover(str(tmp_path)) == []
+
+def test_commit_interrupted_before_the_journal_leaves_files_alone(tmp_path, monkeypatch):
+    conf = str(tmp_path / "wg0.conf")
+    commit(conf, {conf: "old config\n"})
+    crash_after(monkeypatch, 0)
+    with pytest.raises(KeyboardInterrupt):
+        commit(conf, {conf: "new config\n"})
+    monkeypatch.undo()
+    assert recover(str(tmp_path)) == [] and open(conf).read() == "old config\n"
+
+def test_torn_journal_is_discarded(tmp_path):
+    conf = tmp_path / "wg0.conf"
+    conf.write_text("config\n")
+    journal = sidecar(str(conf), ".journal")
+    with open(journal, "w") as f: f.write(json.dumps({"files": {str(conf): "x"}})[:20])
+    assert recover(str(tmp_path)) == [] and not os.path.exists(journal)
+    assert conf.read_text() == "config\n"
+
+def test_recovered_save_is_consistent(tmp_path, monkeypatch):
+    path = str(tmp_path / "wg0.conf")
+    WireGuardConfig.parse(CONFIG, path).save()
+    config = load(path)
+    config.add_port("A", 8081, "tcp")
+    crash_after(monkeypatch, 2)
+    with pytest.raises(KeyboardInterrupt):
+        config.save()
+    monkeypatch.undo()
+    assert recover(str(tmp_path)) == [path]
+    reloaded = load(path)
+    assert sorted(reloaded.port_index) == [(8080, "tcp"), (8081, "tcp")]
+    assert reloaded.ruleset_files() == {p: open(p).read() for p in reloaded.ruleset_files()}
+
+def test_save_refuses_to_overwrite_outside_changes(tmp_path):
+    path = tmp_path / "wg0.conf"
+    WireGuardConfig.parse(CONFIG, str(path)).save()
+    config = load(str(path))
+    path.write_text(path.read_text() + "Port: 9000/udp\n")
+    rules = {p: open(p).read() for p in config.ruleset_files()}
+    config.add_port("A", 8081, "tcp")
+    with pytest.raises(ConflictError, match="changed by someone else"):
+        config.save()
+    assert path.read_text().endswith("Port: 9000/udp\n") and {p: open(p).read() for p in rules} == rules
+    config = load(str(path))
+    config.add_port("A", 8081, "tcp")
+    config.save()
+    assert sorted(load(str(path)).port_index) == [(8080, "tcp"), (8081, "tcp"), (9000, "udp")]
+
+def test_save_to_another_path_skips_the_check(tmp_path):
+    path = tmp_path / "wg0.conf"
+    WireGuardConfig.parse(CONFIG, str(path)).save()
+    config = load(str(path))
+    path.write_text("changed\n")
+    config.save(str(tmp_path / "copy.conf"))
+    assert path.read_text() == "changed\n" and load(str(tmp_path / "copy.conf")).port_index
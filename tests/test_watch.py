@@ -0,0 +1,67 @@
+import os
+import pytest
+import watch
+from config_model import WireGuardConfig
+
+CONFIG = """[Interface]
+Address = 10.60.1.1/24
+PrivateKey = aGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd28=
+# RuleApply = restore
+PostUp = echo up
+PostDown = echo down
+
+# Categories and Subsections
+[Category: Games]
+Subsection: Web
+Port: 8080/tcp
+
+[Peer]
+PublicKey = aGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd28=
+AllowedIPs = 10.60.1.2/32
+"""
+
+def run_watch(tmp_path, monkeypatch, *edits):
+    applied, steps = [], iter(edits)
+    def inotify(path): raise OSError("no inotify")
+    def sleep(seconds):
+        edit = next(steps, None)
+        if edit is None: raise KeyboardInterrupt
+        edit()
+    monkeypatch.setattr(watch, "Inotify", inotify)
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    monkeypatch.setattr(watch, "hot_apply", lambda config: applied.append(config.effective_rules()) or (0, 1, False))
+    watch.watch(str(tmp_path), poll_interval=0)
+    return applied
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "wg0.conf"
+    WireGuardConfig.parse(CONFIG, str(path)).save()
+    return path
+
+def test_external_edit_refreshes_hooks_and_applies(tmp_path, monkeypatch, config_path):
+    def edit():
+        text = config_path.read_text().replace("Port: 8080/tcp", "# forwarded for the panel\nPort: 8080/tcp\nPort: 9000/udp")
+        config_path.write_text(text.replace("PrivateKey", "MTU = 1380\nPrivateKey"))
+    applied = run_watch(tmp_path, monkeypatch, edit, lambda: None)
+    text = config_path.read_text()
+    assert "MTU = 1380\n" in text and "# forwarded for the panel\n" in text
+    assert [line for line in text.splitlines() if line.startswith("Post")] == [
+        "PostUp = echo up", f"PostUp = iptables-restore --noflush {tmp_path}/wg0.up.rules",
+        "PostDown = echo down", f"PostDown = iptables-restore --noflush {tmp_path}/wg0.down.rules"]
+    assert "--dport 9000" in (tmp_path / "wg0.up.rules").read_text()
+    assert len(applied) == 1 and any("--dport 9000" in rule for rule in applied[0][0])
+
+def test_hooks_are_added_after_the_interface_block(tmp_path, monkeypatch, config_path):
+    def edit():
+        text = config_path.read_text()
+        config_path.write_text("".join(line for line in text.splitlines(keepends=True) if not line.startswith("Post")).replace("# RuleApply = restore\n", ""))
+    run_watch(tmp_path, monkeypatch, edit)
+    lines = config_path.read_text().splitlines()
+    assert lines[2].startswith("PrivateKey") and lines[3].startswith("PostUp = iptables -t nat -A PREROUTING")
+    assert lines[6].startswith("PostDown = iptables -D FORWARD") and lines[7] == ""
+
+def test_invalid_edit_is_not_applied(tmp_path, monkeypatch, config_path):
+    broken = config_path.read_text().replace("Address = 10.60.1.1/24", "Address = nonsense")
+    applied = run_watch(tmp_path, monkeypatch, lambda: config_path.write_text(broken))
+    assert applied == [] and config_path.read_text() == broken